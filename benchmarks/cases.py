@@ -0,0 +1,123 @@
+"""
+Casos de benchmark
+
+Cada caso tem um `setup(scale)` fora da medição que devolve a função
+medida; o runner chama setup uma vez por repetição, então estado criado
+pelo próprio caso (alertas já acionados, caches aquecidos) não vaza entre
+medições.
+"""
+import tempfile
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from benchmarks.fixtures import MarketFixtures, symbols
+
+
+@dataclass
+class Case:
+    name: str
+    setup: Callable[[int, MarketFixtures], Callable[[], None]]
+    scales: List[int]
+    # Escalas incluídas em --quick
+    quick_scales: List[int] = field(default_factory=list)
+    repeat: Dict[int, int] = field(default_factory=dict)
+
+    def repeats(self, scale: int, default: int) -> int:
+        return min(default, self.repeat.get(scale, default))
+
+
+def _warm(fixtures: MarketFixtures, stocks: List[str] = (), coins: List[str] = ()):
+    # Gera (ou lê do disco) as séries antes da medição
+    for symbol in stocks:
+        fixtures.stock(symbol)
+    for symbol in coins:
+        fixtures.coin(f'{symbol.lower()}-coin')
+
+
+def _client():
+    from main import app
+    return app.test_client()
+
+
+def _check(response):
+    if response.status_code != 200:
+        raise RuntimeError(f'{response.request.path}: HTTP {response.status_code} {response.get_data(as_text=True)[:200]}')
+
+
+def calculate_metrics(scale: int, fixtures: MarketFixtures):
+    """POST /calculate-metrics com ~80% ações e ~20% cripto"""
+    client = _client()
+    crypto = max(1, scale // 5)
+    assets = ([{'symbol': symbol, 'type': 'stock', 'weight': 1} for symbol in symbols(scale - crypto)] +
+              [{'symbol': symbol, 'type': 'crypto', 'weight': 1} for symbol in symbols(crypto, 'C')])
+    _warm(fixtures, symbols(scale - crypto), symbols(crypto, 'C'))
+
+    def run():
+        _check(client.post('/calculate-metrics', json={'assets': assets}))
+    return run
+
+
+def efficient_frontier(scale: int, fixtures: MarketFixtures):
+    """PortfolioOptimizer.get_efficient_frontier; universos grandes usam PCA (QP low-rank)"""
+    from services.optimization import PortfolioOptimizer
+
+    optimizer = PortfolioOptimizer()
+    universe = symbols(scale)
+    covariance = 'sample' if scale <= 100 else 'pca'
+    _warm(fixtures, universe)
+
+    def run():
+        result = optimizer.get_efficient_frontier(universe, '1y', covariance=covariance)
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+    return run
+
+
+def check_price_alerts(scale: int, fixtures: MarketFixtures):
+    """AlertManager.check_price_alerts com `scale` alertas ativos em 500 símbolos"""
+    from services.alerts import AlertManager
+
+    manager = AlertManager(tempfile.mkdtemp(prefix='bench-alerts-'))
+    universe = symbols(500)
+    prices = {symbol: float(fixtures.stock(symbol)['Close'].iloc[-1]) for symbol in universe}
+    rng = np.random.default_rng(scale)
+    picks = rng.integers(0, len(universe), scale)
+    # Alvos a até 20% do preço atual; ~5% já estão do lado acionado e
+    # disparam na verificação
+    factors = rng.uniform(0.8, 1.2, scale)
+    fire = rng.random(scale) < 0.05
+    alerts = [{'symbol': universe[i], 'target_price': prices[universe[i]] * factor,
+               'condition': 'above' if (factor > 1) != fires else 'below'}
+              for i, factor, fires in zip(picks.tolist(), factors.tolist(), fire.tolist())]
+    for start in range(0, len(alerts), 10000):
+        result = manager.create_price_alerts(alerts[start:start + 10000])
+        if not result.get('success'):
+            raise RuntimeError(result)
+
+    def run():
+        manager.check_price_alerts()
+    return run
+
+
+def asset_data(scale: int, fixtures: MarketFixtures):
+    """GET /asset-data para `scale` ativos (1 ano), ~20% cripto"""
+    client = _client()
+    crypto = max(1, scale // 5)
+    requests = ([f'/asset-data?symbol={symbol}&type=stock' for symbol in symbols(scale - crypto)] +
+                [f'/asset-data?symbol={symbol}&type=crypto' for symbol in symbols(crypto, 'C')])
+    _warm(fixtures, symbols(scale - crypto), symbols(crypto, 'C'))
+
+    def run():
+        for url in requests:
+            _check(client.get(url))
+    return run
+
+
+CASES = [
+    Case('calculate_metrics', calculate_metrics, [10, 100, 1000], quick_scales=[10, 100], repeat={1000: 2}),
+    Case('efficient_frontier', efficient_frontier, [10, 100, 1000], quick_scales=[10], repeat={1000: 2}),
+    Case('check_price_alerts', check_price_alerts, [1000, 100000], quick_scales=[1000]),
+    Case('asset_data', asset_data, [10, 100, 1000], quick_scales=[10, 100], repeat={1000: 2}),
+]
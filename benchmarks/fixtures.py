@@ -0,0 +1,189 @@
+"""
+Dados de mercado gravados ou sintéticos para rodar os benchmarks sem rede
+
+Históricos gravados por `python -m benchmarks.record` ficam em
+`benchmarks/fixtures/` e têm prioridade; os demais símbolos recebem uma
+série sintética determinística (passeio aleatório com semente pelo símbolo).
+yfinance e a API do CoinGecko são substituídos apenas dentro de
+`MarketFixtures.installed()`.
+"""
+import json
+import os
+import zlib
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, List, Optional
+from unittest import mock
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+# Pregões por período aceito pelo yfinance
+PERIOD_BARS = {'1d': 1, '5d': 5, '1mo': 21, '3mo': 63, '6mo': 126, 'ytd': 200,
+               '1y': 252, '2y': 504, '5y': 1260, '10y': 2520, 'max': 2520}
+
+
+class FakeResponse:
+    """Resposta mínima de requests.get (JSON ou texto)"""
+
+    def __init__(self, payload: Any = None, status_code: int = 200, text: Optional[str] = None):
+        self._payload = payload
+        self.status_code = status_code
+        self.text = json.dumps(payload) if text is None else text
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f'HTTP {self.status_code}')
+
+
+class MarketFixtures:
+    def __init__(self, seed: int = 7, history_days: int = 2520):
+        self.seed = seed
+        self.history_days = history_days
+        self.end = pd.Timestamp.today().normalize()
+        self._stocks: Dict[str, pd.DataFrame] = {}
+        self._coins: Dict[str, pd.Series] = {}
+        self.calls: Dict[str, int] = {}
+
+    # Séries
+
+    def _recorded(self, kind: str, name: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(FIXTURES_DIR, kind, f'{name}.json')
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _call(self, provider: str):
+        """Chamada a um provedor externo (ponto de extensão dos stubs do teste de carga)"""
+        self.calls[provider] = self.calls.get(provider, 0) + 1
+
+    def _rng(self, name: str) -> np.random.Generator:
+        return np.random.default_rng([self.seed, zlib.crc32(name.encode())])
+
+    def stock(self, symbol: str) -> pd.DataFrame:
+        """Histórico OHLCV diário completo de uma ação"""
+        symbol = symbol.upper()
+        frame = self._stocks.get(symbol)
+        if frame is None:
+            recorded = self._recorded('yfinance', symbol)
+            if recorded is not None:
+                frame = pd.DataFrame(recorded['data'], index=pd.DatetimeIndex(recorded['index']))
+            else:
+                rng = self._rng(symbol)
+                index = pd.bdate_range(end=self.end, periods=self.history_days)
+                close = rng.uniform(10, 500) * np.exp(np.cumsum(rng.normal(0.0003, 0.018, len(index))))
+                spread = np.abs(rng.normal(0, 0.01, len(index)))
+                frame = pd.DataFrame({
+                    'Open': close * (1 + rng.normal(0, 0.005, len(index))),
+                    'High': close * (1 + spread),
+                    'Low': close * (1 - spread),
+                    'Close': close,
+                    'Volume': rng.integers(100_000, 10_000_000, len(index))
+                }, index=index)
+            self._stocks[symbol] = frame
+        return frame
+
+    def coin(self, coin_id: str) -> pd.Series:
+        """Preços diários (USD) de uma criptomoeda"""
+        series = self._coins.get(coin_id)
+        if series is None:
+            recorded = self._recorded('coingecko', coin_id)
+            if recorded is not None:
+                series = pd.Series([price for _, price in recorded['prices']],
+                                   index=pd.to_datetime([ms for ms, _ in recorded['prices']], unit='ms'))
+            else:
+                rng = self._rng(coin_id)
+                index = pd.date_range(end=self.end, periods=self.history_days, freq='D')
+                series = pd.Series(rng.uniform(0.1, 50_000) * np.exp(np.cumsum(rng.normal(0.0005, 0.04, len(index)))),
+                                   index=index)
+            self._coins[coin_id] = series
+        return series
+
+    # yfinance
+
+    def history(self, symbol: str, period: str = '1mo', **kwargs) -> pd.DataFrame:
+        self._call('yfinance')
+        if symbol.upper().startswith('BAD'):
+            return pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+        return self.stock(symbol).iloc[-PERIOD_BARS.get(period, 21):]
+
+    def download(self, tickers, period: str = '1mo', **kwargs) -> pd.DataFrame:
+        """Mesmo formato do yf.download(group_by='column'): colunas (campo, símbolo)"""
+        self._call('yfinance')
+        if isinstance(tickers, str):
+            tickers = tickers.replace(',', ' ').split()
+        frames = {symbol: self.stock(symbol).iloc[-PERIOD_BARS.get(period, 21):]
+                  for symbol in tickers if not symbol.upper().startswith('BAD')}
+        if not frames:
+            return pd.DataFrame()
+        data = pd.concat(frames, axis=1)
+        return data.swaplevel(0, 1, axis=1).sort_index(axis=1)
+
+    def ticker(self, symbol: str):
+        fixtures = self
+
+        class Ticker:
+            def __init__(self):
+                self.ticker = symbol.upper()
+
+            def history(self, period: str = '1mo', **kwargs):
+                return fixtures.history(self.ticker, period, **kwargs)
+
+            @property
+            def info(self):
+                fixtures._call('yfinance')
+                if self.ticker.startswith('BAD'):
+                    return {}
+                close = float(fixtures.stock(self.ticker)['Close'].iloc[-1])
+                return {'symbol': self.ticker, 'longName': f'{self.ticker} Inc.', 'shortName': self.ticker,
+                        'exchange': 'NMS', 'currency': 'USD', 'regularMarketPrice': close}
+
+        return Ticker()
+
+    # CoinGecko
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> FakeResponse:
+        """Substituto de requests.get"""
+        return self.coingecko(url, params, **kwargs)
+
+    def coingecko(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> FakeResponse:
+        self._call('coingecko')
+        path = urlparse(url).path.split('/api/v3/', 1)[-1].strip('/').split('/')
+        query = urlparse(url).query
+        if path == ['search']:
+            symbol = query.split('query=', 1)[-1].upper()
+            return FakeResponse({'coins': [{'id': f'{symbol.lower()}-coin', 'symbol': symbol.lower(),
+                                            'name': f'{symbol.title()} Coin'}]})
+        if len(path) == 3 and path[0] == 'coins' and path[2] == 'market_chart':
+            days = int((params or {}).get('days', 365))
+            series = self.coin(path[1]).iloc[-days:]
+            stamps = (series.index.asi8 // 1_000_000).tolist()
+            return FakeResponse({'prices': [[ms, price] for ms, price in zip(stamps, series.tolist())],
+                                 'total_volumes': [[ms, 1e9] for ms in stamps]})
+        if len(path) == 2 and path[0] == 'coins':
+            return FakeResponse({'name': path[1], 'market_data': {
+                'current_price': {'usd': float(self.coin(path[1]).iloc[-1])}}})
+        return FakeResponse({'error': 'not found'}, 404)
+
+    @contextmanager
+    def installed(self):
+        """Substitui yfinance e o requests.get enquanto o bloco roda"""
+        import requests
+        import yfinance
+
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch.object(yfinance, 'Ticker', self.ticker))
+            stack.enter_context(mock.patch.object(yfinance, 'download', self.download))
+            stack.enter_context(mock.patch.object(requests, 'get', self.get))
+            yield self
+
+
+def symbols(count: int, prefix: str = 'S') -> List[str]:
+    """Símbolos sintéticos estáveis: S0000, S0001, ..."""
+    return [f'{prefix}{i:04d}' for i in range(count)]
@@ -0,0 +1,443 @@
+"""
+Teste de carga de ponta a ponta: a aplicação sob gunicorn com provedores falsos
+
+    python -m benchmarks.load                                   # 2 workers, mistura padrão
+    python -m benchmarks.load --workers 1 2 4 --concurrency 32  # dimensionamento de workers
+    python -m benchmarks.load --latency-ms 200 --error-rate 0.02
+    python -m benchmarks.load --rate 50                         # carga aberta: 50 req/s
+    python -m benchmarks.load --set MONITORING_QUOTE_TTL=0 --json sem-cache.json
+    python -m benchmarks.load --compare sem-cache.json          # compara com outra rodada
+
+Cada rodada sobe o gunicorn em um diretório temporário (banco SQLite e
+data/ próprios) com `benchmarks.loadtest_app`, que troca yfinance, CoinGecko
+e nasdaqtrader pelos stubs de `benchmarks.stubs`. Os clientes sorteiam as
+rotas pela mistura (`--mix`) e os símbolos com popularidade Zipf, como em
+tráfego real, e a latência conta desde o envio planejado: em carga aberta
+(`--rate`) a fila que se forma quando o servidor não acompanha entra nos
+percentis.
+
+Ao final são impressos p50/p95/p99 e a taxa de erro (HTTP >= 400 ou falha
+de conexão) por rota, e a taxa de acerto dos caches e as chamadas externas
+lidas de /metrics.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from benchmarks.fixtures import MarketFixtures, symbols
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = 'search=35,asset=20,metrics=15,monitoring=15,alerts=10,optimize=5'
+PERCENTILES = (50, 95, 99)
+
+
+class Workload:
+    """Gera as requisições: símbolos sorteados com popularidade Zipf"""
+
+    def __init__(self, universe: int, history_days: int):
+        self.stocks = symbols(universe)
+        self.coins = symbols(max(1, universe // 5), 'C')
+        self._stock_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(self.stocks) + 1)))
+        self._coin_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(self.coins) + 1)))
+        # Mesma semente e histórico dos stubs: os preços batem com os do servidor
+        self._fixtures = MarketFixtures(history_days=history_days)
+        self._prices: Dict[str, float] = {}
+
+    def stock(self, rng: random.Random) -> str:
+        return rng.choices(self.stocks, cum_weights=self._stock_weights)[0]
+
+    def coin(self, rng: random.Random) -> str:
+        return rng.choices(self.coins, cum_weights=self._coin_weights)[0]
+
+    def basket(self, rng: random.Random, count: int, crypto: float = 0.0) -> List[Tuple[str, str]]:
+        """`count` ativos distintos como (símbolo, tipo)"""
+        count = min(count, len(self.stocks))
+        assets: Dict[str, str] = {}
+        while len(assets) < count:
+            if rng.random() < crypto:
+                assets[self.coin(rng)] = 'crypto'
+            else:
+                assets[self.stock(rng)] = 'stock'
+        return list(assets.items())
+
+    def price(self, symbol: str) -> float:
+        if symbol not in self._prices:
+            self._prices[symbol] = float(self._fixtures.stock(symbol)['Close'].iloc[-1])
+        return self._prices[symbol]
+
+    # Requisições de cada rota: (método, caminho, corpo JSON)
+
+    def search(self, rng):
+        symbol = self.stock(rng)
+        return 'GET', f'/search-assets?query={symbol[:rng.randint(2, len(symbol))]}&type=all', None
+
+    def asset(self, rng):
+        if rng.random() < 0.2:
+            return 'GET', f'/asset-data?symbol={self.coin(rng)}&type=crypto&period=1y', None
+        return 'GET', f'/asset-data?symbol={self.stock(rng)}&type=stock&period=1y', None
+
+    def metrics(self, rng):
+        assets = [{'symbol': symbol, 'type': asset_type, 'weight': 1}
+                  for symbol, asset_type in self.basket(rng, rng.randint(3, 10), crypto=0.2)]
+        return 'POST', '/calculate-metrics', {'assets': assets}
+
+    def monitoring(self, rng):
+        assets = [{'symbol': symbol} for symbol, _ in self.basket(rng, rng.randint(5, 15))]
+        return 'POST', '/api/monitoring/portfolio', {'assets': assets}
+
+    def alerts(self, rng):
+        symbol = self.stock(rng)
+        factor = rng.uniform(0.8, 1.2)
+        return 'POST', '/api/alerts/price', {'symbol': symbol, 'target_price': round(self.price(symbol) * factor, 2),
+                                             'condition': 'above' if factor > 1 else 'below'}
+
+    def optimize(self, rng):
+        return 'POST', '/api/optimize-portfolio', {
+            'symbols': [symbol for symbol, _ in self.basket(rng, rng.randint(3, 8))], 'period': '1y'}
+
+
+ROUTES = ('search', 'asset', 'metrics', 'monitoring', 'alerts', 'optimize')
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ROUTES:
+            raise argparse.ArgumentTypeError(f'rota desconhecida: {name} (use {", ".join(ROUTES)})')
+        mix[name] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError('a mistura precisa de pelo menos uma rota com peso')
+    return mix
+
+
+def parse_setting(text: str) -> Tuple[str, str]:
+    key, sep, value = text.partition('=')
+    if not sep or not key:
+        raise argparse.ArgumentTypeError(f'use CHAVE=VALOR: {text}')
+    return key, value
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """gunicorn com benchmarks.loadtest_app em um diretório temporário"""
+
+    def __init__(self, workers: int, threads: int, env: Dict[str, str]):
+        self.workers = workers
+        self.threads = threads
+        self.workdir = tempfile.mkdtemp(prefix='portfolio-load-')
+        self.env = dict(os.environ, PYTHONPATH=ROOT,
+                        DATABASE_URL=f"sqlite:///{os.path.join(self.workdir, 'app.db')}", **env)
+        self.env.pop('PROFILE_TOKEN', None)
+        self.port = _free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.log_path = os.path.join(self.workdir, 'gunicorn.log')
+        self._process: Optional[subprocess.Popen] = None
+
+    def _log_tail(self, lines: int = 20) -> str:
+        with open(self.log_path) as f:
+            return ''.join(f.readlines()[-lines:])
+
+    def start(self, timeout: float = 60):
+        # Banco e catálogo preparados uma vez, sem falhas simuladas
+        prepare_env = dict(self.env, SYMBOL_CATALOG_ENABLED='0', ALERT_SCHEDULER_ENABLED='0', STUB_ERROR_RATE='0',
+                           **{f'STUB_{provider}_ERROR_RATE': '0' for provider in ('YFINANCE', 'COINGECKO', 'NASDAQTRADER')})
+        subprocess.run([sys.executable, '-m', 'benchmarks.loadtest_app'], cwd=self.workdir, env=prepare_env,
+                       check=True, stdout=subprocess.DEVNULL)
+
+        with open(self.log_path, 'w') as log:
+            self._process = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '--workers', str(self.workers), '--threads', str(self.threads),
+                 '--bind', f'127.0.0.1:{self.port}', '--timeout', '120', 'benchmarks.loadtest_app:app'],
+                cwd=self.workdir, env=self.env, stdout=log, stderr=subprocess.STDOUT
+            )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f'gunicorn encerrou ao iniciar:\n{self._log_tail()}')
+            try:
+                if requests.get(f'{self.url}/api/startup', timeout=1).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f'gunicorn não respondeu em {timeout:.0f}s:\n{self._log_tail()}')
+
+    def stop(self):
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+def seed_alerts(server: Server, workload: Workload, count: int):
+    """Alertas ativos antes da carga, criados em lotes pela rota bulk"""
+    rng = random.Random(count)
+    for start in range(0, count, 1000):
+        alerts = []
+        for _ in range(min(1000, count - start)):
+            symbol = workload.stock(rng)
+            factor = rng.uniform(0.8, 1.2)
+            alerts.append({'symbol': symbol, 'target_price': round(workload.price(symbol) * factor, 2),
+                           'condition': 'above' if factor > 1 else 'below'})
+        response = requests.post(f'{server.url}/api/alerts/price/bulk', json={'alerts': alerts}, timeout=120)
+        if response.status_code != 200:
+            raise RuntimeError(f'Falha ao criar alertas: HTTP {response.status_code} {response.text[:200]}')
+
+
+def drive(url: str, workload: Workload, mix: Dict[str, float], concurrency: int, duration: float,
+          warmup: float, rate: float, timeout: float, seed: int) -> List[Tuple[str, int, float]]:
+    """
+    Dispara a carga e retorna (rota, status, segundos) das requisições medidas
+
+    Sem `rate` cada cliente envia a próxima requisição assim que recebe a
+    resposta (carga fechada). Com `rate` as requisições têm horários fixos
+    (carga aberta) e a latência conta a partir do horário planejado.
+    """
+    names = [name for name in mix if mix[name] > 0]
+    weights = list(itertools.accumulate(mix[name] for name in names))
+    started = time.perf_counter() + 0.1
+    measured_from = started + warmup
+    deadline = measured_from + duration
+    ticket = itertools.count()
+    ticket_lock = threading.Lock()
+    samples: List[List[Tuple[str, int, float]]] = [[] for _ in range(concurrency)]
+
+    def client(index):
+        rng = random.Random(seed * 1000 + index)
+        session = requests.Session()
+        time.sleep(max(0.0, started - time.perf_counter()))
+        while True:
+            if rate:
+                with ticket_lock:
+                    planned = started + next(ticket) / rate
+                if planned >= deadline:
+                    break
+                delay = planned - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            else:
+                planned = time.perf_counter()
+                if planned >= deadline:
+                    break
+            route = rng.choices(names, cum_weights=weights)[0]
+            method, path, body = getattr(workload, route)(rng)
+            try:
+                status = session.request(method, url + path, json=body, timeout=timeout).status_code
+            except requests.RequestException:
+                status = 0
+            if planned >= measured_from:
+                samples[index].append((route, status, time.perf_counter() - planned))
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [sample for client_samples in samples for sample in client_samples]
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    return values[min(len(values) - 1, max(0, math.ceil(percent / 100 * len(values)) - 1))]
+
+
+def summarize(samples: List[Tuple[str, int, float]], duration: float) -> Dict[str, Dict[str, Any]]:
+    groups: Dict[str, List[Tuple[int, float]]] = {}
+    for route, status, seconds in samples:
+        groups.setdefault(route, []).append((status, seconds))
+        groups.setdefault('total', []).append((status, seconds))
+
+    summary = {}
+    for route, rows in groups.items():
+        latencies = sorted(seconds for _, seconds in rows)
+        statuses: Dict[str, int] = {}
+        for status, _ in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        errors = sum(1 for status, _ in rows if status == 0 or status >= 400)
+        summary[route] = {
+            'requests': len(rows),
+            'rps': len(rows) / duration,
+            'error_rate': errors / len(rows),
+            'statuses': statuses,
+            'mean_ms': 1000 * sum(latencies) / len(latencies),
+            'max_ms': 1000 * latencies[-1],
+            **{f'p{percent}_ms': 1000 * _percentile(latencies, percent) for percent in PERCENTILES}
+        }
+    return summary
+
+
+METRIC_LINE = re.compile(r'^(\w+)\{([^}]*)\} (\S+)$')
+
+
+def scrape_metrics(url: str) -> Dict[str, Dict[str, float]]:
+    """Taxa de acerto dos caches e chamadas externas (somadas entre os workers)"""
+    result = {'cache_hit_ratio': {}, 'upstream_calls': {}, 'upstream_errors': {}}
+    try:
+        text = requests.get(f'{url}/metrics', timeout=30).text
+    except requests.RequestException:
+        return result
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if not match:
+            continue
+        name, labels, value = match.groups()
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', labels))
+        if name == 'portfolio_cache_hit_ratio':
+            result['cache_hit_ratio'][labels['cache']] = float(value)
+        elif name == 'portfolio_upstream_request_duration_seconds_count':
+            calls = result['upstream_calls']
+            calls[labels['provider']] = calls.get(labels['provider'], 0) + float(value)
+        elif name == 'portfolio_upstream_errors_total':
+            errors = result['upstream_errors']
+            errors[labels['provider']] = errors.get(labels['provider'], 0) + float(value)
+    return result
+
+
+def _ms(value: float) -> str:
+    return f'{value:.0f}ms' if value >= 10 else f'{value:.1f}ms'
+
+
+def print_run(run: Dict[str, Any]):
+    print(f"\n== {run['workers']} worker(s) × {run['threads']} threads: "
+          f"{run['total'].get('requests', 0)} requisições em {run['duration']:.0f}s ==")
+    print(f"{'rota':<12} {'req':>7} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'máx':>8} {'erros':>7}")
+    for route in [*ROUTES, 'total']:
+        stats = run['routes'].get(route)
+        if not stats:
+            continue
+        print(f"{route:<12} {stats['requests']:>7} {stats['rps']:>8.1f} {_ms(stats['p50_ms']):>8} "
+              f"{_ms(stats['p95_ms']):>8} {_ms(stats['p99_ms']):>8} {_ms(stats['max_ms']):>8} "
+              f"{stats['error_rate']:>6.1%}")
+    metrics = run['metrics']
+    if metrics['cache_hit_ratio']:
+        print('cache: ' + ', '.join(f'{name} {ratio:.0%}' for name, ratio in sorted(metrics['cache_hit_ratio'].items())))
+    if metrics['upstream_calls']:
+        print('chamadas externas: ' + ', '.join(
+            f"{name} {calls:.0f}" + (f" ({metrics['upstream_errors'][name]:.0f} erros)"
+                                     if metrics['upstream_errors'].get(name) else '')
+            for name, calls in sorted(metrics['upstream_calls'].items())))
+
+
+def print_comparison(runs: List[Dict[str, Any]], reference: Dict[str, Any]):
+    previous = {(run['workers'], run['threads']): run for run in reference.get('runs', [])}
+    for run in runs:
+        other = previous.get((run['workers'], run['threads']))
+        if other is None:
+            continue
+        print(f"\n== comparação, {run['workers']} worker(s) × {run['threads']} threads (referência → atual) ==")
+        print(f"{'rota':<12} {'req/s':>20} {'p95':>22} {'p99':>22} {'erros':>16}")
+        for route in [*ROUTES, 'total']:
+            before, after = other['routes'].get(route), run['routes'].get(route)
+            if not before or not after:
+                continue
+
+            def change(key, fmt):
+                delta = (after[key] / before[key] - 1) if before[key] else 0.0
+                return f'{fmt(before[key])} → {fmt(after[key])} ({delta:+.0%})'
+            print(f"{route:<12} {change('rps', lambda v: f'{v:.1f}'):>20} {change('p95_ms', _ms):>22} "
+                  f"{change('p99_ms', _ms):>22} "
+                  f"{before['error_rate']:>6.1%} → {after['error_rate']:.1%}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Teste de carga do Analisador de Portfólio sob gunicorn')
+    parser.add_argument('--workers', type=int, nargs='+', default=[2], help='workers do gunicorn; vários valores = uma rodada por valor')
+    parser.add_argument('--threads', type=int, default=4, help='threads por worker (gthread, padrão 4)')
+    parser.add_argument('--concurrency', type=int, default=16, help='clientes simultâneos (padrão 16)')
+    parser.add_argument('--duration', type=float, default=30, help='segundos medidos (padrão 30)')
+    parser.add_argument('--warmup', type=float, default=5, help='segundos de aquecimento não medidos (padrão 5)')
+    parser.add_argument('--rate', type=float, default=0, help='requisições por segundo em carga aberta (padrão: carga fechada)')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX), help=f'pesos das rotas (padrão {DEFAULT_MIX})')
+    parser.add_argument('--latency-ms', type=float, default=50, help='latência mediana dos provedores falsos (padrão 50)')
+    parser.add_argument('--error-rate', type=float, default=0, help='fração de chamadas externas que falham (padrão 0)')
+    parser.add_argument('--universe', type=int, default=500, help='ações no universo; 20%% disso em cripto (padrão 500)')
+    parser.add_argument('--history-days', type=int, default=756, help='pregões de histórico por ativo (padrão 756)')
+    parser.add_argument('--alerts', type=int, default=1000, help='alertas ativos criados antes da carga (padrão 1000)')
+    parser.add_argument('--timeout', type=float, default=60, help='timeout de cada requisição em segundos')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--set', dest='settings', type=parse_setting, action='append', default=[], metavar='CHAVE=VALOR',
+                        help='variável de ambiente da aplicação/stubs (ex.: MONITORING_QUOTE_TTL=0)')
+    parser.add_argument('--json', help='grava os resultados neste arquivo')
+    parser.add_argument('--compare', help='resultados (--json) de uma rodada anterior para comparar')
+    args = parser.parse_args(argv)
+
+    env = {
+        'STUB_LATENCY_MS': str(args.latency_ms),
+        'STUB_ERROR_RATE': str(args.error_rate),
+        'STUB_UNIVERSE': str(args.universe),
+        'STUB_HISTORY_DAYS': str(args.history_days),
+        # Métricas de cada worker chegam a /metrics em até 1s
+        'METRICS_FLUSH_SECONDS': '1',
+        **dict(args.settings)
+    }
+    workload = Workload(args.universe, args.history_days)
+    print(f"mistura: {', '.join(f'{name}={weight:g}' for name, weight in args.mix.items())} | "
+          f"{args.concurrency} clientes | " + (f'{args.rate:g} req/s | ' if args.rate else 'carga fechada | ') +
+          f"provedores {args.latency_ms:g}ms, {args.error_rate:.1%} de erros"
+          + (f" | {' '.join(f'{key}={value}' for key, value in args.settings)}" if args.settings else ''))
+
+    runs = []
+    for workers in args.workers:
+        server = Server(workers, args.threads, env)
+        try:
+            server.start()
+            if args.alerts:
+                seed_alerts(server, workload, args.alerts)
+            samples = drive(server.url, workload, args.mix, args.concurrency, args.duration, args.warmup,
+                            args.rate, args.timeout, args.seed)
+            time.sleep(1.1)
+            run = {'workers': workers, 'threads': args.threads, 'duration': args.duration,
+                   'routes': summarize(samples, args.duration), 'metrics': scrape_metrics(server.url)}
+        finally:
+            server.stop()
+        run['total'] = run['routes'].get('total', {})
+        runs.append(run)
+        print_run(run)
+
+    if len(runs) > 1:
+        print(f"\n{'workers':>8} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'erros':>7}")
+        for run in runs:
+            total = run['total']
+            if total:
+                print(f"{run['workers']:>8} {total['rps']:>8.1f} {_ms(total['p50_ms']):>8} {_ms(total['p95_ms']):>8} "
+                      f"{_ms(total['p99_ms']):>8} {total['error_rate']:>6.1%}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(runs, json.load(f))
+
+    if args.json:
+        config = {key: value for key, value in vars(args).items() if key not in ('json', 'compare')}
+        config['settings'] = dict(args.settings)
+        with open(args.json, 'w') as f:
+            json.dump({'config': config, 'runs': runs}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,29 @@
+"""
+Aplicação Flask com os provedores externos substituídos pelos stubs
+
+    gunicorn benchmarks.loadtest_app:app          # usado por benchmarks.load
+    python -m benchmarks.loadtest_app             # prepara o banco e o catálogo
+
+Cada worker instala os stubs antes de importar a aplicação. Rodado como
+script, cria as tabelas e grava o catálogo de símbolos uma única vez, para
+que os workers não disputem o create_all e já subam com o catálogo pronto.
+"""
+import os
+import sys
+from contextlib import ExitStack
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'src'), ROOT]
+
+from benchmarks.stubs import StubProviders
+
+providers = StubProviders()
+_stubs = ExitStack()
+_stubs.enter_context(providers.installed())
+
+from main import app, symbol_catalog
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        print(f'Catálogo de símbolos: {symbol_catalog.refresh()}')
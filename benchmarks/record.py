@@ -0,0 +1,74 @@
+"""
+Grava respostas reais do yfinance e do CoinGecko como fixtures dos benchmarks
+
+    python -m benchmarks.record AAPL MSFT S0001=SPY --coins C0000=bitcoin BTC=bitcoin
+
+Cada ação vira `fixtures/yfinance/<SÍMBOLO>.json` (OHLCV diário) e cada
+moeda `fixtures/coingecko/<símbolo>-coin.json` (market_chart). `NOME=FONTE`
+grava os dados da fonte sob o símbolo usado pelos benchmarks (S0000..,
+C0000..), substituindo a série sintética daquele símbolo.
+"""
+import argparse
+import json
+import os
+
+from benchmarks.fixtures import FIXTURES_DIR
+
+
+def _split(spec: str):
+    name, _, source = spec.partition('=')
+    return name, source or name
+
+
+def record_stock(name: str, source: str, period: str):
+    import yfinance as yf
+
+    hist = yf.Ticker(source).history(period=period, auto_adjust=True)
+    if hist.empty:
+        raise SystemExit(f'Sem dados para {source}')
+    frame = hist[['Open', 'High', 'Low', 'Close', 'Volume']]
+    payload = {
+        'source': source,
+        'index': [timestamp.strftime('%Y-%m-%d') for timestamp in frame.index],
+        'data': {column: frame[column].astype(float).tolist() for column in frame.columns}
+    }
+    _write('yfinance', name.upper(), payload)
+
+
+def record_coin(name: str, source: str, days: int):
+    import requests
+
+    response = requests.get(f'https://api.coingecko.com/api/v3/coins/{source}/market_chart',
+                            params={'vs_currency': 'usd', 'days': days}, timeout=30)
+    response.raise_for_status()
+    payload = response.json()
+    payload['source'] = source
+    # A busca falsa do CoinGecko devolve o id '<símbolo>-coin'
+    _write('coingecko', f'{name.lower()}-coin', payload)
+
+
+def _write(kind: str, name: str, payload):
+    directory = os.path.join(FIXTURES_DIR, kind)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'{name}.json')
+    with open(path, 'w') as f:
+        json.dump(payload, f)
+    print(f'{path} ({len(payload.get("index", payload.get("prices", [])))} barras)')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Grava fixtures de mercado para os benchmarks')
+    parser.add_argument('stocks', nargs='*', help='símbolos (ou NOME=SÍMBOLO) do yfinance')
+    parser.add_argument('--coins', nargs='*', default=[], help='SÍMBOLO=ID do CoinGecko')
+    parser.add_argument('--period', default='10y', help='período do yfinance (padrão 10y)')
+    parser.add_argument('--days', type=int, default=365, help='dias do CoinGecko (padrão 365)')
+    args = parser.parse_args(argv)
+
+    for spec in args.stocks:
+        record_stock(*_split(spec), args.period)
+    for spec in args.coins:
+        record_coin(*_split(spec), args.days)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Roda os benchmarks offline e compara com a baseline gravada
+
+    python -m benchmarks.run                      # todos os casos
+    python -m benchmarks.run --quick              # só as escalas pequenas
+    python -m benchmarks.run -k frontier          # filtra pelo nome
+    python -m benchmarks.run --update-baseline    # grava os resultados como baseline
+
+O tempo é o melhor de N repetições sem tracemalloc; o pico de memória vem de
+uma execução extra com tracemalloc ligado. Sai com código 1 se algum caso
+ficar acima da baseline além da tolerância.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+# Tolerâncias padrão sobre a baseline (fração) e piso absoluto para o tempo:
+# casos de poucos milissegundos variam mais que isso só com o ruído da máquina
+DEFAULT_THRESHOLDS = {'time': 0.5, 'memory': 0.25, 'min_seconds': 0.01}
+
+
+def _prepare_environment():
+    """Banco em memória, sem threads em segundo plano e data/ em um diretório temporário"""
+    sys.path[:0] = [os.path.join(ROOT, 'src'), ROOT]
+    os.environ['DATABASE_URL'] = 'sqlite://'
+    os.environ['ALERT_SCHEDULER_ENABLED'] = '0'
+    os.environ['SYMBOL_CATALOG_ENABLED'] = '0'
+    os.environ.pop('PROFILE_TOKEN', None)
+    os.chdir(tempfile.mkdtemp(prefix='portfolio-bench-'))
+
+
+def measure(case, scale, fixtures, repeats):
+    timings = []
+    for _ in range(repeats):
+        run = case.setup(scale, fixtures)
+        gc.collect()
+        started = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - started)
+
+    run = case.setup(scale, fixtures)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'seconds': min(timings),
+        'median_seconds': sorted(timings)[len(timings) // 2],
+        'peak_mb': peak / 2 ** 20,
+        'repeats': repeats
+    }
+
+
+def compare(result, baseline, thresholds):
+    """Lista de regressões de um caso em relação à baseline"""
+    if baseline is None:
+        return []
+    limits = dict(DEFAULT_THRESHOLDS, **thresholds, **baseline.get('thresholds', {}))
+    problems = []
+    allowed = baseline['seconds'] * (1 + limits['time'])
+    if result['seconds'] > allowed and result['seconds'] - baseline['seconds'] > limits['min_seconds']:
+        problems.append(f"tempo {result['seconds']:.3f}s > {allowed:.3f}s")
+    allowed = baseline['peak_mb'] * (1 + limits['memory'])
+    if result['peak_mb'] > allowed and result['peak_mb'] - baseline['peak_mb'] > 1:
+        problems.append(f"memória {result['peak_mb']:.1f}MB > {allowed:.1f}MB")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks offline do Analisador de Portfólio')
+    parser.add_argument('-k', '--filter', help='roda apenas casos cujo nome contém o texto')
+    parser.add_argument('--quick', action='store_true', help='apenas as escalas pequenas')
+    parser.add_argument('--repeat', type=int, default=3, help='repetições por caso (padrão 3)')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='arquivo da baseline')
+    parser.add_argument('--update-baseline', action='store_true', help='grava os resultados como nova baseline')
+    parser.add_argument('--json', help='grava os resultados neste arquivo')
+    args = parser.parse_args(argv)
+
+    _prepare_environment()
+    from benchmarks.cases import CASES
+    from benchmarks.fixtures import MarketFixtures
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    thresholds = baseline.get('thresholds', {})
+
+    fixtures = MarketFixtures()
+    results, regressions = {}, {}
+    print(f"{'caso':<32} {'tempo':>10} {'mediana':>10} {'pico':>10} {'baseline':>10}  status")
+    with fixtures.installed():
+        for case in CASES:
+            if args.filter and args.filter not in case.name:
+                continue
+            for scale in (case.quick_scales if args.quick else case.scales):
+                key = f'{case.name}[{scale}]'
+                result = measure(case, scale, fixtures, case.repeats(scale, args.repeat))
+                results[key] = result
+                reference = baseline.get('cases', {}).get(key)
+                problems = compare(result, reference, thresholds)
+                if problems:
+                    regressions[key] = problems
+                status = 'REGRESSÃO: ' + '; '.join(problems) if problems else ('ok' if reference else 'sem baseline')
+                print(f"{key:<32} {result['seconds']:>9.3f}s {result['median_seconds']:>9.3f}s "
+                      f"{result['peak_mb']:>8.1f}MB "
+                      f"{(format(reference['seconds'], '.3f') + 's') if reference else '-':>10}  {status}")
+
+    report = {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'processor': platform.processor() or platform.machine(), 'cpus': os.cpu_count()},
+        'cases': results
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        merged = dict(baseline.get('cases', {}))
+        for key, result in results.items():
+            entry = {'seconds': round(result['seconds'], 4), 'peak_mb': round(result['peak_mb'], 1)}
+            if 'thresholds' in merged.get(key, {}):
+                entry['thresholds'] = merged[key]['thresholds']
+            merged[key] = entry
+        with open(args.baseline, 'w') as f:
+            json.dump({'created_at': report['created_at'], 'machine': report['machine'],
+                       'thresholds': thresholds or DEFAULT_THRESHOLDS, 'cases': merged}, f, indent=2)
+            f.write('\n')
+        print(f'Baseline gravada em {args.baseline}')
+        return 0
+
+    if regressions:
+        print(f'{len(regressions)} caso(s) acima da baseline')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Provedores de dados falsos com latência e erros configuráveis
+
+Usados pelo teste de carga (`benchmarks.load`): cada worker do gunicorn
+instala os stubs no lugar do yfinance e do requests.get, então as chamadas
+externas custam o tempo configurado (o sleep libera o GIL como uma espera
+de rede real) e falham na taxa configurada, sem sair da máquina.
+
+Configuração por variáveis de ambiente (lidas no construtor):
+- STUB_LATENCY_MS: latência mediana de cada chamada (padrão 50)
+- STUB_LATENCY_SIGMA: dispersão da latência log-normal (padrão 0.5)
+- STUB_ERROR_RATE: fração de chamadas que falham (padrão 0)
+- STUB_<PROVEDOR>_LATENCY_MS, STUB_<PROVEDOR>_ERROR_RATE: valores só para
+  YFINANCE, COINGECKO ou NASDAQTRADER
+- STUB_UNIVERSE: ações nas listas de símbolos; 20% disso em criptomoedas (padrão 500)
+- STUB_HISTORY_DAYS: pregões de histórico por ativo (padrão 756, 3 anos)
+"""
+import math
+import os
+import random
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+from benchmarks.fixtures import FakeResponse, MarketFixtures, symbols
+
+PROVIDERS = ('yfinance', 'coingecko', 'nasdaqtrader')
+
+NASDAQ_HEADER = 'Symbol|Security Name|Market Category|Test Issue|Financial Status|Round Lot Size|ETF|NextShares'
+OTHER_HEADER = 'ACT Symbol|Security Name|Exchange|CQS Symbol|ETF|Round Lot Size|Test Issue|NASDAQ Symbol'
+
+
+class StubProviderError(RuntimeError):
+    """Falha simulada de um provedor externo"""
+
+
+class StubProviders(MarketFixtures):
+    def __init__(self):
+        super().__init__(history_days=int(os.environ.get('STUB_HISTORY_DAYS', 756)))
+        latency = float(os.environ.get('STUB_LATENCY_MS', 50))
+        error_rate = float(os.environ.get('STUB_ERROR_RATE', 0))
+        self.sigma = float(os.environ.get('STUB_LATENCY_SIGMA', 0.5))
+        self.settings = {
+            provider: {
+                'latency_ms': float(os.environ.get(f'STUB_{provider.upper()}_LATENCY_MS', latency)),
+                'error_rate': float(os.environ.get(f'STUB_{provider.upper()}_ERROR_RATE', error_rate))
+            }
+            for provider in PROVIDERS
+        }
+        self.universe = int(os.environ.get('STUB_UNIVERSE', 500))
+        self._random = random.Random()
+
+    def _call(self, provider: str):
+        super()._call(provider)
+        settings = self.settings[provider]
+        if settings['latency_ms'] > 0:
+            time.sleep(self._random.lognormvariate(math.log(settings['latency_ms']), self.sigma) / 1000)
+        if self._random.random() < settings['error_rate']:
+            raise StubProviderError(f'{provider}: falha simulada')
+
+    # requests.get
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None, **kwargs) -> FakeResponse:
+        parsed = urlparse(url)
+        provider = 'nasdaqtrader' if parsed.netloc.endswith('nasdaqtrader.com') else 'coingecko'
+        try:
+            if provider == 'nasdaqtrader':
+                self._call(provider)
+                return FakeResponse(text=self._listing_text(parsed.path.endswith('otherlisted.txt')))
+            if parsed.path.endswith('/coins/markets'):
+                self._call(provider)
+                return FakeResponse(self._markets_page(int((params or {}).get('page', 1)),
+                                                       int((params or {}).get('per_page', 250))))
+            return super().get(url, params, **kwargs)
+        except StubProviderError as e:
+            # O CoinGecko responde 429 quando limita a taxa de chamadas
+            return FakeResponse({'error': str(e)}, 429 if provider == 'coingecko' else 503)
+
+    def _listing_text(self, other: bool) -> str:
+        # Ações pares na Nasdaq, ímpares na NYSE; uma em cada dez é ETF
+        lines = [OTHER_HEADER if other else NASDAQ_HEADER]
+        for i, symbol in enumerate(symbols(self.universe)):
+            if i % 2 != int(other):
+                continue
+            etf = 'Y' if i % 10 == 0 else 'N'
+            name = f'{symbol} {"Index Fund" if etf == "Y" else "Holdings Inc."} - Common Stock'
+            lines.append(f'{symbol}|{name}|N|{symbol}|{etf}|100|N|{symbol}' if other
+                         else f'{symbol}|{name}|Q|N|N|100|{etf}|')
+        lines.append('File Creation Time: 0101202600:00|||||||')
+        return '\n'.join(lines)
+
+    def _markets_page(self, page: int, per_page: int):
+        coins = symbols(max(1, self.universe // 5), 'C')[(page - 1) * per_page:page * per_page]
+        return [{'id': f'{symbol.lower()}-coin', 'symbol': symbol.lower(), 'name': f'{symbol.title()} Coin'}
+                for symbol in coins]
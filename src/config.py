@@ -0,0 +1,117 @@
+import os
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import make_url
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATABASE_PATH = os.path.join(ROOT_DIR, 'data', 'app.db')
+# Local antigo, que era versionado junto com o código
+LEGACY_DATABASE_PATH = os.path.join(ROOT_DIR, 'src', 'database', 'app.db')
+
+
+def default_database_url() -> str:
+    """SQLite em data/app.db; instalações antigas continuam no banco de src/database"""
+    path = DEFAULT_DATABASE_PATH
+    if not os.path.exists(path) and os.path.exists(LEGACY_DATABASE_PATH):
+        print(f"Usando o banco antigo em {LEGACY_DATABASE_PATH}; mova-o para {path}")
+        path = LEGACY_DATABASE_PATH
+    return 'sqlite:///' + path
+
+
+def database_settings() -> dict:
+    """
+    Configuração do SQLAlchemy a partir de variáveis de ambiente
+
+    - DATABASE_URL: URL do banco (padrão data/app.db)
+    - DB_POOL_SIZE, DB_MAX_OVERFLOW: conexões por worker (padrão 5 + 5);
+      o total no servidor é workers × (pool + overflow)
+    - DB_POOL_TIMEOUT: segundos de espera por uma conexão (padrão 30)
+    - DB_POOL_RECYCLE: idade máxima de uma conexão em segundos (padrão 1800)
+    """
+    url = os.environ.get('DATABASE_URL') or default_database_url()
+    # Heroku e afins ainda publicam o esquema antigo do Postgres
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+
+    engine_options = {'pool_pre_ping': True}
+    parsed = make_url(url)
+    if parsed.get_backend_name() == 'sqlite':
+        # Banco em memória usa uma única conexão compartilhada (StaticPool)
+        if parsed.database not in (None, '', ':memory:'):
+            engine_options['pool_size'] = int(os.environ.get('DB_POOL_SIZE', 5))
+            engine_options['max_overflow'] = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+            engine_options['pool_timeout'] = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+            engine_options['connect_args'] = {'check_same_thread': False}
+    else:
+        engine_options['pool_size'] = int(os.environ.get('DB_POOL_SIZE', 5))
+        engine_options['max_overflow'] = int(os.environ.get('DB_MAX_OVERFLOW', 5))
+        engine_options['pool_timeout'] = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+        engine_options['pool_recycle'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+
+    return {
+        'SQLALCHEMY_DATABASE_URI': url,
+        'SQLALCHEMY_ENGINE_OPTIONS': engine_options,
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+    }
+
+
+def sqlite_pragmas() -> dict:
+    """
+    PRAGMAs aplicados a cada conexão SQLite
+
+    WAL permite leituras concorrentes com uma escrita; synchronous=NORMAL é
+    seguro com WAL e evita um fsync por commit. Ajustáveis por
+    SQLITE_SYNCHRONOUS, SQLITE_MMAP_SIZE (bytes, padrão 256 MB),
+    SQLITE_CACHE_SIZE (páginas; negativo = KiB) e SQLITE_BUSY_TIMEOUT (ms).
+    """
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', -64000)),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)),
+        'temp_store': 'MEMORY',
+        'foreign_keys': 'ON',
+    }
+
+
+def init_database(app, db):
+    """
+    Configura o banco da aplicação, cria as tabelas, colunas e índices que faltam
+
+    `create_all` não altera tabelas já existentes, então colunas novas
+    (anuláveis) e os índices declarados nos modelos são criados à parte.
+    """
+    app.config.update(database_settings())
+    db.init_app(app)
+
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == 'sqlite':
+            pragmas = sqlite_pragmas()
+
+            @event.listens_for(engine, 'connect')
+            def _set_sqlite_pragmas(dbapi_connection, connection_record):
+                cursor = dbapi_connection.cursor()
+                for name, value in pragmas.items():
+                    cursor.execute(f"PRAGMA {name} = {value}")
+                cursor.close()
+
+            # As conexões abertas antes do listener não recebem os PRAGMAs
+            engine.dispose()
+
+        database = make_url(app.config['SQLALCHEMY_DATABASE_URI']).database
+        if engine.dialect.name == 'sqlite' and database and database != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+
+        db.create_all()
+        inspector = inspect(engine)
+        for table in db.metadata.sorted_tables:
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing and column.nullable:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    with engine.begin() as conn:
+                        conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            for index in table.indexes:
+                index.create(bind=engine, checkfirst=True)
@@ -1,23 +1,85 @@
 import os
 import sys
+import time
 
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+_boot_started = time.perf_counter()
+_boot_phases = {}
+
+
+def _boot_phase(name, started):
+    # Duração de cada etapa do startup (ms), exposta em /api/startup
+    _boot_phases[name] = round((time.perf_counter() - started) * 1000, 2)
+    return time.perf_counter()
+
+
+from flask import Flask, Response, jsonify, send_from_directory
 from flask_cors import CORS
-from routes.portfolio import portfolio_bp
+from config import init_database
+from src.models.portfolio import db
+from routes.portfolio import portfolio_bp, symbol_catalog
 from routes.optimization import optimization_bp
-from routes.alerts import alerts_bp
+from routes.alerts import alerts_bp, alert_scheduler
+from routes.profiling import profiling_bp, request_profiler
+from services.lazy import lazy_loads
+from services.telemetry import PROMETHEUS_CONTENT_TYPE, init_telemetry, render_metrics
+
+_phase_started = _boot_phase('imports', _boot_started)
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
 CORS(app)
 
+# Server-Timing por requisição e histogramas/contadores de /metrics
+init_telemetry(app)
+
+# Perfil sob demanda de requisições (apenas com PROFILE_TOKEN definido)
+request_profiler.init_app(app)
+
+# Banco de dados (DATABASE_URL, pool por worker, PRAGMAs do SQLite)
+init_database(app, db)
+_phase_started = _boot_phase('database', _phase_started)
+
 # Registrar blueprints
 app.register_blueprint(portfolio_bp)
 app.register_blueprint(optimization_bp)
 app.register_blueprint(alerts_bp)
+app.register_blueprint(profiling_bp)
+_phase_started = _boot_phase('blueprints', _phase_started)
+
+# Verificação periódica dos alertas (um único líder entre os workers),
+# iniciada na primeira requisição de cada worker para funcionar com --preload
+alert_scheduler.init_app(app)
+
+# Catálogo de símbolos do autocomplete (atualizado por um único worker)
+symbol_catalog.start(app)
+_phase_started = _boot_phase('background', _phase_started)
+
+_boot_phases['total'] = round((time.perf_counter() - _boot_started) * 1000, 2)
+print(f"[startup] pid {os.getpid()} pronto em {_boot_phases['total']}ms "
+      f"({', '.join(f'{name} {ms}ms' for name, ms in _boot_phases.items() if name != 'total')})")
+
+
+@app.route('/api/startup', methods=['GET'])
+def startup_report():
+    """
+    Tempo de inicialização deste worker e dependências carregadas sob demanda
+    """
+    return jsonify({
+        'pid': os.getpid(),
+        'boot_ms': _boot_phases,
+        'lazy_loads': lazy_loads()
+    })
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """
+    Métricas de todos os workers no formato texto do Prometheus
+    """
+    return Response(render_metrics(), content_type=PROMETHEUS_CONTENT_TYPE)
 
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
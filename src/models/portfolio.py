@@ -6,11 +6,12 @@ db = SQLAlchemy()
 class Asset(db.Model):
     """Modelo para representar um ativo financeiro"""
     id = db.Column(db.Integer, primary_key=True)
-    symbol = db.Column(db.String(20), nullable=False)
+    symbol = db.Column(db.String(20), nullable=False, index=True)
     name = db.Column(db.String(200), nullable=False)
     asset_type = db.Column(db.String(20), nullable=False)  # 'stock', 'crypto', 'fund'
     exchange = db.Column(db.String(50))
     currency = db.Column(db.String(10))
+    provider_id = db.Column(db.String(100))  # id no provedor de dados (CoinGecko para cripto)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -21,6 +22,7 @@ class Asset(db.Model):
             'asset_type': self.asset_type,
             'exchange': self.exchange,
             'currency': self.currency,
+            'provider_id': self.provider_id,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
@@ -35,6 +37,12 @@ class Portfolio(db.Model):
     # Relacionamento com posições
     positions = db.relationship('Position', backref='portfolio', lazy=True, cascade='all, delete-orphan')
     
+    # NAV materializado (removido pelo banco junto com o portfólio)
+    nav_history = db.relationship('PortfolioNav', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    
+    # Paginação por (updated_at, id) na listagem
+    __table_args__ = (db.Index('ix_portfolio_updated_at_id', 'updated_at', 'id'),)
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -44,12 +52,23 @@ class Portfolio(db.Model):
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
             'positions': [pos.to_dict() for pos in self.positions]
         }
+    
+    def to_summary_dict(self, positions_count: int = 0):
+        """Projeção leve, sem as posições"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'positions_count': positions_count
+        }
 
 class Position(db.Model):
     """Modelo para representar uma posição em um portfólio"""
     id = db.Column(db.Integer, primary_key=True)
-    portfolio_id = db.Column(db.Integer, db.ForeignKey('portfolio.id'), nullable=False)
-    asset_id = db.Column(db.Integer, db.ForeignKey('asset.id'), nullable=False)
+    portfolio_id = db.Column(db.Integer, db.ForeignKey('portfolio.id'), nullable=False, index=True)
+    asset_id = db.Column(db.Integer, db.ForeignKey('asset.id'), nullable=False, index=True)
     quantity = db.Column(db.Float, nullable=False)
     average_price = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -101,3 +120,20 @@ class PriceHistory(db.Model):
             'adjusted_close': self.adjusted_close
         }
 
+class PortfolioNav(db.Model):
+    """NAV diário materializado de um portfólio salvo"""
+    id = db.Column(db.Integer, primary_key=True)
+    portfolio_id = db.Column(db.Integer, db.ForeignKey('portfolio.id', ondelete='CASCADE'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    nav = db.Column(db.Float, nullable=False)
+    # Impressão digital das posições usadas no cálculo; se mudar, o NAV é recalculado
+    positions_hash = db.Column(db.String(40), nullable=False)
+    
+    __table_args__ = (db.UniqueConstraint('portfolio_id', 'date', name='unique_portfolio_nav_date'),)
+    
+    def to_dict(self):
+        return {
+            'portfolio_id': self.portfolio_id,
+            'date': self.date.isoformat() if self.date else None,
+            'nav': self.nav
+        }
@@ -1,8 +1,19 @@
-from flask import Blueprint, request, jsonify
-from services.alerts import AlertManager
+import json
+from flask import Blueprint, Response, request, jsonify
+from services.lazy import lazy_import, lazy_service
+from services.scheduler import AlertScheduler
+
+# yfinance e pandas só são importados quando um alerta é usado
+alerts_service = lazy_import('services.alerts')
+feed = lazy_import('services.price_feed')
 
 alerts_bp = Blueprint('alerts', __name__)
-alert_manager = AlertManager()
+alert_manager = lazy_service('alert_manager', lambda: alerts_service.AlertManager())
+alert_scheduler = AlertScheduler(alert_manager)
+price_feed = lazy_service('price_feed', lambda: feed.PriceFeed(alert_manager.store))
+
+STREAM_HEARTBEAT_SECONDS = 15
+BULK_MAX_ALERTS = 10000
 
 @alerts_bp.route('/api/alerts/price', methods=['POST'])
 def create_price_alert():
@@ -31,6 +42,31 @@ def create_price_alert():
     except Exception as e:
         return jsonify({'error': f'Erro ao criar alerta: {str(e)}'}), 500
 
+@alerts_bp.route('/api/alerts/price/bulk', methods=['POST'])
+def create_price_alerts_bulk():
+    """
+    Cria vários alertas de preço em uma única transação
+    """
+    try:
+        data = request.get_json()
+        alerts = data.get('alerts') if isinstance(data, dict) else None
+        
+        if not isinstance(alerts, list) or not alerts:
+            return jsonify({'error': 'Lista de alertas é obrigatória'}), 400
+        
+        if len(alerts) > BULK_MAX_ALERTS:
+            return jsonify({'error': f'Máximo de {BULK_MAX_ALERTS} alertas por lote'}), 400
+        
+        result = alert_manager.create_price_alerts(alerts)
+        
+        if result['success']:
+            return jsonify(result)
+        else:
+            return jsonify(result), 400
+            
+    except Exception as e:
+        return jsonify({'error': f'Erro ao criar alertas: {str(e)}'}), 500
+
 @alerts_bp.route('/api/alerts/performance', methods=['POST'])
 def create_performance_alert():
     """
@@ -52,8 +88,12 @@ def create_performance_alert():
         if condition not in ['above', 'below']:
             return jsonify({'error': 'Condição deve ser "above" ou "below"'}), 400
         
+        assets = data.get('assets')  # composição do portfólio: [{"symbol", "weight", "type"}]
+        if any(asset.get('type', 'stock') not in ['stock', 'crypto', 'fund'] for asset in assets or []):
+            return jsonify({'error': 'Tipo de ativo deve ser "stock", "crypto" ou "fund"'}), 400
+        
         result = alert_manager.create_performance_alert(
-            portfolio_id, metric, float(threshold), condition
+            portfolio_id, metric, float(threshold), condition, assets
         )
         
         if result['success']:
@@ -89,6 +129,35 @@ def get_triggered_alerts():
     except Exception as e:
         return jsonify({'error': f'Erro ao obter alertas: {str(e)}'}), 500
 
+@alerts_bp.route('/api/alerts/bulk', methods=['DELETE'])
+def delete_alerts_bulk():
+    """
+    Remove vários alertas em uma única transação
+    """
+    try:
+        data = request.get_json()
+        ids = data.get('ids') if isinstance(data, dict) else None
+        alert_type = data.get('type', request.args.get('type', 'price')) if isinstance(data, dict) else 'price'
+        
+        if not isinstance(ids, list) or not ids:
+            return jsonify({'error': 'Lista de ids é obrigatória'}), 400
+        
+        if len(ids) > BULK_MAX_ALERTS:
+            return jsonify({'error': f'Máximo de {BULK_MAX_ALERTS} alertas por lote'}), 400
+        
+        if alert_type not in ['price', 'performance']:
+            return jsonify({'error': 'Tipo deve ser "price" ou "performance"'}), 400
+        
+        result = alert_manager.delete_alerts([str(alert_id) for alert_id in ids], alert_type)
+        
+        if result['success']:
+            return jsonify(result)
+        else:
+            return jsonify(result), 400
+            
+    except Exception as e:
+        return jsonify({'error': f'Erro ao remover alertas: {str(e)}'}), 500
+
 @alerts_bp.route('/api/alerts/<alert_id>', methods=['DELETE'])
 def delete_alert(alert_id):
     """
@@ -113,9 +182,12 @@ def check_alerts():
     """
     try:
         triggered_alerts = alert_manager.check_price_alerts()
+        triggered_performance_alerts = alert_manager.check_performance_alerts()
         return jsonify({
             'triggered_alerts': triggered_alerts,
-            'count': len(triggered_alerts)
+            'count': len(triggered_alerts),
+            'triggered_performance_alerts': triggered_performance_alerts,
+            'performance_count': len(triggered_performance_alerts)
         })
         
     except Exception as e:
@@ -134,30 +206,59 @@ def monitor_portfolio():
             return jsonify({'error': 'Lista de ativos é obrigatória'}), 400
         
         symbols = [asset['symbol'] for asset in assets]
-        monitoring_data = alert_manager.get_portfolio_monitoring(symbols)
+        cursor = data.get('cursor') or request.args.get('cursor')
+        if cursor:
+            try:
+                alerts_service.parse_monitoring_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+        monitoring_data = alert_manager.get_portfolio_monitoring(symbols, cursor)
         
         return jsonify(monitoring_data)
         
     except Exception as e:
         return jsonify({'error': f'Erro no monitoramento: {str(e)}'}), 500
 
+@alerts_bp.route('/api/monitoring/stream', methods=['GET'])
+def monitoring_stream():
+    """
+    Stream (Server-Sent Events) de preços e alertas acionados dos símbolos
+    
+    Todos os clientes compartilham o mesmo poller de preços; cada um recebe
+    apenas os eventos dos símbolos em `?symbols=AAPL,MSFT`.
+    """
+    symbols = [symbol.strip().upper() for symbol in request.args.get('symbols', '').split(',') if symbol.strip()]
+    if not symbols:
+        return jsonify({'error': 'Parâmetro symbols é obrigatório'}), 400
+    
+    subscription = price_feed.subscribe(symbols)
+    
+    def events():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                item = subscription.get(timeout=STREAM_HEARTBEAT_SECONDS)
+                if item is None:
+                    # Comentário SSE mantém a conexão aberta em proxies
+                    yield ': keep-alive\n\n'
+                    continue
+                event, data = item
+                yield f'event: {event}\ndata: {json.dumps(data)}\n\n'
+        finally:
+            price_feed.unsubscribe(subscription)
+    
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
 @alerts_bp.route('/api/alerts/summary', methods=['GET'])
 def get_alerts_summary():
     """
     Retorna resumo de todos os alertas
     """
     try:
-        active_alerts = alert_manager.get_active_alerts()
-        triggered_alerts = alert_manager.get_triggered_alerts(7)
-        
-        summary = {
-            'active_count': active_alerts['total_active'],
-            'triggered_count': triggered_alerts['total_triggered'],
-            'active_price_alerts': len(active_alerts['price_alerts']),
-            'active_performance_alerts': len(active_alerts['performance_alerts']),
-            'recent_triggered': triggered_alerts['total_triggered'],
-            'status': 'healthy' if active_alerts['total_active'] > 0 else 'no_alerts'
-        }
+        summary = alert_manager.get_alerts_summary(7)
         
         return jsonify(summary)
         
@@ -1,8 +1,54 @@
-from flask import Blueprint, request, jsonify
-from services.optimization import PortfolioOptimizer
+from flask import Blueprint, request, jsonify, url_for
+from services.lazy import lazy_import, lazy_service
+from src.models.portfolio import Asset
+
+# SciPy, pandas e NumPy só são importados na primeira otimização
+optimization = lazy_import('services.optimization')
+covariance = lazy_import('services.covariance')
+jobs = lazy_import('services.jobs')
 
 optimization_bp = Blueprint('optimization', __name__)
-optimizer = PortfolioOptimizer()
+optimizer = lazy_service('optimizer', lambda: optimization.PortfolioOptimizer())
+job_queue = lazy_service('job_queue', lambda: jobs.JobQueue())
+
+def _is_async_request(data):
+    """Verifica se o cliente pediu execução assíncrona (body ou query string)"""
+    flag = data.get('async', request.args.get('async', False))
+    if isinstance(flag, str):
+        return flag.lower() in ('1', 'true', 'yes')
+    return bool(flag)
+
+def _parse_output_options(data):
+    """
+    Lê `fields` (lista ou texto separado por vírgulas) e `frontier_points`
+
+    Retorna (opções, mensagem de erro).
+    """
+    fields = data.get('fields', request.args.get('fields'))
+    if isinstance(fields, str):
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+    
+    if fields:
+        invalid = [field for field in fields if field not in optimization.OPTIMIZATION_FIELDS]
+        if invalid:
+            return None, f'Campos inválidos: {", ".join(invalid)}. Use: {", ".join(optimization.OPTIMIZATION_FIELDS)}'
+    
+    try:
+        frontier_points = int(data.get('frontier_points', request.args.get('frontier_points', 50)))
+    except (TypeError, ValueError):
+        return None, 'frontier_points deve ser um número inteiro'
+    
+    if not 2 <= frontier_points <= 500:
+        return None, 'frontier_points deve estar entre 2 e 500'
+    
+    return {'fields': fields or None, 'frontier_points': frontier_points}, None
+
+def _enqueue(kind, func, *args):
+    """Enfileira um job e retorna a resposta 202 com as URLs de acompanhamento"""
+    job = job_queue.submit(kind, func, *args)
+    job['status_url'] = url_for('optimization.get_job_status', job_id=job['id'])
+    job['result_url'] = url_for('optimization.get_job_result', job_id=job['id'])
+    return jsonify(job), 202
 
 @optimization_bp.route('/api/optimize-portfolio', methods=['POST'])
 def optimize_portfolio():
@@ -18,10 +64,38 @@ def optimize_portfolio():
             return jsonify({'error': 'Lista de símbolos é obrigatória'}), 400
         
         # Extrair apenas os símbolos dos ativos
+        asset_groups = {}
         if isinstance(symbols[0], dict):
+            asset_groups = {asset['symbol']: asset['type'] for asset in symbols if asset.get('type')}
             symbols = [asset['symbol'] for asset in symbols]
         
-        result = optimizer.get_efficient_frontier(symbols, period)
+        options = {
+            'covariance': data.get('covariance', 'sample'),
+            'n_factors': data.get('n_factors'),
+            'constraints': data.get('constraints'),
+            'solver': data.get('solver', 'auto')
+        }
+        
+        if options['covariance'] not in covariance.COVARIANCE_METHODS:
+            return jsonify({'error': f'Covariância deve ser uma de: {", ".join(covariance.COVARIANCE_METHODS)}'}), 400
+        
+        if options['solver'] not in ('auto', 'qp', 'slsqp'):
+            return jsonify({'error': 'Solver deve ser "auto", "qp" ou "slsqp"'}), 400
+        
+        if options['constraints']:
+            if options['solver'] == 'slsqp':
+                return jsonify({'error': 'Restrições exigem o solver "qp"'}), 400
+            options['asset_groups'] = _lookup_asset_types(symbols, asset_groups)
+        
+        output_options, error = _parse_output_options(data)
+        if error:
+            return jsonify({'error': error}), 400
+        options.update(output_options)
+        
+        if _is_async_request(data):
+            return _enqueue('optimize-portfolio', _run_optimization, symbols, period, options)
+        
+        result = optimizer.get_efficient_frontier(symbols, period, **options)
         
         if 'error' in result:
             return jsonify(result), 400
@@ -31,6 +105,69 @@ def optimize_portfolio():
     except Exception as e:
         return jsonify({'error': f'Erro na otimização: {str(e)}'}), 500
 
+def _lookup_asset_types(symbols, known):
+    """
+    Completa o grupo (tipo de ativo) de cada símbolo com a coluna Asset.asset_type
+    """
+    missing = [symbol for symbol in symbols if symbol not in known]
+    groups = dict(known)
+    if missing:
+        try:
+            for asset in Asset.query.filter(Asset.symbol.in_(missing)).all():
+                groups.setdefault(asset.symbol, asset.asset_type)
+        except Exception:
+            pass  # Banco indisponível: usa apenas os tipos enviados
+    return groups
+
+def _run_optimization(symbols, period, options, progress=None):
+    """Executa a otimização dentro de um job assíncrono"""
+    return optimizer.get_efficient_frontier(symbols, period, progress_callback=progress, **options)
+
+@optimization_bp.route('/api/risk-parity', methods=['POST'])
+def risk_parity_portfolio():
+    """
+    Calcula alocação por Hierarchical Risk Parity ou contribuição de risco igual
+    """
+    try:
+        data = request.get_json()
+        symbols = data.get('symbols', [])
+        period = data.get('period', '1y')
+        
+        if not symbols:
+            return jsonify({'error': 'Lista de símbolos é obrigatória'}), 400
+        
+        if isinstance(symbols[0], dict):
+            symbols = [asset['symbol'] for asset in symbols]
+        
+        options = {
+            'method': data.get('method', 'hrp'),
+            'covariance': data.get('covariance', 'sample'),
+            'n_factors': data.get('n_factors')
+        }
+        
+        if options['method'] not in ('hrp', 'erc'):
+            return jsonify({'error': 'Método deve ser "hrp" ou "erc"'}), 400
+        
+        if options['covariance'] not in covariance.COVARIANCE_METHODS:
+            return jsonify({'error': f'Covariância deve ser uma de: {", ".join(covariance.COVARIANCE_METHODS)}'}), 400
+        
+        if _is_async_request(data):
+            return _enqueue('risk-parity', _run_risk_parity, symbols, period, options)
+        
+        result = optimizer.get_risk_parity_portfolio(symbols, period, **options)
+        
+        if 'error' in result:
+            return jsonify(result), 400
+        
+        return jsonify(result)
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro na paridade de risco: {str(e)}'}), 500
+
+def _run_risk_parity(symbols, period, options, progress=None):
+    """Executa a paridade de risco dentro de um job assíncrono"""
+    return optimizer.get_risk_parity_portfolio(symbols, period, progress_callback=progress, **options)
+
 @optimization_bp.route('/api/suggest-rebalancing', methods=['POST'])
 def suggest_rebalancing():
     """
@@ -66,47 +203,126 @@ def analyze_portfolio_efficiency():
         if not assets:
             return jsonify({'error': 'Lista de ativos é obrigatória'}), 400
         
-        symbols = [asset['symbol'] for asset in assets]
-        current_weights = {asset['symbol']: asset['weight']/100 for asset in assets}
-        
-        # Obter fronteira eficiente
-        optimization_result = optimizer.get_efficient_frontier(symbols)
-        
-        if 'error' in optimization_result:
-            return jsonify(optimization_result), 400
-        
-        # Calcular métricas do portfólio atual
-        mean_returns = optimization_result['mean_returns']
-        current_return = sum(current_weights[symbol] * mean_returns[symbol] 
-                           for symbol in symbols)
-        
-        # Comparar com portfólio ótimo
-        max_sharpe = optimization_result.get('max_sharpe_portfolio')
-        efficiency_score = 0
-        
-        if max_sharpe:
-            optimal_sharpe = max_sharpe['sharpe']
-            current_risk = sum(current_weights[symbol] * mean_returns[symbol] 
-                             for symbol in symbols)  # Simplificado
-            current_sharpe = (current_return - optimizer.risk_free_rate) / max(current_risk, 0.01)
-            efficiency_score = min(current_sharpe / optimal_sharpe, 1.0) if optimal_sharpe > 0 else 0
-        
-        return jsonify({
-            'current_portfolio': {
-                'return': current_return,
-                'weights': current_weights,
-                'efficiency_score': efficiency_score
-            },
-            'optimization_data': optimization_result,
-            'recommendations': {
-                'efficiency_rating': 'Excelente' if efficiency_score > 0.9 
-                                   else 'Boa' if efficiency_score > 0.7 
-                                   else 'Regular' if efficiency_score > 0.5 
-                                   else 'Precisa melhorar',
-                'should_rebalance': efficiency_score < 0.8
-            }
-        })
+        output_options, error = _parse_output_options(data)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        if _is_async_request(data):
+            return _enqueue('portfolio-efficiency', _build_efficiency_analysis, assets, output_options)
+        
+        result = _build_efficiency_analysis(assets, output_options)
+        
+        if 'error' in result:
+            return jsonify(result), 400
+        
+        return jsonify(result)
         
     except Exception as e:
         return jsonify({'error': f'Erro na análise: {str(e)}'}), 500
 
+def _build_efficiency_analysis(assets, output_options=None, progress=None):
+    """
+    Compara o portfólio atual com a fronteira eficiente
+    """
+    symbols = [asset['symbol'] for asset in assets]
+    current_weights = {asset['symbol']: asset['weight']/100 for asset in assets}
+    
+    # O score depende apenas do portfólio de máximo Sharpe
+    options = dict(output_options or {})
+    if options.get('fields') and 'max_sharpe_portfolio' not in options['fields']:
+        options['fields'] = list(options['fields']) + ['max_sharpe_portfolio']
+    
+    # Obter fronteira eficiente
+    optimization_result = optimizer.get_efficient_frontier(symbols, progress_callback=progress, **options)
+    
+    if 'error' in optimization_result:
+        return optimization_result
+    
+    # Calcular métricas do portfólio atual
+    mean_returns = optimization_result['mean_returns']
+    current_return = sum(current_weights[symbol] * mean_returns[symbol] 
+                       for symbol in symbols)
+    
+    # Comparar com portfólio ótimo
+    max_sharpe = optimization_result.get('max_sharpe_portfolio')
+    efficiency_score = 0
+    
+    if max_sharpe:
+        optimal_sharpe = max_sharpe['sharpe']
+        current_risk = sum(current_weights[symbol] * mean_returns[symbol] 
+                         for symbol in symbols)  # Simplificado
+        current_sharpe = (current_return - optimizer.risk_free_rate) / max(current_risk, 0.01)
+        efficiency_score = float(min(current_sharpe / optimal_sharpe, 1.0)) if optimal_sharpe > 0 else 0
+    
+    return {
+        'current_portfolio': {
+            'return': current_return,
+            'weights': current_weights,
+            'efficiency_score': efficiency_score
+        },
+        'optimization_data': optimization_result,
+        'recommendations': {
+            'efficiency_rating': 'Excelente' if efficiency_score > 0.9 
+                               else 'Boa' if efficiency_score > 0.7 
+                               else 'Regular' if efficiency_score > 0.5 
+                               else 'Precisa melhorar',
+            'should_rebalance': efficiency_score < 0.8
+        }
+    }
+
+@optimization_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """
+    Retorna o estado e o progresso de um job assíncrono
+    """
+    try:
+        job = job_queue.get_job(job_id)
+        
+        if job is None:
+            return jsonify({'error': 'Job não encontrado'}), 404
+        
+        return jsonify(job)
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro ao consultar job: {str(e)}'}), 500
+
+@optimization_bp.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """
+    Retorna o resultado de um job assíncrono (202 enquanto não terminar)
+    """
+    try:
+        job = job_queue.get_result(job_id)
+        
+        if job is None:
+            return jsonify({'error': 'Job não encontrado'}), 404
+        
+        if job['status'] in ('queued', 'running'):
+            return jsonify(job), 202
+        
+        if job['status'] == 'completed':
+            return jsonify(job['result'])
+        
+        if job['status'] == 'cancelled':
+            return jsonify({'error': 'Job cancelado', 'job': job}), 409
+        
+        return jsonify(job['result'] or {'error': job['error']}), 400
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro ao consultar job: {str(e)}'}), 500
+
+@optimization_bp.route('/api/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    """
+    Cancela um job enfileirado ou em execução
+    """
+    try:
+        job = job_queue.cancel(job_id)
+        
+        if job is None:
+            return jsonify({'error': 'Job não encontrado'}), 404
+        
+        return jsonify(job)
+        
+    except Exception as e:
+        return jsonify({'error': f'Erro ao cancelar job: {str(e)}'}), 500
@@ -1,12 +1,51 @@
 from flask import Blueprint, request, jsonify
-import yfinance as yf
-import requests
-import pandas as pd
-import numpy as np
+import base64
 from datetime import datetime, timedelta
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import selectinload
 from src.models.portfolio import db, Asset, Portfolio, Position, PriceHistory
+from services.lazy import lazy_import
+from services.symbol_catalog import SymbolCatalog
+from services.telemetry import stage, upstream
+
+# Bibliotecas e serviços pesados são importados na primeira requisição que os usa
+yf = lazy_import('yfinance')
+requests = lazy_import('requests')
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+metrics_service = lazy_import('services.metrics')
+nav_service = lazy_import('services.nav')
+valuation_service = lazy_import('services.valuation')
 
 portfolio_bp = Blueprint('portfolio', __name__)
+symbol_catalog = SymbolCatalog()
+
+PORTFOLIOS_PAGE_SIZE = 50
+PORTFOLIOS_MAX_PAGE_SIZE = 500
+
+
+def _encode_cursor(portfolio):
+    """Cursor opaco com a chave (updated_at, id) do último portfólio da página"""
+    key = f"{portfolio.updated_at.isoformat() if portfolio.updated_at else ''}|{portfolio.id}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+
+def _coingecko_get(url, **kwargs):
+    """GET na API do CoinGecko; respostas diferentes de 200 contam como erro do provedor"""
+    with upstream('coingecko') as call:
+        response = requests.get(url, timeout=10, **kwargs)
+        if response.status_code != 200:
+            call.fail(f'http_{response.status_code}')
+        return response
+
+
+def _decode_cursor(cursor):
+    try:
+        key = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        updated_at, portfolio_id = key.rsplit('|', 1)
+        return (datetime.fromisoformat(updated_at) if updated_at else None), int(portfolio_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError('Cursor inválido')
 
 @portfolio_bp.route('/search-assets', methods=['GET'])
 def search_assets():
@@ -17,6 +56,12 @@ def search_assets():
     if not query:
         return jsonify({'error': 'Query parameter is required'}), 400
     
+    # Catálogo local em memória; as consultas externas abaixo só são usadas
+    # enquanto o catálogo ainda não foi carregado
+    if symbol_catalog.ready:
+        limit = request.args.get('limit', 10, type=int)
+        return jsonify({'results': symbol_catalog.search(query, asset_type, limit)})
+    
     results = []
     
     try:
@@ -24,7 +69,8 @@ def search_assets():
         if asset_type in ['stock', 'all']:
             try:
                 ticker = yf.Ticker(query.upper())
-                info = ticker.info
+                with upstream('yfinance'):
+                    info = ticker.info
                 if info and 'symbol' in info:
                     results.append({
                         'symbol': info.get('symbol', query.upper()),
@@ -40,7 +86,7 @@ def search_assets():
         if asset_type in ['crypto', 'all']:
             try:
                 crypto_url = f"https://api.coingecko.com/api/v3/search?query={query}"
-                crypto_response = requests.get(crypto_url, timeout=10)
+                crypto_response = _coingecko_get(crypto_url)
                 if crypto_response.status_code == 200:
                     crypto_data = crypto_response.json()
                     for coin in crypto_data.get('coins', [])[:5]:  # Limitar a 5 resultados
@@ -74,7 +120,8 @@ def get_asset_data():
         if asset_type == 'stock':
             # Usar Yahoo Finance para ações
             ticker = yf.Ticker(symbol)
-            hist = ticker.history(period=period)
+            with upstream('yfinance'):
+                hist = ticker.history(period=period)
             
             if hist.empty:
                 return jsonify({'error': 'No data found for this symbol'}), 404
@@ -92,7 +139,8 @@ def get_asset_data():
                 })
             
             # Obter informações básicas
-            info = ticker.info
+            with upstream('yfinance'):
+                info = ticker.info
             asset_info = {
                 'symbol': symbol,
                 'name': info.get('longName', info.get('shortName', 'N/A')),
@@ -110,7 +158,7 @@ def get_asset_data():
             # Usar CoinGecko para criptomoedas
             # Primeiro, buscar o ID da moeda
             search_url = f"https://api.coingecko.com/api/v3/search?query={symbol}"
-            search_response = requests.get(search_url, timeout=10)
+            search_response = _coingecko_get(search_url)
             
             if search_response.status_code != 200:
                 return jsonify({'error': 'Failed to search cryptocurrency'}), 500
@@ -136,7 +184,7 @@ def get_asset_data():
             # Obter dados históricos
             history_url = f"https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart"
             params = {'vs_currency': 'usd', 'days': days}
-            history_response = requests.get(history_url, params=params, timeout=10)
+            history_response = _coingecko_get(history_url, params=params)
             
             if history_response.status_code != 200:
                 return jsonify({'error': 'Failed to fetch cryptocurrency data'}), 500
@@ -163,7 +211,7 @@ def get_asset_data():
             
             # Obter informações atuais
             current_url = f"https://api.coingecko.com/api/v3/coins/{coin_id}"
-            current_response = requests.get(current_url, timeout=10)
+            current_response = _coingecko_get(current_url)
             
             asset_info = {
                 'symbol': symbol,
@@ -219,12 +267,15 @@ def calculate_metrics():
             
             if asset_type == 'stock':
                 ticker = yf.Ticker(symbol)
-                hist = ticker.history(period='1y')
+                with upstream('yfinance'):
+                    hist = ticker.history(period='1y')
                 if not hist.empty:
                     prices = hist['Close'].dropna()
                     all_prices[symbol] = prices
+                    with upstream('yfinance'):
+                        name = ticker.info.get('longName', symbol)
                     asset_info[symbol] = {
-                        'name': ticker.info.get('longName', symbol),
+                        'name': name,
                         'type': asset_type,
                         'weight': weight
                     }
@@ -234,7 +285,7 @@ def calculate_metrics():
                 # Buscar histórico de preços no CoinGecko
                 # 1. Buscar o ID da moeda
                 search_url = f"https://api.coingecko.com/api/v3/search?query={symbol}"
-                search_response = requests.get(search_url, timeout=10)
+                search_response = _coingecko_get(search_url)
                 if search_response.status_code != 200:
                     ativos_sem_dados.append(symbol + ' (erro CoinGecko)')
                     continue
@@ -250,7 +301,7 @@ def calculate_metrics():
                 # 2. Buscar histórico de preços (1 ano)
                 history_url = f"https://api.coingecko.com/api/v3/coins/{coin_id}/market_chart"
                 params = {'vs_currency': 'usd', 'days': 365}
-                history_response = requests.get(history_url, params=params, timeout=10)
+                history_response = _coingecko_get(history_url, params=params)
                 if history_response.status_code != 200:
                     ativos_sem_dados.append(symbol + ' (erro histórico CoinGecko)')
                     continue
@@ -281,70 +332,38 @@ def calculate_metrics():
             return jsonify({'error': f'Nenhum dado histórico encontrado para os ativos enviados. Ativos sem dados: {", ".join(ativos_sem_dados)}. Verifique os símbolos e tente novamente.'}), 400
         
         # Criar DataFrame com preços alinhados
-        price_df = pd.DataFrame(all_prices)
-        price_df = price_df.dropna()
+        with stage('align'):
+            price_df = pd.DataFrame(all_prices)
+            price_df = price_df.dropna()
         
         if price_df.empty:
             return jsonify({'error': 'Não foi possível alinhar os dados históricos dos ativos (datas em comum insuficientes). Tente outros ativos.'}), 400
         
-        # Calcular retornos diários
-        returns_df = price_df.pct_change().dropna()
-        
-        # Calcular métricas
-        metrics = {}
-        
-        # Métricas individuais por ativo
-        for symbol in returns_df.columns:
-            returns = returns_df[symbol]
-            
-            # Retorno anualizado
-            annual_return = (1 + returns.mean()) ** 252 - 1
+        with stage('metrics'):
+            # Calcular retornos diários
+            returns_df = price_df.pct_change().dropna()
             
-            # Volatilidade anualizada
-            volatility = returns.std() * np.sqrt(252)
+            # Calcular métricas
+            metrics = {}
             
-            # Sharpe ratio (assumindo taxa livre de risco = 0)
-            sharpe_ratio = annual_return / volatility if volatility > 0 else 0
+            # Métricas individuais por ativo
+            asset_metrics = metrics_service.performance_metrics(returns_df.to_numpy())
+            for i, symbol in enumerate(returns_df.columns):
+                metrics[symbol] = {field: float(asset_metrics[field][i]) for field in metrics_service.METRIC_FIELDS}
+                metrics[symbol]['current_price'] = float(price_df[symbol].iloc[-1])
             
-            # Máximo drawdown
-            cumulative_returns = (1 + returns).cumprod()
-            rolling_max = cumulative_returns.expanding().max()
-            drawdown = (cumulative_returns - rolling_max) / rolling_max
-            max_drawdown = drawdown.min()
+            # Métricas do portfólio (se pesos fornecidos)
+            weights = np.array([asset_info[symbol]['weight'] for symbol in returns_df.columns])
+            weights = weights / weights.sum()  # Normalizar pesos
             
-            metrics[symbol] = {
-                'annual_return': float(annual_return),
-                'volatility': float(volatility),
-                'sharpe_ratio': float(sharpe_ratio),
-                'max_drawdown': float(max_drawdown),
-                'current_price': float(price_df[symbol].iloc[-1])
-            }
+            # Métricas do portfólio
+            portfolio_returns = returns_df.to_numpy() @ weights
+            portfolio_values = metrics_service.performance_metrics(portfolio_returns)
+            portfolio_metrics = {field: float(portfolio_values[field][0]) for field in metrics_service.METRIC_FIELDS}
         
         # Matriz de correlação
-        correlation_matrix = returns_df.corr().to_dict()
-        
-        # Métricas do portfólio (se pesos fornecidos)
-        weights = np.array([asset_info[symbol]['weight'] for symbol in returns_df.columns])
-        weights = weights / weights.sum()  # Normalizar pesos
-        
-        # Retorno do portfólio
-        portfolio_returns = (returns_df * weights).sum(axis=1)
-        portfolio_annual_return = (1 + portfolio_returns.mean()) ** 252 - 1
-        portfolio_volatility = portfolio_returns.std() * np.sqrt(252)
-        portfolio_sharpe = portfolio_annual_return / portfolio_volatility if portfolio_volatility > 0 else 0
-        
-        # Máximo drawdown do portfólio
-        portfolio_cumulative = (1 + portfolio_returns).cumprod()
-        portfolio_rolling_max = portfolio_cumulative.expanding().max()
-        portfolio_drawdown = (portfolio_cumulative - portfolio_rolling_max) / portfolio_rolling_max
-        portfolio_max_drawdown = portfolio_drawdown.min()
-        
-        portfolio_metrics = {
-            'annual_return': float(portfolio_annual_return),
-            'volatility': float(portfolio_volatility),
-            'sharpe_ratio': float(portfolio_sharpe),
-            'max_drawdown': float(portfolio_max_drawdown)
-        }
+        with stage('correlation'):
+            correlation_matrix = returns_df.corr().to_dict()
         
         return jsonify({
             'individual_metrics': metrics,
@@ -363,8 +382,7 @@ def calculate_metrics():
 def handle_portfolios():
     """Listar ou criar portfólios"""
     if request.method == 'GET':
-        portfolios = Portfolio.query.all()
-        return jsonify([p.to_dict() for p in portfolios])
+        return list_portfolios()
     
     elif request.method == 'POST':
         data = request.get_json()
@@ -387,6 +405,113 @@ def handle_portfolios():
             db.session.rollback()
             return jsonify({'error': str(e)}), 500
 
+def list_portfolios():
+    """
+    Lista os portfólios mais recentes primeiro, paginados por (updated_at, id)
+
+    Parâmetros: `limit` (padrão 50, máximo 500), `cursor` (cabeçalho
+    X-Next-Cursor da página anterior) e `view=summary` para omitir as
+    posições. Posições e ativos são carregados com selectinload, em um
+    número constante de consultas por página.
+    """
+    limit = min(max(request.args.get('limit', PORTFOLIOS_PAGE_SIZE, type=int), 1), PORTFOLIOS_MAX_PAGE_SIZE)
+    view = request.args.get('view', 'full')
+    if view not in ('full', 'summary'):
+        return jsonify({'error': 'view deve ser "full" ou "summary"'}), 400
+    
+    query = db.session.query(Portfolio)
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            cursor_updated_at, cursor_id = _decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        # Portfólios sem updated_at ficam no fim da listagem
+        if cursor_updated_at is None:
+            query = query.filter(Portfolio.updated_at.is_(None), Portfolio.id < cursor_id)
+        else:
+            query = query.filter(or_(
+                Portfolio.updated_at < cursor_updated_at,
+                and_(Portfolio.updated_at == cursor_updated_at, Portfolio.id < cursor_id),
+                Portfolio.updated_at.is_(None)
+            ))
+    query = query.order_by(Portfolio.updated_at.desc().nulls_last(), Portfolio.id.desc())
+    
+    try:
+        if view == 'summary':
+            counts = (db.session.query(Position.portfolio_id, func.count(Position.id).label('positions_count'))
+                      .group_by(Position.portfolio_id).subquery())
+            rows = (query.outerjoin(counts, counts.c.portfolio_id == Portfolio.id)
+                    .add_columns(func.coalesce(counts.c.positions_count, 0))
+                    .limit(limit + 1).all())
+            page = [portfolio for portfolio, _ in rows[:limit]]
+            body = [portfolio.to_summary_dict(count) for portfolio, count in rows[:limit]]
+        else:
+            rows = (query.options(selectinload(Portfolio.positions).selectinload(Position.asset))
+                    .limit(limit + 1).all())
+            page = rows[:limit]
+            body = [portfolio.to_dict() for portfolio in page]
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    response = jsonify(body)
+    # Uma linha além do limite indica que há próxima página
+    if len(rows) > limit:
+        response.headers['X-Next-Cursor'] = _encode_cursor(page[-1])
+    return response
+
+@portfolio_bp.route('/portfolios/valuation', methods=['POST'])
+def portfolios_valuation():
+    """
+    Marcação a mercado de um ou vários portfólios salvos
+
+    Body: {"portfolio_ids": [1, 2], "view": "summary"}. Sem `portfolio_ids`
+    todos os portfólios são avaliados; `view=summary` omite as posições.
+    """
+    data = request.get_json(silent=True) or {}
+    portfolio_ids = data.get('portfolio_ids')
+    view = data.get('view', 'full')
+    
+    if portfolio_ids is not None:
+        if not isinstance(portfolio_ids, list):
+            return jsonify({'error': 'portfolio_ids deve ser uma lista'}), 400
+        try:
+            portfolio_ids = [int(portfolio_id) for portfolio_id in portfolio_ids]
+        except (TypeError, ValueError):
+            return jsonify({'error': 'portfolio_ids deve conter apenas inteiros'}), 400
+    
+    if view not in ('full', 'summary'):
+        return jsonify({'error': 'view deve ser "full" ou "summary"'}), 400
+    
+    try:
+        result = valuation_service.value_portfolios(portfolio_ids, include_positions=view == 'full')
+        result['valued_at'] = datetime.utcnow().isoformat()
+        return jsonify(result)
+    
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': f'Erro na avaliação: {str(e)}'}), 500
+
+@portfolio_bp.route('/portfolios/<int:portfolio_id>/nav', methods=['GET'])
+def portfolio_nav_series(portfolio_id):
+    """Série diária de NAV e retornos de um portfólio salvo"""
+    period = request.args.get('period', '1y')
+    if period not in nav_service.NAV_PERIODS:
+        return jsonify({'error': f'Período inválido. Use: {", ".join(nav_service.NAV_PERIODS)}'}), 400
+    
+    if db.session.get(Portfolio, portfolio_id) is None:
+        return jsonify({'error': 'Portfolio not found'}), 404
+    
+    try:
+        return jsonify(nav_service.portfolio_nav(portfolio_id, period))
+    
+    except Exception as e:
+        db.session.rollback()
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': f'Erro ao calcular NAV: {str(e)}'}), 500
+
 @portfolio_bp.route('/portfolios/<int:portfolio_id>', methods=['GET', 'PUT', 'DELETE'])
 def handle_portfolio(portfolio_id):
     """Obter, atualizar ou deletar um portfólio específico"""
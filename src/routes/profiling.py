@@ -0,0 +1,55 @@
+from flask import Blueprint, request, jsonify, send_file
+from services.profiling import RequestProfiler
+
+profiling_bp = Blueprint('profiling', __name__)
+request_profiler = RequestProfiler()
+
+def _check_token():
+    """Resposta de erro quando o profiling está desativado ou o token não confere"""
+    if not request_profiler.enabled:
+        return jsonify({'error': 'Profiling desativado (defina PROFILE_TOKEN)'}), 404
+    if not request_profiler.authorized(request.headers.get('X-Profile-Token')):
+        return jsonify({'error': 'Token de profiling inválido'}), 403
+    return None
+
+@profiling_bp.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    """
+    Lista os perfis de requisição gravados
+    """
+    error = _check_token()
+    if error:
+        return error
+
+    try:
+        return jsonify({'profiles': request_profiler.list_profiles()})
+
+    except Exception as e:
+        return jsonify({'error': f'Erro ao listar perfis: {str(e)}'}), 500
+
+@profiling_bp.route('/api/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """
+    Retorna o resumo de um perfil (funções por tempo cumulativo) ou,
+    com `format=pstats`, o arquivo .prof
+    """
+    error = _check_token()
+    if error:
+        return error
+
+    try:
+        if request.args.get('format') == 'pstats':
+            path = request_profiler.profile_path(profile_id)
+            if path is None:
+                return jsonify({'error': 'Perfil não encontrado'}), 404
+            return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                             download_name=f'{profile_id}.prof')
+
+        profile = request_profiler.get_profile(profile_id)
+        if profile is None:
+            return jsonify({'error': 'Perfil não encontrado'}), 404
+
+        return jsonify(profile)
+
+    except Exception as e:
+        return jsonify({'error': f'Erro ao consultar perfil: {str(e)}'}), 500
@@ -0,0 +1,157 @@
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+# Representação compacta de um alerta ativo (29 bytes por alerta)
+ALERT_DTYPE = np.dtype([
+    ('rowid', 'i8'),        # rowid da linha em price_alerts
+    ('symbol_id', 'i4'),    # id do símbolo em alert_symbols
+    ('threshold', 'f8'),    # preço alvo
+    ('below', '?'),         # condição: False = 'above', True = 'below'
+    ('created_ts', 'f8'),   # criação em segundos desde a época
+])
+
+
+class ThresholdIndex:
+    """
+    Índice em memória dos alertas de preço não acionados
+
+    Os alertas ficam em um único array estruturado do NumPy ordenado por
+    (símbolo, condição, preço alvo); cada par (símbolo, condição) é um
+    intervalo [início, fim) do array. Para um novo preço, os alertas
+    acionados são encontrados com uma busca binária (O(log n)):
+    - 'above' dispara quando preço >= alvo: os acionados são um prefixo
+    - 'below' dispara quando preço <= alvo: os acionados são um sufixo
+    e o intervalo ativo é apenas encolhido, sem copiar o array.
+
+    Alertas criados depois da construção ficam em listas ordenadas pequenas
+    (bisect) até a próxima reconstrução; remoções apenas desmarcam o alerta.
+    """
+
+    def __init__(self, alerts: np.ndarray, symbol_ids: Dict[str, int]):
+        keys = alerts['symbol_id'].astype(np.int64) * 2 + alerts['below']
+        same_key = keys[1:] == keys[:-1]
+        ordered = np.all(keys[1:] >= keys[:-1]) and np.all(~same_key | (alerts['threshold'][1:] >= alerts['threshold'][:-1]))
+        if not ordered:
+            # A carga do banco já vem na ordem do índice; ordenar só se preciso
+            order = np.lexsort((alerts['threshold'], keys))
+            alerts, keys = alerts[order], keys[order]
+
+        self._alerts = alerts
+        # Cópia contígua dos preços alvo: searchsorted copiaria a coluna inteira
+        # de um array estruturado a cada busca
+        self._thresholds = np.ascontiguousarray(self._alerts['threshold'])
+        self._active = np.ones(len(self._alerts), dtype=bool)
+        self._symbol_ids = dict(symbol_ids)
+        self._count = len(self._alerts)
+
+        # Intervalo [início, fim) de cada (símbolo, condição)
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.array([], dtype=int)
+        ends = np.r_[starts[1:], len(keys)]
+        self._books: Dict[Tuple[int, bool], List[int]] = {
+            (int(keys[start] // 2), bool(keys[start] % 2)): [int(start), int(end)]
+            for start, end in zip(starts, ends)
+        }
+
+        # Alertas adicionados após a construção: (preços alvo, rowids)
+        self._pending: Dict[Tuple[int, bool], Tuple[List[float], List[int]]] = {}
+
+    @classmethod
+    def build(cls, rows: Iterable[tuple], symbol_ids: Dict[str, int]) -> 'ThresholdIndex':
+        """Constrói o índice a partir de tuplas no formato de ALERT_DTYPE"""
+        return cls(np.fromiter(rows, dtype=ALERT_DTYPE), symbol_ids)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def pending(self) -> int:
+        """Quantidade de alertas fora do array principal"""
+        return sum(len(thresholds) for thresholds, _ in self._pending.values())
+
+    @property
+    def nbytes(self) -> int:
+        return self._alerts.nbytes + self._thresholds.nbytes + self._active.nbytes
+
+    def symbols(self) -> List[str]:
+        """Símbolos com pelo menos um alerta ativo"""
+        active_ids = {symbol_id for (symbol_id, _), (start, end) in self._books.items() if start < end}
+        active_ids.update(symbol_id for (symbol_id, _), (thresholds, _) in self._pending.items() if thresholds)
+        return [symbol for symbol, symbol_id in self._symbol_ids.items() if symbol_id in active_ids]
+
+    def add(self, rowid: int, symbol: str, symbol_id: int, threshold: float, condition: str):
+        """Insere um alerta criado após a construção do índice"""
+        self._symbol_ids[symbol] = symbol_id
+        thresholds, rowids = self._pending.setdefault((symbol_id, condition == 'below'), ([], []))
+        position = bisect_right(thresholds, threshold)
+        thresholds.insert(position, threshold)
+        rowids.insert(position, rowid)
+        self._count += 1
+
+    def remove(self, rowid: int, symbol_id: int, threshold: float, condition: str) -> bool:
+        """Remove um alerta ativo"""
+        key = (symbol_id, condition == 'below')
+
+        thresholds, rowids = self._pending.get(key, ([], []))
+        position = bisect_left(thresholds, threshold)
+        while position < len(rowids) and thresholds[position] == threshold:
+            if rowids[position] == rowid:
+                del thresholds[position]
+                del rowids[position]
+                self._count -= 1
+                return True
+            position += 1
+
+        book = self._books.get(key)
+        if book is None:
+            return False
+        start, end = book
+        values = self._thresholds[start:end]
+        first = start + int(np.searchsorted(values, threshold, 'left'))
+        last = start + int(np.searchsorted(values, threshold, 'right'))
+        matches = first + np.flatnonzero(self._alerts['rowid'][first:last] == rowid)
+        matches = matches[self._active[matches]]
+        if not len(matches):
+            return False
+        self._active[matches[0]] = False
+        self._count -= 1
+        return True
+
+    def fire(self, symbol: str, price: float) -> np.ndarray:
+        """Retorna e remove os rowids dos alertas de `symbol` acionados por `price`"""
+        symbol_id = self._symbol_ids.get(symbol)
+        if symbol_id is None:
+            return np.empty(0, dtype=np.int64)
+
+        fired = []
+        for below in (False, True):
+            book = self._books.get((symbol_id, below))
+            if book is not None and book[0] < book[1]:
+                start, end = book
+                values = self._thresholds[start:end]
+                if below:
+                    cut = start + int(np.searchsorted(values, price, 'left'))
+                    span = slice(cut, end)
+                    book[1] = cut
+                else:
+                    cut = start + int(np.searchsorted(values, price, 'right'))
+                    span = slice(start, cut)
+                    book[0] = cut
+                fired.append(self._alerts['rowid'][span][self._active[span]])
+
+            pending = self._pending.get((symbol_id, below))
+            if pending and pending[0]:
+                thresholds, rowids = pending
+                if below:
+                    cut = bisect_left(thresholds, price)
+                    fired.append(np.array(rowids[cut:], dtype=np.int64))
+                    del thresholds[cut:], rowids[cut:]
+                else:
+                    cut = bisect_right(thresholds, price)
+                    fired.append(np.array(rowids[:cut], dtype=np.int64))
+                    del thresholds[:cut], rowids[:cut]
+
+        result = np.concatenate(fired) if fired else np.empty(0, dtype=np.int64)
+        self._count -= len(result)
+        return result
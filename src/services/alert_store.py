@@ -0,0 +1,728 @@
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.metrics import ALERT_METRICS, METRIC_FIELDS
+from services.storage import SQLiteStore
+
+PRICE_COLUMNS = ('id', 'symbol', 'target_price', 'condition', 'current_price',
+                 'created_at', 'triggered', 'triggered_at')
+# Instante ISO -> segundos desde a época (julianday aceita frações de segundo)
+_EPOCH = "((julianday({}) - 2440587.5) * 86400.0)"
+
+PERFORMANCE_COLUMNS = ('id', 'portfolio_id', 'metric', 'threshold', 'condition',
+                       'current_value', 'created_at', 'triggered', 'triggered_at')
+
+
+class AlertStore(SQLiteStore):
+    """
+    Armazenamento transacional dos alertas em SQLite (modo WAL)
+
+    Cada operação lê ou grava apenas as linhas afetadas, usando os índices
+    (triggered, symbol/portfolio_id) e triggered_at, e as transações evitam
+    perda de atualizações entre workers do gunicorn.
+    """
+
+    SCHEMA_VERSION = 8
+
+    def __init__(self, db_path: str, legacy_files: Optional[Dict[str, str]] = None):
+        self.legacy_files = legacy_files or {}
+        self._imported_files: List[str] = []
+        super().__init__(db_path)
+        # Só depois do COMMIT das migrações: se alguma falhar, os JSON ficam
+        # onde estão e são importados de novo na próxima inicialização
+        for path in self._imported_files:
+            os.replace(path, path + '.migrated')
+        self._imported_files = []
+
+    def _create_schema(self, conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            self._migrate_v1(conn)
+        if version < 2:
+            self._migrate_v2(conn)
+        if version < 3:
+            self._migrate_v3(conn)
+        if version < 4:
+            self._migrate_v4(conn)
+        if version < 5:
+            self._migrate_v5(conn)
+        if version < 6:
+            self._migrate_v6(conn)
+        if version < 7:
+            self._migrate_v7(conn)
+        if version < 8:
+            self._migrate_v8(conn)
+        conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+    def _migrate_v1(self, conn):
+        """Tabelas de alertas (substituem os arquivos JSON)"""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS price_alerts (
+                id TEXT PRIMARY KEY,
+                symbol TEXT NOT NULL,
+                target_price REAL NOT NULL,
+                condition TEXT NOT NULL,
+                current_price REAL,
+                created_at TEXT NOT NULL,
+                triggered INTEGER NOT NULL DEFAULT 0,
+                triggered_at TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_price_alerts_triggered_symbol "
+                     "ON price_alerts (triggered, symbol)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_price_alerts_triggered_at "
+                     "ON price_alerts (triggered_at)")
+
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS performance_alerts (
+                id TEXT PRIMARY KEY,
+                portfolio_id TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                threshold REAL NOT NULL,
+                condition TEXT NOT NULL,
+                current_value REAL,
+                created_at TEXT NOT NULL,
+                triggered INTEGER NOT NULL DEFAULT 0,
+                triggered_at TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_performance_alerts_triggered_portfolio "
+                     "ON performance_alerts (triggered, portfolio_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_performance_alerts_triggered_at "
+                     "ON performance_alerts (triggered_at)")
+
+        self._import_legacy_json(conn)
+
+    def _migrate_v2(self, conn):
+        """
+        Contador de versão dos alertas de preço e último preço por símbolo
+
+        A versão permite que cada processo saiba se seu índice em memória está
+        atualizado; o preço por símbolo evita reescrever current_price em
+        todos os alertas ativos a cada verificação.
+        """
+        conn.execute("CREATE TABLE IF NOT EXISTS alert_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        conn.execute("INSERT OR IGNORE INTO alert_meta (key, value) VALUES ('price_version', 0)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS symbol_prices (
+                symbol TEXT PRIMARY KEY,
+                price REAL NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+
+    def _migrate_v3(self, conn):
+        """Resultado da última verificação feita pelo agendador"""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS alert_checks (
+                kind TEXT PRIMARY KEY,
+                started_at TEXT NOT NULL,
+                finished_at TEXT NOT NULL,
+                triggered_count INTEGER NOT NULL DEFAULT 0,
+                error TEXT
+            )
+        """)
+
+    def _migrate_v4(self, conn):
+        """
+        Composição dos portfólios monitorados e suas últimas métricas
+
+        Como no preço por símbolo, as métricas são gravadas uma vez por
+        portfólio e não em cada alerta.
+        """
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS alert_portfolios (
+                portfolio_id TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                weight REAL NOT NULL,
+                PRIMARY KEY (portfolio_id, symbol)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS portfolio_metrics (
+                portfolio_id TEXT PRIMARY KEY,
+                annual_return REAL,
+                volatility REAL,
+                sharpe_ratio REAL,
+                max_drawdown REAL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+
+    def _migrate_v5(self, conn):
+        """
+        Histórico de disparos (somente inserção) e contadores do resumo
+
+        Cada disparo vira um evento particionado por dia (`day`), com índice
+        no instante do disparo. `alert_daily_counts` e `alert_counters` são
+        atualizados na mesma transação do disparo, de modo que o resumo não
+        precisa percorrer os alertas; a compactação remove partições antigas
+        de eventos mantendo as contagens diárias.
+        """
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS alert_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                day TEXT NOT NULL,
+                triggered_at TEXT NOT NULL,
+                alert_type TEXT NOT NULL,
+                alert_id TEXT NOT NULL,
+                subject TEXT NOT NULL,
+                payload TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_alert_events_type_triggered_at "
+                     "ON alert_events (alert_type, triggered_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_alert_events_day ON alert_events (day)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS alert_daily_counts (
+                day TEXT NOT NULL,
+                alert_type TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (day, alert_type)
+            )
+        """)
+        conn.execute("CREATE TABLE IF NOT EXISTS alert_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+        for alert_type, table, columns in (('price', 'price_alerts', PRICE_COLUMNS),
+                                           ('performance', 'performance_alerts', PERFORMANCE_COLUMNS)):
+            rows = conn.execute(
+                f"SELECT {', '.join(columns)} FROM {table} WHERE triggered = 1 AND triggered_at IS NOT NULL "
+                "ORDER BY triggered_at"
+            ).fetchall()
+            self._record_events(conn, alert_type, rows)
+            active = conn.execute(f"SELECT COUNT(*) FROM {table} WHERE triggered = 0").fetchone()[0]
+            conn.execute("INSERT OR REPLACE INTO alert_counters (name, value) VALUES (?, ?)",
+                         (f'active_{alert_type}', active))
+
+    def _migrate_v6(self, conn):
+        """
+        Colunas compactas dos alertas de preço para o índice em memória
+
+        Símbolos passam a ter um id inteiro (alert_symbols) e os instantes
+        ganham uma versão em segundos desde a época, evitando interpretar
+        strings ISO ao carregar os alertas.
+        """
+        conn.execute("CREATE TABLE IF NOT EXISTS alert_symbols (id INTEGER PRIMARY KEY, symbol TEXT NOT NULL UNIQUE)")
+        conn.execute("ALTER TABLE price_alerts ADD COLUMN symbol_id INTEGER")
+        conn.execute("ALTER TABLE price_alerts ADD COLUMN created_ts REAL")
+        conn.execute("ALTER TABLE price_alerts ADD COLUMN triggered_ts REAL")
+
+        conn.execute("INSERT OR IGNORE INTO alert_symbols (symbol) SELECT DISTINCT symbol FROM price_alerts")
+        conn.execute(f"""
+            UPDATE price_alerts SET
+                symbol_id = (SELECT id FROM alert_symbols WHERE alert_symbols.symbol = price_alerts.symbol),
+                created_ts = {_EPOCH.format('created_at')},
+                triggered_ts = {_EPOCH.format('triggered_at')}
+        """)
+        # Índice de cobertura: a carga dos alertas ativos não lê a tabela e já
+        # recebe as linhas na ordem do índice em memória
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_price_alerts_active_compact "
+                     "ON price_alerts (triggered, symbol_id, condition, target_price, created_ts)")
+
+    def _migrate_v7(self, conn):
+        """
+        Cotações do monitoramento com número de sequência
+
+        Cada cotação recebe um novo `seq` apenas quando muda, permitindo que
+        o monitoramento devolva só o que mudou desde o cursor do cliente.
+        """
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS quotes (
+                symbol TEXT PRIMARY KEY,
+                current_price REAL NOT NULL,
+                previous_price REAL,
+                change_percent REAL,
+                volume INTEGER,
+                seq INTEGER NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_quotes_seq ON quotes (seq)")
+        conn.execute("INSERT OR IGNORE INTO alert_meta (key, value) VALUES ('quote_seq', 0)")
+
+    def _migrate_v8(self, conn):
+        """
+        Tipo de cada ativo dos portfólios monitorados
+
+        Criptomoedas são cotadas pelo par <SÍMBOLO>-USD; composições gravadas
+        antes desta versão são tratadas como ações.
+        """
+        conn.execute("ALTER TABLE alert_portfolios ADD COLUMN asset_type TEXT NOT NULL DEFAULT 'stock'")
+
+    def _import_legacy_json(self, conn):
+        """
+        Importa os antigos data/alerts.json e performance_alerts.json, uma única vez
+
+        Os arquivos são renomeados para .migrated pelo construtor, depois que
+        a transação das migrações é confirmada.
+        """
+        for table, columns in (('price_alerts', PRICE_COLUMNS), ('performance_alerts', PERFORMANCE_COLUMNS)):
+            path = self.legacy_files.get(table)
+            if not path or not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'r') as f:
+                    records = json.load(f)
+            except (OSError, ValueError):
+                continue
+            self._insert(conn, table, columns, records)
+            self._imported_files.append(path)
+
+    @staticmethod
+    def _insert(conn, table: str, columns: Tuple[str, ...], records: Iterable[Dict[str, Any]]):
+        placeholders = ', '.join('?' for _ in columns)
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            [tuple(record.get(column) for column in columns) for record in records]
+        )
+
+    @staticmethod
+    def _bump_price_version(conn) -> int:
+        conn.execute("UPDATE alert_meta SET value = value + 1 WHERE key = 'price_version'")
+        return conn.execute("SELECT value FROM alert_meta WHERE key = 'price_version'").fetchone()[0]
+
+    def get_price_version(self) -> int:
+        """Versão atual dos alertas de preço (incrementada a cada escrita)"""
+        return self._query("SELECT value FROM alert_meta WHERE key = 'price_version'")[0][0]
+
+    @staticmethod
+    def _to_record(row) -> Dict[str, Any]:
+        record = dict(row)
+        record['triggered'] = bool(record['triggered'])
+        return record
+
+    @classmethod
+    def _record_events(cls, conn, alert_type: str, rows):
+        """Acrescenta os disparos ao histórico e às contagens diárias"""
+        subject = 'symbol' if alert_type == 'price' else 'portfolio_id'
+        events = []
+        for row in rows:
+            record = cls._to_record(row)
+            events.append((record['triggered_at'][:10], record['triggered_at'], alert_type,
+                           record['id'], record[subject], json.dumps(record)))
+        conn.executemany(
+            "INSERT INTO alert_events (day, triggered_at, alert_type, alert_id, subject, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            events
+        )
+
+        counts: Dict[str, int] = {}
+        for event in events:
+            counts[event[0]] = counts.get(event[0], 0) + 1
+        conn.executemany(
+            "INSERT INTO alert_daily_counts (day, alert_type, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(day, alert_type) DO UPDATE SET count = count + excluded.count",
+            [(day, alert_type, count) for day, count in counts.items()]
+        )
+
+    @staticmethod
+    def _adjust_counter(conn, name: str, delta: int):
+        if delta:
+            conn.execute(
+                "INSERT INTO alert_counters (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, delta)
+            )
+
+    # Alertas de preço
+
+    def add_price_alert(self, record: Dict[str, Any]) -> Tuple[int, int, int]:
+        """Insere um alerta de preço e retorna (nova versão, rowid, id do símbolo)"""
+        version, rows = self.add_price_alerts([record])
+        return version, *rows[0]
+
+    def add_price_alerts(self, records: List[Dict[str, Any]]) -> Tuple[int, List[Tuple[int, int]]]:
+        """
+        Insere vários alertas de preço em uma única transação
+
+        Retorna (nova versão, [(rowid, id do símbolo)] na ordem dos registros).
+        """
+        with self.transaction() as conn:
+            self._insert(conn, 'price_alerts', PRICE_COLUMNS, records)
+            conn.executemany("INSERT OR IGNORE INTO alert_symbols (symbol) VALUES (?)",
+                             [(symbol,) for symbol in {record['symbol'] for record in records}])
+            ids = {}
+            for start in range(0, len(records), 500):
+                chunk = [record['id'] for record in records[start:start + 500]]
+                rows = conn.execute(
+                    "UPDATE price_alerts SET "
+                    "symbol_id = (SELECT id FROM alert_symbols WHERE symbol = price_alerts.symbol), "
+                    f"created_ts = {_EPOCH.format('created_at')}, triggered_ts = {_EPOCH.format('triggered_at')} "
+                    f"WHERE id IN ({', '.join('?' for _ in chunk)}) RETURNING id, rowid, symbol_id",
+                    chunk
+                ).fetchall()
+                ids.update((row['id'], (row['rowid'], row['symbol_id'])) for row in rows)
+            self._adjust_counter(conn, 'active_price', sum(1 for record in records if not record.get('triggered')))
+            return self._bump_price_version(conn), [ids[record['id']] for record in records]
+
+    def iter_active_price_alerts(self) -> Tuple[Iterable[tuple], Dict[str, int]]:
+        """
+        Alertas de preço ativos em forma compacta para o índice em memória
+
+        Retorna tuplas (rowid, symbol_id, target_price, below, created_ts),
+        sem montar um dicionário por alerta, e o mapa {símbolo: id}.
+        """
+        symbol_ids = {row['symbol']: row['id'] for row in self._query("SELECT id, symbol FROM alert_symbols")}
+        cursor = self._connection().cursor()
+        cursor.row_factory = None
+        cursor.execute(
+            "SELECT rowid, symbol_id, target_price, condition = 'below', COALESCE(created_ts, 0) "
+            "FROM price_alerts WHERE triggered = 0"
+        )
+        return cursor, symbol_ids
+
+    def get_price_alerts(self, triggered: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """
+        Lista alertas de preço, opcionalmente filtrando pelo estado
+
+        O preço atual dos alertas ativos vem do último preço do símbolo.
+        """
+        query = (f"SELECT {', '.join('a.' + column for column in PRICE_COLUMNS if column != 'current_price')}, "
+                 "CASE WHEN a.triggered = 0 THEN COALESCE(p.price, a.current_price) "
+                 "ELSE a.current_price END AS current_price "
+                 "FROM price_alerts a LEFT JOIN symbol_prices p ON p.symbol = a.symbol")
+        if triggered is None:
+            rows = self._query(query)
+        else:
+            rows = self._query(query + " WHERE a.triggered = ?", (int(triggered),))
+        return [self._to_record(row) for row in rows]
+
+    def update_price_checks(self, prices: Dict[str, float], triggered: Dict[str, Iterable[int]],
+                            triggered_at: str):
+        """
+        Registra o resultado de uma verificação em uma única transação
+
+        `prices` atualiza o último preço de cada símbolo e `triggered` contém
+        os rowids dos alertas acionados por símbolo. Retorna
+        (alertas efetivamente acionados, nova versão); um alerta já acionado
+        por outro worker não é retornado novamente.
+        """
+        fired = []
+        with self.transaction() as conn:
+            self._upsert_symbol_prices(conn, prices)
+            for symbol, rowids in triggered.items():
+                rowids = [int(rowid) for rowid in rowids]
+                for start in range(0, len(rowids), 500):
+                    chunk = rowids[start:start + 500]
+                    fired.extend(conn.execute(
+                        "UPDATE price_alerts SET triggered = 1, current_price = ?, triggered_at = ?, "
+                        f"triggered_ts = {_EPOCH.format('?')} "
+                        f"WHERE rowid IN ({', '.join('?' for _ in chunk)}) AND triggered = 0 "
+                        f"RETURNING {', '.join(PRICE_COLUMNS)}",
+                        (prices[symbol], triggered_at, triggered_at, *chunk)
+                    ).fetchall())
+            self._record_events(conn, 'price', fired)
+            self._adjust_counter(conn, 'active_price', -len(fired))
+            version = self._bump_price_version(conn) if triggered else None
+        return [self._to_record(row) for row in fired], version
+
+    @staticmethod
+    def _upsert_symbol_prices(conn, prices: Dict[str, float]):
+        conn.executemany(
+            "INSERT INTO symbol_prices (symbol, price, updated_at) VALUES (?, ?, datetime('now')) "
+            "ON CONFLICT(symbol) DO UPDATE SET price = excluded.price, updated_at = excluded.updated_at",
+            list(prices.items())
+        )
+
+    def save_symbol_prices(self, prices: Dict[str, float]):
+        """Grava o último preço de cada símbolo (compartilhado entre os workers)"""
+        if prices:
+            with self.transaction() as conn:
+                self._upsert_symbol_prices(conn, prices)
+
+    def get_symbol_prices(self, symbols: List[str], max_age: float) -> Dict[str, float]:
+        """Últimos preços gravados há no máximo `max_age` segundos"""
+        prices = {}
+        for start in range(0, len(symbols), 500):
+            chunk = symbols[start:start + 500]
+            rows = self._query(
+                "SELECT symbol, price FROM symbol_prices "
+                f"WHERE symbol IN ({', '.join('?' for _ in chunk)}) AND updated_at >= datetime('now', ?)",
+                (*chunk, f'-{int(max_age)} seconds')
+            )
+            prices.update((row['symbol'], row['price']) for row in rows)
+        return prices
+
+    # Cotações do monitoramento
+
+    def save_quotes(self, quotes: Dict[str, Dict[str, float]]):
+        """Grava as cotações; apenas as que mudaram recebem um novo seq"""
+        if not quotes:
+            return
+        with self.transaction() as conn:
+            seq = conn.execute("SELECT value FROM alert_meta WHERE key = 'quote_seq'").fetchone()[0]
+            conn.executemany(
+                "INSERT INTO quotes (symbol, current_price, previous_price, change_percent, volume, seq, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, datetime('now')) "
+                "ON CONFLICT(symbol) DO UPDATE SET "
+                "seq = CASE WHEN quotes.current_price IS NOT excluded.current_price "
+                "OR quotes.previous_price IS NOT excluded.previous_price "
+                "OR quotes.volume IS NOT excluded.volume THEN excluded.seq ELSE quotes.seq END, "
+                "current_price = excluded.current_price, previous_price = excluded.previous_price, "
+                "change_percent = excluded.change_percent, volume = excluded.volume, updated_at = excluded.updated_at",
+                [(symbol, quote['current_price'], quote['previous_price'], quote['change_percent'],
+                  quote['volume'], seq + i + 1) for i, (symbol, quote) in enumerate(quotes.items())]
+            )
+            conn.execute("UPDATE alert_meta SET value = ? WHERE key = 'quote_seq'", (seq + len(quotes),))
+            self._upsert_symbol_prices(conn, {symbol: quote['current_price'] for symbol, quote in quotes.items()})
+
+    def get_quotes(self, symbols: List[str], after_seq: Optional[int] = None) -> Dict[str, Dict[str, Any]]:
+        """Cotações dos símbolos, opcionalmente apenas as alteradas após `after_seq`"""
+        quotes = {}
+        for start in range(0, len(symbols), 500):
+            chunk = symbols[start:start + 500]
+            query = ("SELECT symbol, current_price, previous_price, change_percent, volume, seq, updated_at "
+                     f"FROM quotes WHERE symbol IN ({', '.join('?' for _ in chunk)})")
+            params = list(chunk)
+            if after_seq is not None:
+                query += " AND seq > ?"
+                params.append(after_seq)
+            quotes.update((row['symbol'], dict(row)) for row in self._query(query, params))
+        return quotes
+
+    def get_stale_quote_symbols(self, symbols: List[str], max_age: float) -> List[str]:
+        """Símbolos sem cotação ou com cotação mais antiga que `max_age` segundos"""
+        fresh = set()
+        for start in range(0, len(symbols), 500):
+            chunk = symbols[start:start + 500]
+            rows = self._query(
+                f"SELECT symbol FROM quotes WHERE symbol IN ({', '.join('?' for _ in chunk)}) "
+                "AND updated_at >= datetime('now', ?)",
+                (*chunk, f'-{int(max_age)} seconds')
+            )
+            fresh.update(row['symbol'] for row in rows)
+        return [symbol for symbol in symbols if symbol not in fresh]
+
+    def get_monitoring_position(self) -> Tuple[int, int]:
+        """Posição atual (seq das cotações, id do último evento de disparo)"""
+        seq = self._query("SELECT value FROM alert_meta WHERE key = 'quote_seq'")[0][0]
+        event_id = self._query("SELECT COALESCE(MAX(id), 0) FROM alert_events")[0][0]
+        return seq, event_id
+
+    def get_triggered_price_alerts(self, since: str) -> List[Dict[str, Any]]:
+        return self.get_alert_events('price', since)
+
+    # Alertas de performance
+
+    def add_performance_alert(self, record: Dict[str, Any]):
+        with self.transaction() as conn:
+            self._insert(conn, 'performance_alerts', PERFORMANCE_COLUMNS, [record])
+            self._adjust_counter(conn, 'active_performance', 0 if record.get('triggered') else 1)
+
+    def get_performance_alerts(self, triggered: Optional[bool] = None) -> List[Dict[str, Any]]:
+        """
+        Lista alertas de performance, opcionalmente filtrando pelo estado
+
+        O valor atual dos alertas ativos vem das últimas métricas do portfólio.
+        """
+        metric_value = " ".join(
+            f"WHEN '{metric}' THEN m.{field}" for metric, field in ALERT_METRICS.items()
+        )
+        query = (f"SELECT {', '.join('a.' + column for column in PERFORMANCE_COLUMNS if column != 'current_value')}, "
+                 f"CASE WHEN a.triggered = 0 THEN COALESCE(CASE a.metric {metric_value} END, a.current_value) "
+                 "ELSE a.current_value END AS current_value "
+                 "FROM performance_alerts a LEFT JOIN portfolio_metrics m ON m.portfolio_id = a.portfolio_id")
+        if triggered is None:
+            rows = self._query(query)
+        else:
+            rows = self._query(query + " WHERE a.triggered = ?", (int(triggered),))
+        return [self._to_record(row) for row in rows]
+
+    def get_performance_alerts_by_ids(self, alert_ids: List[str]) -> List[Dict[str, Any]]:
+        records = []
+        for start in range(0, len(alert_ids), 500):
+            chunk = alert_ids[start:start + 500]
+            rows = self._query(
+                f"SELECT {', '.join(PERFORMANCE_COLUMNS)} FROM performance_alerts "
+                f"WHERE id IN ({', '.join('?' for _ in chunk)})",
+                chunk
+            )
+            records.extend(self._to_record(row) for row in rows)
+        return records
+
+    def update_performance_checks(self, metrics: Dict[str, Dict[str, float]],
+                                  triggered: List[Tuple[str, float]], checked_at: str) -> List[str]:
+        """
+        Registra as métricas calculadas por portfólio e os alertas acionados
+
+        `triggered` contém (id, valor) dos alertas acionados. Retorna os ids
+        efetivamente acionados nesta transação.
+        """
+        fired = []
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO portfolio_metrics "
+                f"(portfolio_id, {', '.join(METRIC_FIELDS)}, updated_at) "
+                f"VALUES (?, {', '.join('?' for _ in METRIC_FIELDS)}, ?)",
+                [(portfolio_id, *(values[field] for field in METRIC_FIELDS), checked_at)
+                 for portfolio_id, values in metrics.items()]
+            )
+            for alert_id, value in triggered:
+                row = conn.execute(
+                    "UPDATE performance_alerts SET triggered = 1, current_value = ?, triggered_at = ? "
+                    f"WHERE id = ? AND triggered = 0 RETURNING {', '.join(PERFORMANCE_COLUMNS)}",
+                    (value, checked_at, alert_id)
+                ).fetchone()
+                if row:
+                    fired.append(row)
+            self._record_events(conn, 'performance', fired)
+            self._adjust_counter(conn, 'active_performance', -len(fired))
+        return [row['id'] for row in fired]
+
+    def set_portfolio_assets(self, portfolio_id: str, assets: Dict[str, Tuple[str, float]]):
+        """Substitui a composição ({símbolo: (tipo, peso)}) de um portfólio monitorado"""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM alert_portfolios WHERE portfolio_id = ?", (portfolio_id,))
+            conn.executemany(
+                "INSERT INTO alert_portfolios (portfolio_id, symbol, asset_type, weight) VALUES (?, ?, ?, ?)",
+                [(portfolio_id, symbol, asset_type, weight) for symbol, (asset_type, weight) in assets.items()]
+            )
+            conn.execute("DELETE FROM portfolio_metrics WHERE portfolio_id = ?", (portfolio_id,))
+
+    def get_portfolio_assets(self, portfolio_ids: Iterable[str]) -> Dict[str, Dict[str, Tuple[str, float]]]:
+        """Composição ({símbolo: (tipo, peso)}) de cada portfólio monitorado"""
+        portfolio_ids = list(portfolio_ids)
+        portfolios: Dict[str, Dict[str, Tuple[str, float]]] = {}
+        for start in range(0, len(portfolio_ids), 500):
+            chunk = portfolio_ids[start:start + 500]
+            rows = self._query(
+                "SELECT portfolio_id, symbol, asset_type, weight FROM alert_portfolios "
+                f"WHERE portfolio_id IN ({', '.join('?' for _ in chunk)})",
+                chunk
+            )
+            for row in rows:
+                portfolios.setdefault(row['portfolio_id'], {})[row['symbol']] = (row['asset_type'], row['weight'])
+        return portfolios
+
+    def get_triggered_performance_alerts(self, since: str) -> List[Dict[str, Any]]:
+        return self.get_alert_events('performance', since)
+
+    # Histórico de disparos
+
+    def get_alert_events(self, alert_type: str, since: str) -> List[Dict[str, Any]]:
+        """Alertas acionados a partir de `since`, em ordem de disparo (busca pelo índice)"""
+        rows = self._query(
+            "SELECT payload FROM alert_events WHERE alert_type = ? AND triggered_at >= ? ORDER BY triggered_at, id",
+            (alert_type, since)
+        )
+        return [json.loads(row['payload']) for row in rows]
+
+    def get_alert_events_after(self, alert_type: str, event_id: int) -> List[Dict[str, Any]]:
+        """Alertas acionados depois do evento `event_id` (busca pela chave primária)"""
+        rows = self._query(
+            "SELECT payload FROM alert_events WHERE id > ? AND alert_type = ? ORDER BY id",
+            (event_id, alert_type)
+        )
+        return [json.loads(row['payload']) for row in rows]
+
+    def count_triggered_since(self, since: str) -> Dict[str, int]:
+        """
+        Quantidade de disparos por tipo a partir de `since`
+
+        Os dias completos vêm das contagens diárias; apenas o primeiro dia
+        é contado nos eventos.
+        """
+        day = since[:10]
+        counts = {'price': 0, 'performance': 0}
+        for row in self._query(
+            "SELECT alert_type, SUM(count) AS total FROM alert_daily_counts WHERE day > ? GROUP BY alert_type",
+            (day,)
+        ):
+            counts[row['alert_type']] = counts.get(row['alert_type'], 0) + row['total']
+        for row in self._query(
+            "SELECT alert_type, COUNT(*) AS total FROM alert_events "
+            "WHERE day = ? AND triggered_at >= ? GROUP BY alert_type",
+            (day, since)
+        ):
+            counts[row['alert_type']] = counts.get(row['alert_type'], 0) + row['total']
+        return counts
+
+    def get_counters(self) -> Dict[str, int]:
+        return {row['name']: row['value'] for row in self._query("SELECT name, value FROM alert_counters")}
+
+    def compact(self, event_retention_days: int, count_retention_days: int) -> Dict[str, int]:
+        """
+        Remove partições diárias de eventos e alertas acionados antigos
+
+        As contagens diárias são mantidas por `count_retention_days`, de modo
+        que o resumo continua correto depois que os eventos são removidos.
+        """
+        today = datetime.now()
+        event_cutoff = (today - timedelta(days=event_retention_days)).date().isoformat()
+        count_cutoff = (today - timedelta(days=count_retention_days)).date().isoformat()
+        with self.transaction() as conn:
+            events = conn.execute("DELETE FROM alert_events WHERE day < ?", (event_cutoff,)).rowcount
+            alerts = 0
+            for table in ('price_alerts', 'performance_alerts'):
+                alerts += conn.execute(
+                    f"DELETE FROM {table} WHERE triggered = 1 AND triggered_at < ?", (event_cutoff,)
+                ).rowcount
+            conn.execute("DELETE FROM alert_daily_counts WHERE day < ?", (count_cutoff,))
+        return {'events_removed': events, 'alerts_removed': alerts}
+
+    # Verificações agendadas
+
+    def record_check(self, kind: str, started_at: str, finished_at: str,
+                     triggered_count: int, error: Optional[str] = None):
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO alert_checks (kind, started_at, finished_at, triggered_count, error) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (kind, started_at, finished_at, triggered_count, error)
+            )
+
+    def get_last_check(self, kind: str) -> Optional[Dict[str, Any]]:
+        rows = self._query(
+            "SELECT kind, started_at, finished_at, triggered_count, error FROM alert_checks WHERE kind = ?",
+            (kind,)
+        )
+        return dict(rows[0]) if rows else None
+
+    # Operações comuns
+
+    def delete_alert(self, alert_id: str, alert_type: str = "price") -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+        """
+        Remove um alerta
+
+        Retorna (linha removida ou None, nova versão dos alertas de preço).
+        """
+        table = 'price_alerts' if alert_type == 'price' else 'performance_alerts'
+        version = None
+        returning = "triggered, rowid, symbol_id, target_price, condition" if alert_type == 'price' else "triggered"
+        with self.transaction() as conn:
+            row = conn.execute(f"DELETE FROM {table} WHERE id = ? RETURNING {returning}", (alert_id,)).fetchone()
+            if row is None:
+                return None, None
+            if not row['triggered']:
+                self._adjust_counter(conn, 'active_price' if alert_type == 'price' else 'active_performance', -1)
+            if alert_type == 'price':
+                version = self._bump_price_version(conn)
+        return dict(row), version
+
+    def delete_alerts(self, alert_ids: List[str],
+                      alert_type: str = "price") -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Remove vários alertas em uma única transação
+
+        Retorna (linhas removidas, nova versão dos alertas de preço ou None).
+        """
+        table = 'price_alerts' if alert_type == 'price' else 'performance_alerts'
+        returning = "id, triggered, rowid, symbol_id, target_price, condition" if alert_type == 'price' else "id, triggered"
+        deleted = []
+        version = None
+        with self.transaction() as conn:
+            for start in range(0, len(alert_ids), 500):
+                chunk = alert_ids[start:start + 500]
+                deleted.extend(dict(row) for row in conn.execute(
+                    f"DELETE FROM {table} WHERE id IN ({', '.join('?' for _ in chunk)}) RETURNING {returning}",
+                    chunk
+                ))
+            if not deleted:
+                return [], None
+            active = sum(1 for row in deleted if not row['triggered'])
+            self._adjust_counter(conn, 'active_price' if alert_type == 'price' else 'active_performance', -active)
+            if alert_type == 'price':
+                version = self._bump_price_version(conn)
+        return deleted, version
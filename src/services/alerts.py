@@ -1,12 +1,28 @@
-import json
 import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 import yfinance as yf
 from dataclasses import dataclass, asdict
 import uuid
+import threading
+import numpy as np
+from services.alert_index import ThresholdIndex
+from services.alert_store import AlertStore
+from services.market_data import PriceHistoryCache, get_latest_prices, get_latest_quotes, yahoo_ticker
+from services.metrics import ALERT_METRICS, portfolio_metrics
+from services.telemetry import cache_lookup, upstream
 
-@dataclass
+def parse_monitoring_cursor(cursor: str) -> tuple:
+    """Converte o cursor '<seq das cotações>-<id do evento>' do monitoramento"""
+    try:
+        quote_seq, event_id = (int(part) for part in str(cursor).split('-'))
+    except ValueError:
+        raise ValueError(f"Cursor inválido: {cursor}")
+    if quote_seq < 0 or event_id < 0:
+        raise ValueError(f"Cursor inválido: {cursor}")
+    return quote_seq, event_id
+
+@dataclass(slots=True)
 class PriceAlert:
     id: str
     symbol: str
@@ -17,7 +33,7 @@ class PriceAlert:
     triggered: bool = False
     triggered_at: Optional[str] = None
 
-@dataclass
+@dataclass(slots=True)
 class PerformanceAlert:
     id: str
     portfolio_id: str
@@ -35,14 +51,32 @@ class AlertManager:
         self.alerts_file = os.path.join(data_dir, "alerts.json")
         self.performance_alerts_file = os.path.join(data_dir, "performance_alerts.json")
         
-        # Criar diretório se não existir
-        os.makedirs(data_dir, exist_ok=True)
+        # Banco SQLite; os arquivos JSON antigos são importados na primeira execução
+        self.store = AlertStore(
+            os.path.join(data_dir, "alerts.db"),
+            legacy_files={
+                'price_alerts': self.alerts_file,
+                'performance_alerts': self.performance_alerts_file
+            }
+        )
+        
+        # Índice em memória dos alertas ativos, reconstruído quando a versão
+        # no banco muda (escritas feitas por outro worker)
+        self._index: Optional[ThresholdIndex] = None
+        self._index_version: Optional[int] = None
+        self._index_lock = threading.Lock()
+        
+        # Histórico de preços e métricas por portfólio reaproveitados entre
+        # ciclos; as métricas só são recalculadas quando chegam novas barras
+        self._price_cache = PriceHistoryCache()
+        self._metrics_cache: Dict[str, tuple] = {}
         
-        # Inicializar arquivos se não existirem
-        if not os.path.exists(self.alerts_file):
-            self._save_alerts([])
-        if not os.path.exists(self.performance_alerts_file):
-            self._save_performance_alerts([])
+        # Retenção do histórico de disparos (eventos detalhados e contagens diárias)
+        self.event_retention_days = int(os.environ.get('ALERT_EVENT_RETENTION_DAYS', 90))
+        self.count_retention_days = int(os.environ.get('ALERT_COUNT_RETENTION_DAYS', 730))
+        
+        # Idade máxima (segundos) das cotações reaproveitadas pelo monitoramento
+        self.quote_ttl = float(os.environ.get('MONITORING_QUOTE_TTL', 60))
     
     def create_price_alert(self, symbol: str, target_price: float, condition: str) -> Dict[str, Any]:
         """
@@ -51,7 +85,8 @@ class AlertManager:
         try:
             # Obter preço atual
             ticker = yf.Ticker(symbol)
-            current_price = ticker.history(period="1d")['Close'].iloc[-1]
+            with upstream('yfinance'):
+                current_price = ticker.history(period="1d")['Close'].iloc[-1]
             
             alert = PriceAlert(
                 id=str(uuid.uuid4()),
@@ -62,10 +97,11 @@ class AlertManager:
                 created_at=datetime.now().isoformat()
             )
             
-            # Carregar alertas existentes
-            alerts = self._load_alerts()
-            alerts.append(alert)
-            self._save_alerts(alerts)
+            version, rowid, symbol_id = self.store.add_price_alert(asdict(alert))
+            with self._index_lock:
+                if self._index is not None and version == self._index_version + 1:
+                    self._index.add(rowid, alert.symbol, symbol_id, float(alert.target_price), alert.condition)
+                    self._index_version = version
             
             return {
                 "success": True,
@@ -79,12 +115,97 @@ class AlertManager:
                 "error": f"Erro ao criar alerta: {str(e)}"
             }
     
+    def create_price_alerts(self, alerts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Cria vários alertas de preço de uma vez
+
+        O lote é validado por inteiro, o preço atual é buscado uma vez por
+        símbolo distinto (em uma única chamada em lote) e todos os alertas são
+        gravados em uma única transação: ou o lote inteiro é criado, ou nenhum.
+        """
+        try:
+            errors = []
+            for position, item in enumerate(alerts):
+                if not isinstance(item, dict):
+                    errors.append({"index": position, "error": "Alerta inválido"})
+                    continue
+                symbol = str(item.get('symbol') or '').strip()
+                condition = str(item.get('condition', 'above')).lower()
+                try:
+                    target_price = float(item.get('target_price'))
+                except (TypeError, ValueError):
+                    target_price = None
+                if not symbol or target_price is None:
+                    errors.append({"index": position, "error": "Símbolo e preço alvo são obrigatórios"})
+                elif condition not in ('above', 'below'):
+                    errors.append({"index": position, "error": 'Condição deve ser "above" ou "below"'})
+            if errors:
+                return {"success": False, "error": "Lote de alertas inválido", "errors": errors}
+
+            symbols = sorted({str(item['symbol']).strip().upper() for item in alerts})
+            prices = self.store.get_symbol_prices(symbols, self.quote_ttl)
+            stale = [symbol for symbol in symbols if symbol not in prices]
+            cache_lookup('symbol_prices', hits=len(prices), misses=len(stale))
+            if stale:
+                fetched = get_latest_prices(stale)
+                self.store.save_symbol_prices(fetched)
+                prices.update(fetched)
+
+            errors = [{"index": position, "error": f"Preço atual indisponível para {str(item['symbol']).strip().upper()}"}
+                      for position, item in enumerate(alerts) if str(item['symbol']).strip().upper() not in prices]
+            if errors:
+                return {"success": False, "error": "Lote de alertas inválido", "errors": errors}
+
+            created_at = datetime.now().isoformat()
+            records = []
+            for item in alerts:
+                symbol = str(item['symbol']).strip().upper()
+                records.append(asdict(PriceAlert(
+                    id=str(uuid.uuid4()),
+                    symbol=symbol,
+                    target_price=float(item['target_price']),
+                    condition=str(item.get('condition', 'above')).lower(),
+                    current_price=float(prices[symbol]),
+                    created_at=created_at
+                )))
+
+            version, rows = self.store.add_price_alerts(records) if records else (None, [])
+            with self._index_lock:
+                if version is not None and self._index is not None and version == self._index_version + 1:
+                    for record, (rowid, symbol_id) in zip(records, rows):
+                        self._index.add(rowid, record['symbol'], symbol_id, record['target_price'], record['condition'])
+                    self._index_version = version
+
+            return {
+                "success": True,
+                "created": len(records),
+                "alerts": records,
+                "message": f"{len(records)} alertas criados"
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Erro ao criar alertas: {str(e)}"
+            }
+    
     def create_performance_alert(self, portfolio_id: str, metric: str, 
-                               threshold: float, condition: str) -> Dict[str, Any]:
+                               threshold: float, condition: str,
+                               assets: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
         """
         Cria um alerta de performance para um portfólio
+        
+        `assets` ([{"symbol", "weight", "type"}]) define ou substitui a composição
+        do portfólio usada na avaliação dos alertas; `type` ('stock', 'crypto'
+        ou 'fund', padrão 'stock') define como o ativo é cotado.
         """
         try:
+            if assets:
+                self.store.set_portfolio_assets(portfolio_id, {
+                    asset['symbol'].upper(): (asset.get('type') or 'stock', float(asset.get('weight', 0)))
+                    for asset in assets if asset.get('symbol') and float(asset.get('weight', 0)) > 0
+                })
+            
             alert = PerformanceAlert(
                 id=str(uuid.uuid4()),
                 portfolio_id=portfolio_id,
@@ -95,10 +216,7 @@ class AlertManager:
                 created_at=datetime.now().isoformat()
             )
             
-            # Carregar alertas existentes
-            alerts = self._load_performance_alerts()
-            alerts.append(alert)
-            self._save_performance_alerts(alerts)
+            self.store.add_performance_alert(asdict(alert))
             
             return {
                 "success": True,
@@ -115,47 +233,123 @@ class AlertManager:
     def check_price_alerts(self) -> List[Dict[str, Any]]:
         """
         Verifica todos os alertas de preço e retorna os que foram acionados
+
+        Os preços dos símbolos com alertas ativos são obtidos em uma única
+        chamada em lote, e os alertas acionados por cada preço são localizados
+        por busca binária no índice ordenado, sem percorrer todos os alertas.
         """
-        alerts = self._load_alerts()
-        triggered_alerts = []
+        with self._index_lock:
+            symbols = self._get_index().symbols()
+        
+        if not symbols:
+            return []
+        
+        try:
+            prices = get_latest_prices(symbols)
+        except Exception as e:
+            print(f"Erro ao obter preços dos alertas: {str(e)}")
+            return []
         
-        for alert in alerts:
-            if alert.triggered:
-                continue
-                
+        for symbol in symbols:
+            if symbol not in prices:
+                print(f"Erro ao verificar alertas de {symbol}: preço indisponível")
+        
+        triggered_at = datetime.now().isoformat()
+        
+        with self._index_lock:
+            index = self._get_index()
+            updates = {}
+            for symbol, price in prices.items():
+                rowids = index.fire(symbol, price)
+                if len(rowids):
+                    updates[symbol] = rowids
+            
+            # Salvar apenas os alertas afetados; os dicionários são montados
+            # apenas para os alertas acionados
             try:
-                # Obter preço atual
-                ticker = yf.Ticker(alert.symbol)
-                current_price = ticker.history(period="1d")['Close'].iloc[-1]
-                alert.current_price = float(current_price)
-                
-                # Verificar condição
-                triggered = False
-                if alert.condition == 'above' and current_price >= alert.target_price:
-                    triggered = True
-                elif alert.condition == 'below' and current_price <= alert.target_price:
-                    triggered = True
-                
-                if triggered:
-                    alert.triggered = True
-                    alert.triggered_at = datetime.now().isoformat()
-                    triggered_alerts.append(asdict(alert))
-                    
-            except Exception as e:
-                print(f"Erro ao verificar alerta {alert.id}: {str(e)}")
-                continue
+                fired, version = self.store.update_price_checks(prices, updates, triggered_at)
+            except Exception:
+                self._index = None
+                raise
+            
+            if version is not None:
+                if version == self._index_version + 1:
+                    self._index_version = version
+                else:
+                    self._index = None
+        
+        return fired
+    
+    def check_performance_alerts(self) -> List[Dict[str, Any]]:
+        """
+        Verifica os alertas de performance e retorna os que foram acionados
+
+        As métricas de cada portfólio são calculadas uma única vez por ciclo,
+        para todos os portfólios de uma vez, sobre o histórico de preços em
+        cache, e então comparadas com todos os alertas.
+        """
+        alerts = self.store.get_performance_alerts(triggered=False)
+        if not alerts:
+            return []
+        
+        stored = self.store.get_portfolio_assets({alert['portfolio_id'] for alert in alerts})
+        portfolios = {}
+        for portfolio_id, assets in stored.items():
+            # Pesos por ticker do Yahoo Finance, como em /calculate-metrics (BTC -> BTC-USD)
+            weights = portfolios[portfolio_id] = {}
+            for symbol, (asset_type, weight) in assets.items():
+                ticker = yahoo_ticker(symbol, asset_type)
+                weights[ticker] = weights.get(ticker, 0.0) + weight
+        if not portfolios:
+            return []
         
-        # Salvar alertas atualizados
-        self._save_alerts(alerts)
+        closes = self._price_cache.get_closes({symbol for weights in portfolios.values() for symbol in weights})
+        metrics = self._get_portfolio_metrics(closes, portfolios)
         
-        return triggered_alerts
+        values = np.array([
+            metrics.get(alert['portfolio_id'], {}).get(ALERT_METRICS.get(alert['metric']), np.nan)
+            for alert in alerts
+        ])
+        thresholds = np.array([alert['threshold'] for alert in alerts], dtype=float)
+        above = np.array([alert['condition'] == 'above' for alert in alerts])
+        with np.errstate(invalid='ignore'):
+            fired = np.where(above, values >= thresholds, values <= thresholds)
+        
+        triggered = [(alerts[i]['id'], float(values[i])) for i in np.flatnonzero(fired)]
+        fired_ids = self.store.update_performance_checks(metrics, triggered, datetime.now().isoformat())
+        
+        return self.store.get_performance_alerts_by_ids(fired_ids) if fired_ids else []
+    
+    def _get_portfolio_metrics(self, closes, portfolios: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+        """Métricas por portfólio, recalculando apenas o que mudou desde o último ciclo"""
+        if closes.empty:
+            return {}
+        
+        # As métricas mudam somente com uma nova barra ou nova composição
+        bars = hash((closes.index[-1], tuple(closes.columns), closes.iloc[-1].to_numpy().tobytes()))
+        keys = {portfolio_id: (bars, tuple(sorted(weights.items()))) for portfolio_id, weights in portfolios.items()}
+        
+        metrics = {}
+        stale = {}
+        for portfolio_id, key in keys.items():
+            cached = self._metrics_cache.get(portfolio_id)
+            if cached is not None and cached[0] == key:
+                metrics[portfolio_id] = cached[1]
+            else:
+                stale[portfolio_id] = portfolios[portfolio_id]
+        metrics.update(portfolio_metrics(closes, stale))
+        
+        self._metrics_cache = {
+            portfolio_id: (keys[portfolio_id], values) for portfolio_id, values in metrics.items()
+        }
+        return metrics
     
     def get_active_alerts(self) -> Dict[str, Any]:
         """
         Retorna todos os alertas ativos (não acionados)
         """
-        price_alerts = [asdict(alert) for alert in self._load_alerts() if not alert.triggered]
-        performance_alerts = [asdict(alert) for alert in self._load_performance_alerts() if not alert.triggered]
+        price_alerts = self.store.get_price_alerts(triggered=False)
+        performance_alerts = self.store.get_performance_alerts(triggered=False)
         
         return {
             "price_alerts": price_alerts,
@@ -167,21 +361,10 @@ class AlertManager:
         """
         Retorna alertas acionados nos últimos N dias
         """
-        cutoff_date = datetime.now() - timedelta(days=days)
+        cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
         
-        price_alerts = []
-        for alert in self._load_alerts():
-            if alert.triggered and alert.triggered_at:
-                triggered_date = datetime.fromisoformat(alert.triggered_at)
-                if triggered_date >= cutoff_date:
-                    price_alerts.append(asdict(alert))
-        
-        performance_alerts = []
-        for alert in self._load_performance_alerts():
-            if alert.triggered and alert.triggered_at:
-                triggered_date = datetime.fromisoformat(alert.triggered_at)
-                if triggered_date >= cutoff_date:
-                    performance_alerts.append(asdict(alert))
+        price_alerts = self.store.get_triggered_price_alerts(cutoff_date)
+        performance_alerts = self.store.get_triggered_performance_alerts(cutoff_date)
         
         return {
             "price_alerts": price_alerts,
@@ -190,19 +373,43 @@ class AlertManager:
             "period_days": days
         }
     
+    def get_alerts_summary(self, days: int = 7) -> Dict[str, Any]:
+        """
+        Resumo dos alertas a partir dos contadores mantidos a cada escrita
+        """
+        counters = self.store.get_counters()
+        cutoff_date = (datetime.now() - timedelta(days=days)).isoformat()
+        triggered = self.store.count_triggered_since(cutoff_date)
+        
+        active_price = counters.get('active_price', 0)
+        active_performance = counters.get('active_performance', 0)
+        
+        return {
+            'active_count': active_price + active_performance,
+            'triggered_count': sum(triggered.values()),
+            'active_price_alerts': active_price,
+            'active_performance_alerts': active_performance,
+            'recent_triggered': sum(triggered.values()),
+            'status': 'healthy' if active_price + active_performance > 0 else 'no_alerts'
+        }
+    
+    def compact_history(self) -> Dict[str, int]:
+        """Aplica a retenção configurada ao histórico de disparos"""
+        return self.store.compact(self.event_retention_days, self.count_retention_days)
+    
     def delete_alert(self, alert_id: str, alert_type: str = "price") -> Dict[str, Any]:
         """
         Remove um alerta específico
         """
         try:
-            if alert_type == "price":
-                alerts = self._load_alerts()
-                alerts = [alert for alert in alerts if alert.id != alert_id]
-                self._save_alerts(alerts)
-            else:
-                alerts = self._load_performance_alerts()
-                alerts = [alert for alert in alerts if alert.id != alert_id]
-                self._save_performance_alerts(alerts)
+            deleted, version = self.store.delete_alert(alert_id, alert_type)
+            if version is not None:
+                with self._index_lock:
+                    if self._index is not None and version == self._index_version + 1:
+                        if not deleted['triggered']:
+                            self._index.remove(deleted['rowid'], deleted['symbol_id'],
+                                               deleted['target_price'], deleted['condition'])
+                        self._index_version = version
             
             return {
                 "success": True,
@@ -215,78 +422,121 @@ class AlertManager:
                 "error": f"Erro ao remover alerta: {str(e)}"
             }
     
-    def get_portfolio_monitoring(self, symbols: List[str]) -> Dict[str, Any]:
+    def delete_alerts(self, alert_ids: List[str], alert_type: str = "price") -> Dict[str, Any]:
+        """
+        Remove vários alertas em uma única transação
+        """
+        try:
+            deleted, version = self.store.delete_alerts(list(dict.fromkeys(alert_ids)), alert_type)
+            if version is not None:
+                with self._index_lock:
+                    if self._index is not None and version == self._index_version + 1:
+                        for row in deleted:
+                            if not row['triggered']:
+                                self._index.remove(row['rowid'], row['symbol_id'],
+                                                   row['target_price'], row['condition'])
+                        self._index_version = version
+            
+            deleted_ids = {row['id'] for row in deleted}
+            return {
+                "success": True,
+                "deleted": len(deleted_ids),
+                "not_found": [alert_id for alert_id in alert_ids if alert_id not in deleted_ids],
+                "message": f"{len(deleted_ids)} alertas removidos"
+            }
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Erro ao remover alertas: {str(e)}"
+            }
+    
+    def get_portfolio_monitoring(self, symbols: List[str], cursor: Optional[str] = None) -> Dict[str, Any]:
         """
         Monitora performance atual do portfólio
+
+        Sem `cursor` retorna o retrato completo dos ativos. Com o `cursor`
+        devolvido por uma chamada anterior, retorna apenas os ativos cuja
+        cotação mudou e os alertas acionados desde então.
         """
         try:
+            after_seq, after_event = parse_monitoring_cursor(cursor) if cursor else (None, None)
+            # Cotações são guardadas pelo símbolo em maiúsculas, mas a resposta
+            # usa o símbolo exatamente como enviado
+            requested = {symbol: symbol.upper() for symbol in symbols if symbol}
+            symbols = list(dict.fromkeys(requested.values()))
+
+            # Cotações mais antigas que o TTL são buscadas em uma única chamada em lote
+            stale = self.store.get_stale_quote_symbols(symbols, self.quote_ttl)
+            cache_lookup('quotes', hits=len(symbols) - len(stale), misses=len(stale))
+            fetch_error = None
+            if stale:
+                try:
+                    self.store.save_quotes(get_latest_quotes(stale))
+                except Exception as e:
+                    fetch_error = str(e)
+
+            # A posição é lida antes dos dados: uma mudança concorrente pode ser
+            # reenviada na próxima chamada, mas nunca perdida
+            quote_seq, event_id = self.store.get_monitoring_position()
+
             monitoring_data = {
                 "timestamp": datetime.now().isoformat(),
                 "assets": {},
-                "alerts_triggered": 0
+                "alerts_triggered": 0,
+                "cursor": f"{quote_seq}-{event_id}",
+                "delta": cursor is not None
             }
-            
-            # Verificar alertas de preço
-            triggered_alerts = self.check_price_alerts()
+
+            # Alertas acionados: na primeira chamada, os da última verificação
+            # do agendador; depois, apenas os disparados após o cursor
+            last_check = self.store.get_last_check('price')
+            if after_event is None:
+                triggered_alerts = (
+                    self.store.get_triggered_price_alerts(last_check['started_at']) if last_check else []
+                )
+            else:
+                triggered_alerts = self.store.get_alert_events_after('price', after_event)
             monitoring_data["alerts_triggered"] = len(triggered_alerts)
             monitoring_data["recent_alerts"] = triggered_alerts
-            
-            # Obter dados atuais dos ativos
-            for symbol in symbols:
-                try:
-                    ticker = yf.Ticker(symbol)
-                    hist = ticker.history(period="5d")
-                    
-                    if not hist.empty:
-                        current_price = hist['Close'].iloc[-1]
-                        prev_price = hist['Close'].iloc[-2] if len(hist) > 1 else current_price
-                        change_pct = ((current_price - prev_price) / prev_price) * 100
-                        
-                        monitoring_data["assets"][symbol] = {
-                            "current_price": float(current_price),
-                            "previous_price": float(prev_price),
-                            "change_percent": float(change_pct),
-                            "volume": int(hist['Volume'].iloc[-1]) if 'Volume' in hist else 0,
-                            "status": "up" if change_pct > 0 else "down" if change_pct < 0 else "stable"
-                        }
-                        
-                except Exception as e:
-                    monitoring_data["assets"][symbol] = {
-                        "error": f"Erro ao obter dados: {str(e)}"
+            monitoring_data["last_check"] = last_check
+
+            quotes = self.store.get_quotes(symbols, after_seq)
+            for submitted, symbol in requested.items():
+                quote = quotes.get(symbol)
+                if quote is not None:
+                    change_pct = quote['change_percent'] or 0.0
+                    monitoring_data["assets"][submitted] = {
+                        "current_price": quote['current_price'],
+                        "previous_price": quote['previous_price'],
+                        "change_percent": change_pct,
+                        "volume": quote['volume'] or 0,
+                        "status": "up" if change_pct > 0 else "down" if change_pct < 0 else "stable"
                     }
-            
+                elif after_seq is None:
+                    monitoring_data["assets"][submitted] = {
+                        "error": f"Erro ao obter dados: {fetch_error or 'cotação indisponível'}"
+                    }
+
             return monitoring_data
-            
+
         except Exception as e:
             return {
                 "error": f"Erro no monitoramento: {str(e)}"
             }
     
-    def _load_alerts(self) -> List[PriceAlert]:
-        """Carrega alertas de preço do arquivo"""
-        try:
-            with open(self.alerts_file, 'r') as f:
-                data = json.load(f)
-                return [PriceAlert(**alert) for alert in data]
-        except:
-            return []
-    
-    def _save_alerts(self, alerts: List[PriceAlert]):
-        """Salva alertas de preço no arquivo"""
-        with open(self.alerts_file, 'w') as f:
-            json.dump([asdict(alert) for alert in alerts], f, indent=2)
-    
-    def _load_performance_alerts(self) -> List[PerformanceAlert]:
-        """Carrega alertas de performance do arquivo"""
-        try:
-            with open(self.performance_alerts_file, 'r') as f:
-                data = json.load(f)
-                return [PerformanceAlert(**alert) for alert in data]
-        except:
-            return []
-    
-    def _save_performance_alerts(self, alerts: List[PerformanceAlert]):
-        """Salva alertas de performance no arquivo"""
-        with open(self.performance_alerts_file, 'w') as f:
-            json.dump([asdict(alert) for alert in alerts], f, indent=2)
+    def _get_index(self) -> ThresholdIndex:
+        """
+        Retorna o índice dos alertas ativos (chamar com _index_lock)
 
+        Se outro processo alterou os alertas desde a última leitura, o índice
+        é reconstruído a partir do banco.
+        """
+        version = self.store.get_price_version()
+        stale = self._index is None or version != self._index_version
+        # Muitos alertas novos fora do array principal: reconstruir compacta o índice
+        if stale or self._index.pending > max(1000, len(self._index) // 10):
+            rows, symbol_ids = self.store.iter_active_price_alerts()
+            self._index = ThresholdIndex.build(rows, symbol_ids)
+            self._index_version = version
+        return self._index
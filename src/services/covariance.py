@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+TRADING_DAYS = 252
+
+COVARIANCE_METHODS = ('sample', 'ledoit_wolf', 'pca')
+
+
+class SampleCovariance:
+    """
+    Matriz de covariância densa (estimador amostral tradicional)
+    """
+    method = 'sample'
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = np.asarray(matrix, dtype=float)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def matvec(self, weights: np.ndarray) -> np.ndarray:
+        """Retorna Σw"""
+        return self.matrix @ weights
+
+    def variance(self, weights: np.ndarray) -> float:
+        """Retorna wᵀΣw"""
+        return float(weights @ self.matrix @ weights)
+
+    def diagonal(self) -> np.ndarray:
+        return np.diag(self.matrix).copy()
+
+    def subset_variance(self, indices: np.ndarray, weights: np.ndarray) -> float:
+        """Variância de um portfólio restrito ao subconjunto `indices`"""
+        sub = self.matrix[np.ix_(indices, indices)]
+        return float(weights @ sub @ weights)
+
+    def solve_shifted(self, shift: np.ndarray, rhs: np.ndarray) -> np.ndarray:
+        """Resolve (Σ + diag(shift)) x = rhs"""
+        return np.linalg.solve(self.matrix + np.diag(shift), rhs)
+
+    def to_dense(self) -> np.ndarray:
+        return self.matrix
+
+
+class LowRankCovariance:
+    """
+    Covariância estruturada como Σ = B Bᵀ + diag(d).
+
+    B (k x r) contém as cargas dos fatores e d as variâncias específicas.
+    Produtos Σw custam O(k·r) em vez de O(k²) e a matriz k x k nunca é
+    materializada, o que permite otimizar universos com milhares de ativos.
+    """
+
+    def __init__(self, loadings: np.ndarray, specific: np.ndarray, method: str):
+        self.loadings = np.asarray(loadings, dtype=float)
+        self.specific = np.asarray(specific, dtype=float)
+        self.method = method
+
+    def __len__(self):
+        return self.loadings.shape[0]
+
+    @property
+    def rank(self) -> int:
+        return self.loadings.shape[1]
+
+    def matvec(self, weights: np.ndarray) -> np.ndarray:
+        """Retorna Σw = B(Bᵀw) + d∘w"""
+        return self.loadings @ (self.loadings.T @ weights) + self.specific * weights
+
+    def variance(self, weights: np.ndarray) -> float:
+        """Retorna wᵀΣw = |Bᵀw|² + Σ dᵢwᵢ²"""
+        exposures = self.loadings.T @ weights
+        return float(exposures @ exposures + np.sum(self.specific * weights * weights))
+
+    def diagonal(self) -> np.ndarray:
+        return np.einsum('ij,ij->i', self.loadings, self.loadings) + self.specific
+
+    def subset_variance(self, indices: np.ndarray, weights: np.ndarray) -> float:
+        """Variância de um portfólio restrito ao subconjunto `indices`, em O(|indices|·r)"""
+        exposures = self.loadings[indices].T @ weights
+        return float(exposures @ exposures + np.sum(self.specific[indices] * weights * weights))
+
+    def solve_shifted(self, shift: np.ndarray, rhs: np.ndarray) -> np.ndarray:
+        """
+        Resolve (Σ + diag(shift)) x = rhs pela identidade de Woodbury, em O(k·r²)
+        """
+        inv_diag = 1.0 / (self.specific + shift)
+        scaled = self.loadings * inv_diag[:, None]
+        capacitance = np.eye(self.rank) + self.loadings.T @ scaled
+        correction = scaled @ np.linalg.solve(capacitance, scaled.T @ rhs)
+        return inv_diag * rhs - correction
+
+    def to_dense(self) -> np.ndarray:
+        return self.loadings @ self.loadings.T + np.diag(self.specific)
+
+
+def estimate_covariance(returns_df: pd.DataFrame, method: str = 'sample',
+                        n_factors: Optional[int] = None, periods: int = TRADING_DAYS):
+    """
+    Estima a covariância anualizada dos retornos.
+
+    - 'sample': covariância amostral (returns_df.cov()), densa
+    - 'ledoit_wolf': encolhimento de Ledoit-Wolf em direção a μI, low-rank + diagonal
+    - 'pca': modelo de fatores estatísticos (componentes principais) + risco específico
+    """
+    if method not in COVARIANCE_METHODS:
+        raise ValueError(f"Método de covariância inválido: {method}")
+
+    if method == 'sample':
+        return SampleCovariance(returns_df.cov().values * periods)
+
+    returns = returns_df.values
+    n_obs, n_assets = returns.shape
+    centered = returns - returns.mean(axis=0)
+
+    if method == 'ledoit_wolf':
+        shrinkage, mu = _ledoit_wolf_shrinkage(centered)
+        # Σ = δμI + (1-δ)XᵀX/n: os próprios retornos centrados são as cargas
+        loadings = centered.T * np.sqrt((1 - shrinkage) * periods / n_obs)
+        specific = np.full(n_assets, shrinkage * mu * periods)
+        return LowRankCovariance(loadings, specific, method)
+
+    # PCA via SVD da matriz de retornos (n x k), sem formar a covariância
+    max_factors = max(min(n_obs, n_assets) - 1, 1)
+    n_factors = min(int(n_factors or 10), max_factors)
+    _, singular_values, components = np.linalg.svd(centered, full_matrices=False)
+    loadings = components[:n_factors].T * (singular_values[:n_factors] / np.sqrt(n_obs - 1))
+
+    total_variance = np.sum(centered ** 2, axis=0) / (n_obs - 1)
+    specific = total_variance - np.einsum('ij,ij->i', loadings, loadings)
+    # Piso para manter a matriz positiva definida
+    specific = np.maximum(specific, 1e-6 * total_variance.mean())
+
+    return LowRankCovariance(loadings * np.sqrt(periods), specific * periods, method)
+
+
+def _ledoit_wolf_shrinkage(centered: np.ndarray):
+    """
+    Calcula a intensidade de encolhimento de Ledoit-Wolf (alvo μI).
+
+    Usa a matriz de Gram n x n (XXᵀ) em vez da covariância k x k, de modo que
+    o custo é O(n²k) mesmo quando há mais ativos do que observações.
+    """
+    n_obs, n_assets = centered.shape
+    squared = centered ** 2
+
+    emp_cov_trace = squared.sum(axis=0) / n_obs
+    mu = emp_cov_trace.sum() / n_assets
+
+    gram = centered @ centered.T
+    # ||XᵀX||²_F = ||XXᵀ||²_F
+    delta_ = np.sum(gram ** 2) / n_obs ** 2
+    # Σ_ij Σ_t x_ti² x_tj² = Σ_t (Σ_i x_ti²)²
+    beta_ = np.sum(squared.sum(axis=1) ** 2)
+
+    beta = (beta_ / n_obs - delta_) / (n_assets * n_obs)
+    delta = (delta_ - 2 * mu * emp_cov_trace.sum() + n_assets * mu ** 2) / n_assets
+    beta = min(beta, delta)
+
+    shrinkage = 0.0 if delta == 0 else beta / delta
+    return float(np.clip(shrinkage, 0.0, 1.0)), float(mu)
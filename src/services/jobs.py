@@ -0,0 +1,230 @@
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from services.storage import SQLiteStore
+
+
+class JobCancelled(BaseException):
+    """
+    Sinaliza que o job foi cancelado pelo cliente.
+
+    Herda de BaseException (como asyncio.CancelledError) para não ser
+    engolida pelos blocos `except Exception` dos serviços de cálculo.
+    """
+
+
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+def _json_default(value):
+    """Converte tipos numpy/pandas para tipos nativos do JSON"""
+    if hasattr(value, 'item'):
+        return value.item()
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'Tipo não serializável: {type(value).__name__}')
+
+
+class JobQueue(SQLiteStore):
+    """
+    Fila local de jobs assíncronos.
+
+    Os jobs executam em um pool de threads do próprio processo, enquanto o
+    estado (progresso, resultado, pedido de cancelamento) fica em SQLite, de
+    modo que qualquer worker do gunicorn pode consultar ou cancelar um job.
+
+    Cada processo renova a cada JOB_HEARTBEAT_SECONDS (padrão 10) o
+    `heartbeat_at` dos jobs que executa; um job sem renovação há mais de
+    JOB_LEASE_SECONDS (padrão 60) é dado como perdido. O dono é um UUID por
+    processo, então nem um pid reutilizado nem outro host se passam por ele.
+    """
+
+    def __init__(self, data_dir: str = "data", max_workers: Optional[int] = None,
+                 retention_hours: Optional[int] = None):
+        self.max_workers = max_workers or int(os.environ.get('JOB_WORKERS', 2))
+        self.retention_hours = retention_hours or int(os.environ.get('JOB_RETENTION_HOURS', 24))
+        self.heartbeat_seconds = float(os.environ.get('JOB_HEARTBEAT_SECONDS', 10))
+        self.lease_seconds = float(os.environ.get('JOB_LEASE_SECONDS', 60))
+        self._executor = None
+        self._executor_pid = None
+        self._worker_id = None
+        self._executor_lock = threading.Lock()
+        super().__init__(os.path.join(data_dir, "jobs.db"))
+
+    def _create_schema(self, conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT,
+                result TEXT,
+                error TEXT,
+                cancel_requested INTEGER NOT NULL DEFAULT 0,
+                worker_id TEXT,
+                heartbeat_at REAL,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT
+            )
+        """)
+        # Bancos criados antes do lease identificavam o dono só pelo pid
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(jobs)")}
+        if 'worker_id' not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN worker_id TEXT")
+        if 'heartbeat_at' not in columns:
+            conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)")
+
+    def submit(self, kind: str, func: Callable[..., Dict[str, Any]], *args, **kwargs) -> Dict[str, Any]:
+        """
+        Enfileira um job e retorna imediatamente seu estado inicial.
+
+        `func` recebe o argumento nomeado `progress(fraction, message=None)`,
+        que registra o progresso e interrompe o job se ele foi cancelado.
+        """
+        job_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
+        executor = self._get_executor()
+
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, worker_id, heartbeat_at, created_at) "
+                "VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, self._worker_id, time.time(), now)
+            )
+            cutoff = (datetime.now() - timedelta(hours=self.retention_hours)).isoformat()
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed', 'cancelled') AND created_at < ?",
+                (cutoff,)
+            )
+
+        executor.submit(self._run, job_id, func, args, kwargs)
+        return self.get_job(job_id)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Retorna o estado de um job (sem o resultado)"""
+        rows = self._query(
+            "SELECT id, kind, status, progress, message, error, cancel_requested, heartbeat_at, "
+            "created_at, started_at, finished_at FROM jobs WHERE id = ?",
+            (job_id,)
+        )
+        if not rows:
+            return None
+
+        job = dict(rows[0])
+        heartbeat_at = job.pop('heartbeat_at')
+        if job['status'] not in FINAL_STATUSES and time.time() - (heartbeat_at or 0) > self.lease_seconds:
+            # O processo que executava o job parou de renovar o lease (restart do worker)
+            self._finish(job_id, 'failed', error='Worker finalizado antes da conclusão do job')
+            return self.get_job(job_id)
+
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def get_result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Retorna o estado do job acompanhado do resultado, se disponível"""
+        job = self.get_job(job_id)
+        if job is None:
+            return None
+
+        rows = self._query("SELECT result FROM jobs WHERE id = ?", (job_id,))
+        raw = rows[0]['result'] if rows else None
+        job['result'] = json.loads(raw) if raw else None
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Solicita o cancelamento de um job enfileirado ou em execução"""
+        with self.transaction() as conn:
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            if row['status'] == 'queued':
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ? WHERE id = ?",
+                    (datetime.now().isoformat(), job_id)
+                )
+            elif row['status'] == 'running':
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+
+        return self.get_job(job_id)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """Cria o pool de threads e o heartbeat sob demanda (um por processo)"""
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='job-worker')
+                self._executor_pid = os.getpid()
+                self._worker_id = str(uuid.uuid4())
+                threading.Thread(target=self._heartbeat_loop, args=(self._worker_id,),
+                                 name='job-heartbeat', daemon=True).start()
+            return self._executor
+
+    def _heartbeat_loop(self, worker_id: str):
+        """Renova o lease dos jobs pendentes deste processo"""
+        while True:
+            time.sleep(self.heartbeat_seconds)
+            try:
+                with self.transaction() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET heartbeat_at = ? WHERE worker_id = ? AND status IN ('queued', 'running')",
+                        (time.time(), worker_id)
+                    )
+            except Exception as e:
+                print(f"Erro ao renovar jobs: {str(e)}")
+
+    def _run(self, job_id: str, func: Callable[..., Dict[str, Any]], args, kwargs):
+        """Executa o job em uma thread do pool"""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ? AND status = 'queued'",
+                (datetime.now().isoformat(), job_id)
+            )
+            if cursor.rowcount == 0:
+                return  # Cancelado antes de iniciar
+
+        def progress(fraction: float, message: Optional[str] = None):
+            with self.transaction() as conn:
+                conn.execute(
+                    "UPDATE jobs SET progress = ?, message = COALESCE(?, message), heartbeat_at = ? WHERE id = ?",
+                    (max(0.0, min(float(fraction), 1.0)), message, time.time(), job_id)
+                )
+                row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row and row['cancel_requested']:
+                raise JobCancelled()
+
+        try:
+            result = func(*args, progress=progress, **kwargs)
+        except JobCancelled:
+            self._finish(job_id, 'cancelled')
+            return
+        except Exception as e:
+            traceback.print_exc()
+            self._finish(job_id, 'failed', error=str(e))
+            return
+
+        if isinstance(result, dict) and 'error' in result:
+            self._finish(job_id, 'failed', error=result['error'], result=result)
+        else:
+            self._finish(job_id, 'completed', result=result)
+
+    def _finish(self, job_id: str, status: str, error: Optional[str] = None, result: Any = None):
+        """Registra o estado final de um job"""
+        payload = json.dumps(result, default=_json_default) if result is not None else None
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, result = ?, finished_at = ?, "
+                "progress = CASE WHEN ? = 'completed' THEN 1 ELSE progress END WHERE id = ?",
+                (status, error, payload, datetime.now().isoformat(), status, job_id)
+            )
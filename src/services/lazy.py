@@ -0,0 +1,115 @@
+import importlib
+import threading
+import time
+from datetime import datetime
+from types import ModuleType
+from typing import Any, Callable, Dict, List
+
+# Inicializações adiadas já feitas neste processo (relatório de startup)
+_loads: List[Dict[str, Any]] = []
+_loads_lock = threading.Lock()
+
+
+def _record(kind: str, name: str, started: float):
+    with _loads_lock:
+        _loads.append({
+            'kind': kind,
+            'name': name,
+            'ms': round((time.perf_counter() - started) * 1000, 2),
+            'at': datetime.now().isoformat()
+        })
+
+
+def lazy_loads() -> List[Dict[str, Any]]:
+    """Módulos e serviços carregados sob demanda, com o tempo de cada um"""
+    with _loads_lock:
+        return list(_loads)
+
+
+class LazyModule(ModuleType):
+    """
+    Módulo importado apenas no primeiro acesso a um atributo
+
+    `yf = lazy_import('yfinance')` não custa nada no import do blueprint;
+    `yf.Ticker(...)` importa o yfinance na primeira requisição que o usa.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_lazy_module'] = None
+        self.__dict__['_lazy_lock'] = threading.Lock()
+
+    def _load(self) -> ModuleType:
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with self.__dict__['_lazy_lock']:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__['_lazy_module'] = module
+                    _record('module', self.__name__, started)
+        return module
+
+    def __getattr__(self, name: str):
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'carregado' if self.__dict__['_lazy_module'] is not None else 'não carregado'
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+class LazyService:
+    """
+    Instância única de um serviço criada no primeiro uso
+
+    Delega atributos ao objeto criado por `factory`; construtores que abrem
+    bancos, criam diretórios ou importam bibliotecas pesadas saem do import
+    do blueprint e passam para a primeira requisição que os usa.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.__dict__['_name'] = name
+        self.__dict__['_factory'] = factory
+        self.__dict__['_instance'] = None
+        self.__dict__['_lock'] = threading.Lock()
+
+    @property
+    def initialized(self) -> bool:
+        return self.__dict__['_instance'] is not None
+
+    def _get(self):
+        instance = self.__dict__['_instance']
+        if instance is None:
+            with self.__dict__['_lock']:
+                instance = self.__dict__['_instance']
+                if instance is None:
+                    started = time.perf_counter()
+                    instance = self.__dict__['_factory']()
+                    self.__dict__['_instance'] = instance
+                    _record('service', self.__dict__['_name'], started)
+        return instance
+
+    def __getattr__(self, name: str):
+        return getattr(self._get(), name)
+
+    def __setattr__(self, name: str, value):
+        setattr(self._get(), name, value)
+
+    def __len__(self):
+        return len(self._get())
+
+    def __repr__(self):
+        state = repr(self.__dict__['_instance']) if self.initialized else 'não inicializado'
+        return f"<lazy service '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_service(name: str, factory: Callable[[], Any]) -> LazyService:
+    return LazyService(name, factory)
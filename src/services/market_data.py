@@ -0,0 +1,133 @@
+import threading
+from typing import Dict, Iterable, List
+
+import pandas as pd
+import yfinance as yf
+
+from services.telemetry import upstream
+
+
+def _normalize(symbols: Iterable[str]) -> List[str]:
+    return sorted({symbol.upper() for symbol in symbols if symbol})
+
+
+def yahoo_ticker(symbol: str, asset_type: str) -> str:
+    """
+    Ticker do ativo no Yahoo Finance
+
+    Criptomoedas são cotadas contra o dólar (BTC -> BTC-USD); o símbolo puro
+    é outro papel (BTC é um ETF) ou não existe.
+    """
+    symbol = symbol.upper()
+    if asset_type == 'crypto' and not symbol.endswith('-USD'):
+        return f'{symbol}-USD'
+    return symbol
+
+
+def download_closes(symbols: List[str], period: str) -> pd.DataFrame:
+    """
+    Baixa os fechamentos diários de vários ativos em uma única chamada
+
+    Retorna um DataFrame com uma coluna por símbolo (vazio se não houver dados).
+    """
+    if not symbols:
+        return pd.DataFrame()
+
+    with upstream('yfinance'):
+        data = yf.download(symbols, period=period, interval="1d", group_by="column",
+                           progress=False, threads=True, auto_adjust=True)
+    if data is None or data.empty:
+        return pd.DataFrame()
+
+    close = data['Close']
+    if isinstance(close, pd.Series):
+        close = close.to_frame(symbols[0])
+    return close.dropna(how='all', axis=1)
+
+
+def get_latest_quotes(symbols: Iterable[str]) -> Dict[str, Dict[str, float]]:
+    """
+    Último e penúltimo fechamento e volume de vários ativos em uma única chamada
+
+    Retorna {símbolo: {current_price, previous_price, change_percent, volume}}.
+    """
+    symbols = _normalize(symbols)
+    if not symbols:
+        return {}
+
+    with upstream('yfinance'):
+        data = yf.download(symbols, period="5d", interval="1d", group_by="column",
+                           progress=False, threads=True, auto_adjust=True)
+    if data is None or data.empty:
+        return {}
+
+    close, volume = data['Close'], data['Volume']
+    if isinstance(close, pd.Series):
+        close, volume = close.to_frame(symbols[0]), volume.to_frame(symbols[0])
+
+    quotes = {}
+    for symbol in close.columns:
+        prices = close[symbol].dropna()
+        if prices.empty:
+            continue
+        current_price = float(prices.iloc[-1])
+        previous_price = float(prices.iloc[-2]) if len(prices) > 1 else current_price
+        volumes = volume[symbol].dropna()
+        quotes[str(symbol)] = {
+            'current_price': current_price,
+            'previous_price': previous_price,
+            'change_percent': ((current_price - previous_price) / previous_price) * 100 if previous_price else 0.0,
+            'volume': int(volumes.iloc[-1]) if not volumes.empty else 0
+        }
+    return quotes
+
+
+def get_latest_prices(symbols: Iterable[str]) -> Dict[str, float]:
+    """
+    Obtém o último preço de fechamento de vários ativos em uma única chamada
+
+    Usa yf.download em lote (um download para todos os símbolos) em vez de
+    um yf.Ticker(...).history por símbolo. Símbolos sem cotação ficam de fora
+    do resultado.
+    """
+    close = download_closes(_normalize(symbols), "5d")
+    if close.empty:
+        return {}
+
+    latest = close.ffill().iloc[-1]
+    return {str(symbol): float(price) for symbol, price in latest.items() if pd.notna(price)}
+
+
+class PriceHistoryCache:
+    """
+    Histórico de fechamentos diários mantido em memória e atualizado aos poucos
+
+    Na primeira vez que um símbolo é pedido o último ano é baixado; depois
+    apenas as barras mais recentes (`refresh_period`) são baixadas e
+    sobrepostas ao histórico, que é recortado para a janela de um ano.
+    """
+
+    def __init__(self, period: str = "1y", refresh_period: str = "5d", window_days: int = 365):
+        self.period = period
+        self.refresh_period = refresh_period
+        self.window = pd.Timedelta(days=window_days)
+        self._closes = pd.DataFrame()
+        self._loaded = set()
+        self._lock = threading.Lock()
+
+    def get_closes(self, symbols: Iterable[str]) -> pd.DataFrame:
+        """Retorna o painel de fechamentos dos símbolos (colunas sem dados ficam com NaN)"""
+        symbols = _normalize(symbols)
+        with self._lock:
+            new = [symbol for symbol in symbols if symbol not in self._loaded]
+            known = [symbol for symbol in symbols if symbol in self._loaded]
+
+            for batch, period in ((new, self.period), (known, self.refresh_period)):
+                frame = download_closes(batch, period)
+                if not frame.empty:
+                    self._closes = frame.combine_first(self._closes)
+            self._loaded.update(new)
+
+            if not self._closes.empty:
+                self._closes = self._closes[self._closes.index >= self._closes.index.max() - self.window]
+            return self._closes.reindex(columns=symbols)
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Mapping
+
+from services.covariance import TRADING_DAYS
+
+METRIC_FIELDS = ('annual_return', 'volatility', 'sharpe_ratio', 'max_drawdown')
+
+# Nome da métrica nos alertas de performance -> campo calculado
+ALERT_METRICS = {
+    'return': 'annual_return',
+    'volatility': 'volatility',
+    'sharpe': 'sharpe_ratio',
+    'drawdown': 'max_drawdown',
+}
+
+
+def performance_metrics(returns: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Métricas de risco e retorno de cada coluna de uma matriz de retornos diários
+
+    Mesmo cálculo de /calculate-metrics (taxa livre de risco = 0), feito para
+    todas as colunas de uma vez:
+    - retorno anualizado (1 + média)^252 - 1
+    - volatilidade anualizada (desvio padrão amostral · √252)
+    - Sharpe = retorno / volatilidade (0 quando a volatilidade é nula)
+    - máximo drawdown do retorno acumulado
+    """
+    returns = np.asarray(returns, dtype=float)
+    if returns.ndim == 1:
+        returns = returns[:, None]
+
+    annual_return = (1 + returns.mean(axis=0)) ** TRADING_DAYS - 1
+    volatility = returns.std(axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe_ratio = np.where(volatility > 0, annual_return / volatility, 0.0)
+
+    cumulative = np.cumprod(1 + returns, axis=0)
+    rolling_max = np.maximum.accumulate(cumulative, axis=0)
+    max_drawdown = ((cumulative - rolling_max) / rolling_max).min(axis=0)
+
+    return {
+        'annual_return': annual_return,
+        'volatility': volatility,
+        'sharpe_ratio': sharpe_ratio,
+        'max_drawdown': max_drawdown,
+    }
+
+
+def portfolio_metrics(closes: pd.DataFrame,
+                      portfolios: Mapping[str, Mapping[str, float]]) -> Dict[str, Dict[str, float]]:
+    """
+    Calcula as métricas de vários portfólios sobre um painel de preços
+
+    `closes` tem uma coluna por símbolo e `portfolios` é {id: {símbolo: peso}}.
+    Como em /calculate-metrics, cada portfólio usa apenas as datas em que
+    todos os seus ativos têm preço, ativos sem histórico são ignorados e os
+    pesos são normalizados. Portfólios com o mesmo conjunto de datas válidas
+    são calculados juntos com uma única multiplicação de matrizes. Portfólios
+    sem dados ficam fora do resultado.
+    """
+    # Símbolos sem nenhum preço (desconhecidos, sem histórico) viram colunas
+    # só de NaN no painel; descartados aqui, os pesos são renormalizados
+    # entre os ativos restantes
+    closes = closes.dropna(axis=1, how='all')
+    symbols = list(closes.columns)
+    column = {symbol: i for i, symbol in enumerate(symbols)}
+
+    ids, rows, cols, values = [], [], [], []
+    for portfolio_id, weights in portfolios.items():
+        positions = [(column[symbol], weight) for symbol, weight in weights.items()
+                     if symbol in column and weight > 0]
+        # Ativos sem histórico são ignorados, como no endpoint original
+        if not positions:
+            continue
+        total = sum(weight for _, weight in positions)
+        for col, weight in positions:
+            rows.append(col)
+            cols.append(len(ids))
+            values.append(weight / total)
+        ids.append(portfolio_id)
+
+    if not ids:
+        return {}
+
+    weights = np.zeros((len(symbols), len(ids)))
+    weights[rows, cols] = values
+
+    prices = closes.to_numpy(dtype=float)
+    missing = np.isnan(prices).astype(float)
+    # valid[t, p]: todos os ativos do portfólio p têm preço na data t
+    valid = (missing @ (weights > 0)) == 0
+
+    results = {}
+    patterns, group_of = np.unique(np.packbits(valid, axis=0), axis=1, return_inverse=True)
+    for group in range(patterns.shape[1]):
+        members = np.flatnonzero(group_of.ravel() == group)
+        dates = valid[:, members[0]]
+        if dates.sum() < 3:
+            continue
+
+        group_weights = weights[:, members]
+        used = np.flatnonzero(group_weights.any(axis=1))
+        group_prices = prices[np.ix_(dates, used)]
+        asset_returns = group_prices[1:] / group_prices[:-1] - 1
+
+        metrics = performance_metrics(asset_returns @ group_weights[used])
+        for position, member in enumerate(members):
+            results[ids[member]] = {field: float(metrics[field][position]) for field in METRIC_FIELDS}
+
+    return results
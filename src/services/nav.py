@@ -0,0 +1,162 @@
+import hashlib
+from datetime import date, timedelta
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, func, insert, select
+
+from services.price_history import ensure_history
+from services.telemetry import cache_lookup, stage
+from src.models.portfolio import db, PortfolioNav, Position, PriceHistory
+
+# Períodos aceitos -> dias corridos
+NAV_PERIODS = {'1mo': 31, '3mo': 92, '6mo': 183, '1y': 366, '2y': 731, '5y': 1827}
+
+# Dias recalculados no fim do cache: o refresh de preços reescreve as
+# barras mais recentes (até 5 pregões)
+REFRESH_WINDOW_DAYS = 7
+
+# Janela de preços anteriores carregada para o forward fill do recálculo
+FILL_LOOKBACK_DAYS = 31
+
+
+def _positions_hash(positions: Dict[int, float]) -> str:
+    payload = ';'.join(f'{asset_id}:{quantity!r}' for asset_id, quantity in sorted(positions.items()))
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _as_dates(values) -> np.ndarray:
+    # O driver do SQLite devolve datas como texto; outros, como date
+    return np.array([str(value) for value in values], dtype='datetime64[D]')
+
+
+@stage('nav_compute')
+def compute_nav(portfolio_id: int, positions: Dict[int, float], start: date) -> Optional[pd.Series]:
+    """
+    NAV diário (Σ quantidade · fechamento) desde `start`
+
+    Uma única consulta junta as posições ao PriceHistory; a matriz de preços
+    alinhada (datas × ativos) é montada com NumPy, preços ausentes são
+    preenchidos com o último fechamento e o NAV começa na primeira data em
+    que todos os ativos têm preço. Retorna None se não houver dados.
+    """
+    holdings = select(Position.asset_id).where(Position.portfolio_id == portfolio_id).distinct().subquery()
+    query = (select(PriceHistory.date, PriceHistory.asset_id, PriceHistory.close_price)
+             .join(holdings, holdings.c.asset_id == PriceHistory.asset_id)
+             .where(PriceHistory.date >= start))
+    # Linhas lidas direto do cursor do driver: sem criar um Row por preço
+    rows = db.session.connection().execute(query).cursor.fetchall()
+    if not rows:
+        return None
+
+    asset_ids = np.array(sorted(positions), dtype=np.int64)
+    quantities = np.array([positions[asset_id] for asset_id in asset_ids], dtype=float)
+
+    days, day_index = np.unique(_as_dates(row[0] for row in rows), return_inverse=True)
+    columns = np.searchsorted(asset_ids, np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows)))
+    prices = np.full((len(days), len(asset_ids)), np.nan)
+    prices[day_index, columns] = np.fromiter((row[2] for row in rows), dtype=float, count=len(rows))
+
+    prices = pd.DataFrame(prices).ffill().to_numpy()
+    complete = ~np.isnan(prices).any(axis=1)
+    if not complete.any():
+        return None
+
+    return pd.Series(prices[complete] @ quantities, index=pd.DatetimeIndex(days[complete]))
+
+
+def _store(portfolio_id: int, positions_hash: str, nav: pd.Series, since: Optional[date] = None):
+    """Substitui o NAV materializado a partir de `since` (ou inteiro)"""
+    condition = [PortfolioNav.portfolio_id == portfolio_id]
+    if since is not None:
+        condition.append(PortfolioNav.date >= since)
+    db.session.execute(delete(PortfolioNav).where(*condition))
+    if len(nav):
+        db.session.execute(insert(PortfolioNav), [
+            {'portfolio_id': portfolio_id, 'date': timestamp.date(), 'nav': float(value),
+             'positions_hash': positions_hash}
+            for timestamp, value in nav.items()
+        ])
+    db.session.commit()
+
+
+def portfolio_nav(portfolio_id: int, period: str = '1y') -> Dict[str, Any]:
+    """
+    Série diária de NAV e retornos de um portfólio salvo
+
+    O NAV fica materializado em PortfolioNav. Enquanto as posições não
+    mudam, apenas os dias mais recentes são recalculados quando chegam novos
+    fechamentos; se as posições mudarem o NAV é recalculado inteiro.
+    """
+    start = date.today() - timedelta(days=NAV_PERIODS[period])
+
+    positions: Dict[int, float] = {}
+    for asset_id, quantity in db.session.execute(
+        select(Position.asset_id, func.sum(Position.quantity))
+        .where(Position.portfolio_id == portfolio_id).group_by(Position.asset_id)
+    ):
+        positions[asset_id] = float(quantity)
+
+    result = {'portfolio_id': portfolio_id, 'period': period, 'data': [], 'total_return': None, 'cache': None}
+    if not positions:
+        return result
+
+    positions_hash = _positions_hash(positions)
+    bounds = ensure_history(positions, start, period)
+    if len(bounds) < len(positions):
+        # Algum ativo sem nenhum preço: não há data com o portfólio completo
+        return result
+    # Primeira data possível do NAV e último fechamento disponível
+    first_possible = max(max(first for first, _ in bounds.values()), start)
+    last_available = max(last for _, last in bounds.values())
+
+    cached = db.session.execute(
+        select(PortfolioNav.date, PortfolioNav.nav)
+        .where(PortfolioNav.portfolio_id == portfolio_id, PortfolioNav.positions_hash == positions_hash)
+        .order_by(PortfolioNav.date)
+    ).all()
+    stale_hash = db.session.execute(
+        select(func.count()).select_from(PortfolioNav)
+        .where(PortfolioNav.portfolio_id == portfolio_id, PortfolioNav.positions_hash != positions_hash)
+    ).scalar()
+
+    if not cached or stale_hash or cached[0][0] > first_possible + timedelta(days=REFRESH_WINDOW_DAYS):
+        nav = compute_nav(portfolio_id, positions, start)
+        if nav is None:
+            return result
+        _store(portfolio_id, positions_hash, nav)
+        status = 'rebuilt'
+    elif cached[-1][0] < last_available:
+        # Só os dias mais recentes: recalcula a partir de uma semana antes do fim do cache
+        since = cached[-1][0] - timedelta(days=REFRESH_WINDOW_DAYS)
+        fresh = compute_nav(portfolio_id, positions, since - timedelta(days=FILL_LOOKBACK_DAYS))
+        if fresh is None:
+            return result
+        fresh = fresh[fresh.index >= pd.Timestamp(since)]
+        _store(portfolio_id, positions_hash, fresh, since)
+        history = pd.Series([value for _, value in cached],
+                            index=pd.DatetimeIndex([pd.Timestamp(day) for day, _ in cached]))
+        nav = pd.concat([history[history.index < pd.Timestamp(since)], fresh])
+        status = 'refreshed'
+    else:
+        nav = pd.Series([value for _, value in cached],
+                        index=pd.DatetimeIndex([pd.Timestamp(day) for day, _ in cached]))
+        status = 'hit'
+
+    nav = nav[nav.index >= pd.Timestamp(start)]
+    if nav.empty:
+        return result
+
+    values = nav.to_numpy()
+    returns = np.r_[np.nan, values[1:] / values[:-1] - 1]
+    result['data'] = [
+        {'date': timestamp.date().isoformat(), 'nav': float(value),
+         'returns': None if np.isnan(daily) else float(daily)}
+        for timestamp, value, daily in zip(nav.index, values, returns)
+    ]
+    result['total_return'] = float(values[-1] / values[0] - 1) if values[0] else None
+    result['cache'] = status
+    # Refresh reaproveita o NAV materializado e só recalcula a última semana
+    cache_lookup('nav', hits=int(status != 'rebuilt'), misses=int(status == 'rebuilt'))
+    return result
@@ -1,95 +1,334 @@
 import numpy as np
 import pandas as pd
 from scipy.optimize import minimize
-from typing import Dict, List, Tuple, Any
+from scipy.cluster.hierarchy import linkage, leaves_list
+from scipy.spatial.distance import squareform
+from typing import Dict, List, Tuple, Any, Callable, Optional
 import yfinance as yf
 from datetime import datetime, timedelta
+from services.covariance import estimate_covariance, LowRankCovariance
+from services.qp import PortfolioConstraints, PortfolioQP
+from services.telemetry import optimizer_iterations, stage, upstream
+
+OPTIMIZATION_FIELDS = ('efficient_frontier', 'max_sharpe_portfolio', 'min_variance_portfolio')
 
 class PortfolioOptimizer:
     def __init__(self):
         self.risk_free_rate = 0.02  # 2% taxa livre de risco
     
-    def get_efficient_frontier(self, symbols: List[str], period: str = "1y") -> Dict[str, Any]:
+    def get_efficient_frontier(self, symbols: List[str], period: str = "1y",
+                               progress_callback: Optional[Callable[..., None]] = None,
+                               covariance: str = "sample",
+                               n_factors: Optional[int] = None,
+                               constraints: Optional[Dict[str, Any]] = None,
+                               asset_groups: Optional[Dict[str, str]] = None,
+                               solver: str = "auto",
+                               fields: Optional[List[str]] = None,
+                               frontier_points: int = 50) -> Dict[str, Any]:
         """
         Calcula a fronteira eficiente para um conjunto de ativos
+
+        `progress_callback(fraction, message)` é chamado ao longo do cálculo
+        (usado pelos jobs assíncronos para reportar progresso e cancelar).
+        `covariance` escolhe o estimador ('sample', 'ledoit_wolf' ou 'pca');
+        os dois últimos são low-rank + diagonal e indicados para universos grandes.
+        `constraints` define limites por ativo, por grupo (`asset_groups` mapeia
+        símbolo -> grupo) e de giro; com restrições ou covariância low-rank o
+        solver 'auto' usa o QP esparso (OSQP) em vez do SLSQP.
+        `fields` limita quais saídas de OPTIMIZATION_FIELDS são calculadas (todas
+        por padrão) e `frontier_points` define a resolução da fronteira.
         """
+        fields = set(fields or OPTIMIZATION_FIELDS)
+        report = progress_callback or (lambda fraction, message=None: None)
+
         try:
-            # Baixar dados históricos
-            data = {}
-            for symbol in symbols:
-                ticker = yf.Ticker(symbol)
-                hist = ticker.history(period=period)
-                if not hist.empty:
-                    data[symbol] = hist['Close'].pct_change().dropna()
+            returns_df, error = self._load_returns(symbols, period, report)
+            if error:
+                return {"error": error}
             
-            if not data:
-                return {"error": "Não foi possível obter dados para os ativos"}
+            # Calcular estatísticas
+            with stage('covariance'):
+                mean_returns = returns_df.mean() * 252  # Anualizar
+                cov_model = estimate_covariance(returns_df, covariance, n_factors)  # Anualizada
             
-            # Criar DataFrame com retornos
-            returns_df = pd.DataFrame(data)
-            returns_df = returns_df.dropna()
+            use_qp = solver == 'qp' or (solver == 'auto' and (
+                bool(constraints) or isinstance(cov_model, LowRankCovariance)))
             
-            if returns_df.empty:
-                return {"error": "Dados insuficientes para otimização"}
+            if use_qp:
+                portfolio_constraints = PortfolioConstraints.from_spec(
+                    constraints, list(returns_df.columns), asset_groups)
+                qp = PortfolioQP(mean_returns, cov_model, portfolio_constraints)
             
-            # Calcular estatísticas
-            mean_returns = returns_df.mean() * 252  # Anualizar
-            cov_matrix = returns_df.cov() * 252  # Anualizar
+            result = {}
             
             # Gerar fronteira eficiente
-            num_portfolios = 50
-            target_returns = np.linspace(mean_returns.min(), mean_returns.max(), num_portfolios)
-            
-            efficient_portfolios = []
-            for target_return in target_returns:
-                try:
-                    weights = self._optimize_portfolio(mean_returns, cov_matrix, target_return)
-                    if weights is not None:
-                        portfolio_return = np.sum(weights * mean_returns)
-                        portfolio_risk = np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights)))
-                        sharpe_ratio = (portfolio_return - self.risk_free_rate) / portfolio_risk
-                        
-                        efficient_portfolios.append({
-                            'return': portfolio_return,
-                            'risk': portfolio_risk,
-                            'sharpe': sharpe_ratio,
-                            'weights': weights.tolist()
-                        })
-                except:
-                    continue
+            if 'efficient_frontier' in fields:
+                if use_qp:
+                    min_return, max_return = qp.return_range()
+                    solve_target = qp.target_return
+                else:
+                    min_return, max_return = mean_returns.min(), mean_returns.max()
+                    solve_target = lambda target: self._optimize_portfolio(mean_returns, cov_model, target)
+                
+                target_returns = np.linspace(min_return, max_return, frontier_points)
+                
+                with stage('frontier'):
+                    efficient_portfolios = []
+                    for i, target_return in enumerate(target_returns):
+                        report(0.3 + 0.6 * i / frontier_points, "Calculando fronteira eficiente")
+                        try:
+                            weights = solve_target(target_return)
+                            if weights is not None:
+                                portfolio_return = np.sum(weights * mean_returns)
+                                portfolio_risk = np.sqrt(cov_model.variance(weights))
+                                sharpe_ratio = (portfolio_return - self.risk_free_rate) / portfolio_risk
+                            
+                                efficient_portfolios.append({
+                                    'return': portfolio_return,
+                                    'risk': portfolio_risk,
+                                    'sharpe': sharpe_ratio,
+                                    'weights': weights.tolist()
+                                })
+                        except:
+                            continue
+                
+                result["efficient_frontier"] = efficient_portfolios
             
             # Encontrar portfólio de máximo Sharpe
-            max_sharpe_portfolio = self._get_max_sharpe_portfolio(mean_returns, cov_matrix)
+            report(0.9, "Calculando portfólios ótimos")
+            if 'max_sharpe_portfolio' in fields:
+                with stage('max_sharpe'):
+                    if use_qp:
+                        weights = qp.max_sharpe(self.risk_free_rate)
+                        result["max_sharpe_portfolio"] = (self._describe_portfolio(weights, mean_returns, cov_model)
+                                                          if weights is not None else None)
+                    else:
+                        result["max_sharpe_portfolio"] = self._get_max_sharpe_portfolio(mean_returns, cov_model)
             
             # Encontrar portfólio de mínima variância
-            min_variance_portfolio = self._get_min_variance_portfolio(cov_matrix)
+            if 'min_variance_portfolio' in fields:
+                with stage('min_variance'):
+                    if use_qp:
+                        weights = qp.min_variance()
+                        result["min_variance_portfolio"] = ({'weights': weights.tolist(),
+                                                             'risk': float(np.sqrt(cov_model.variance(weights)))}
+                                                            if weights is not None else None)
+                    else:
+                        result["min_variance_portfolio"] = self._get_min_variance_portfolio(cov_model)
+            
+            result.update({
+                "symbols": list(returns_df.columns),
+                "mean_returns": mean_returns.to_dict(),
+                "risk_free_rate": self.risk_free_rate,
+                "covariance_method": cov_model.method,
+                "solver": "qp" if use_qp else "slsqp"
+            })
+            
+            return result
+            
+        except Exception as e:
+            return {"error": f"Erro na otimização: {str(e)}"}
+    
+    def get_risk_parity_portfolio(self, symbols: List[str], period: str = "1y", method: str = "hrp",
+                                  progress_callback: Optional[Callable[..., None]] = None,
+                                  covariance: str = "sample",
+                                  n_factors: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Calcula uma alocação por paridade de risco, sem inverter a covariância
+
+        - 'hrp': Hierarchical Risk Parity (clusterização da matriz de correlação)
+        - 'erc': contribuições de risco iguais (equal risk contribution)
+        """
+        report = progress_callback or (lambda fraction, message=None: None)
+        
+        try:
+            returns_df, error = self._load_returns(symbols, period, report, fraction=0.8)
+            if error:
+                return {"error": error}
+            
+            with stage('covariance'):
+                mean_returns = returns_df.mean() * 252  # Anualizar
+                cov_model = estimate_covariance(returns_df, covariance, n_factors)
+            
+            report(0.8, "Calculando alocação")
+            with stage('risk_parity'):
+                if method == 'hrp':
+                    # Mesma matriz de correlação exibida em /calculate-metrics
+                    correlation = returns_df.corr().values
+                    weights = self._get_hrp_weights(cov_model, correlation)
+                elif method == 'erc':
+                    weights = self._get_erc_weights(cov_model)
+                else:
+                    return {"error": f"Método de paridade de risco inválido: {method}"}
+            
+            portfolio = self._describe_portfolio(weights, mean_returns, cov_model)
+            portfolio['risk_contributions'] = (
+                weights * cov_model.matvec(weights) / cov_model.variance(weights)
+            ).tolist()
             
             return {
-                "efficient_frontier": efficient_portfolios,
-                "max_sharpe_portfolio": max_sharpe_portfolio,
-                "min_variance_portfolio": min_variance_portfolio,
-                "symbols": symbols,
+                "method": method,
+                "portfolio": portfolio,
+                "symbols": list(returns_df.columns),
                 "mean_returns": mean_returns.to_dict(),
-                "risk_free_rate": self.risk_free_rate
+                "risk_free_rate": self.risk_free_rate,
+                "covariance_method": cov_model.method
             }
             
         except Exception as e:
-            return {"error": f"Erro na otimização: {str(e)}"}
+            return {"error": f"Erro na paridade de risco: {str(e)}"}
+    
+    def _load_returns(self, symbols, period, report, fraction=0.3):
+        """
+        Baixa o histórico dos ativos e retorna (DataFrame de retornos diários, erro)
+        """
+        data = {}
+        for i, symbol in enumerate(symbols):
+            ticker = yf.Ticker(symbol)
+            with upstream('yfinance'):
+                hist = ticker.history(period=period)
+            if not hist.empty:
+                data[symbol] = hist['Close'].pct_change().dropna()
+            report(fraction * (i + 1) / len(symbols), "Baixando dados históricos")
+        
+        if not data:
+            return None, "Não foi possível obter dados para os ativos"
+        
+        # Criar DataFrame com retornos
+        returns_df = pd.DataFrame(data)
+        returns_df = returns_df.dropna()
+        
+        if returns_df.empty:
+            return None, "Dados insuficientes para otimização"
+        
+        return returns_df, None
+    
+    def _describe_portfolio(self, weights, mean_returns, cov_model):
+        """Retorno, risco e Sharpe de um vetor de pesos"""
+        portfolio_return = float(weights @ np.asarray(mean_returns, dtype=float))
+        portfolio_risk = float(np.sqrt(cov_model.variance(weights)))
+        return {
+            'weights': weights.tolist(),
+            'return': portfolio_return,
+            'risk': portfolio_risk,
+            'sharpe': (portfolio_return - self.risk_free_rate) / portfolio_risk
+        }
+    
+    @staticmethod
+    def _get_hrp_weights(cov_model, correlation):
+        """
+        Hierarchical Risk Parity (López de Prado, 2016)
+        
+        1. Clusteriza os ativos pela distância de correlação √((1-ρ)/2)
+        2. Reordena a covariância pela ordem das folhas do dendrograma
+        3. Bissecção recursiva, dividindo o risco entre as metades pela
+           variância do portfólio de variância inversa de cada uma
+        """
+        num_assets = len(cov_model)
+        if num_assets == 1:
+            return np.ones(1)
+        
+        distance = np.sqrt(np.clip((1 - correlation) / 2, 0, 1))
+        link = linkage(squareform(distance, checks=False), method='single')
+        order = leaves_list(link)
+        
+        inverse_variance = 1 / cov_model.diagonal()
+        weights = np.ones(num_assets)
+        
+        def cluster_variance(indices):
+            ivp = inverse_variance[indices] / inverse_variance[indices].sum()
+            return cov_model.subset_variance(indices, ivp)
+        
+        # Bissecção nível a nível do dendrograma reordenado
+        clusters = [order]
+        while clusters:
+            next_clusters = []
+            for cluster in clusters:
+                if len(cluster) < 2:
+                    continue
+                half = len(cluster) // 2
+                left, right = cluster[:half], cluster[half:]
+                left_variance, right_variance = cluster_variance(left), cluster_variance(right)
+                alpha = 1 - left_variance / (left_variance + right_variance)
+                weights[left] *= alpha
+                weights[right] *= 1 - alpha
+                next_clusters.extend((left, right))
+            clusters = next_clusters
+        
+        return weights / weights.sum()
+    
+    @staticmethod
+    def _get_erc_weights(cov_model, tol: float = 1e-10, max_iter: int = 100):
+        """
+        Equal Risk Contribution pelo método de Newton (Spinu, 2013)
+        
+        Minimiza ½yᵀΣy - b·Σlog(y), cujo ótimo tem yᵢ(Σy)ᵢ = b para todo i;
+        normalizando, w = y / Σy tem contribuições de risco iguais. O sistema
+        de Newton (Σ + diag(b/y²)) usa Woodbury no modo low-rank.
+        """
+        num_assets = len(cov_model)
+        budget = 1.0 / num_assets
+        
+        def objective(y):
+            return 0.5 * cov_model.variance(y) - budget * np.sum(np.log(y))
+        
+        # Ponto inicial: variância inversa escalada para yᵀΣy = 1
+        y = 1 / np.sqrt(cov_model.diagonal())
+        y /= np.sqrt(cov_model.variance(y))
+        
+        for iteration in range(max_iter):
+            gradient = cov_model.matvec(y) - budget / y
+            if np.max(np.abs(gradient * y)) < tol:
+                break
+            step = cov_model.solve_shifted(budget / y ** 2, gradient)
+            
+            # Backtracking mantendo y > 0
+            t = 1.0
+            negative = step > 0
+            if np.any(negative):
+                t = min(1.0, 0.99 * np.min(y[negative] / step[negative]))
+            current = objective(y)
+            while t > 1e-12 and objective(y - t * step) > current - 1e-4 * t * (gradient @ step):
+                t *= 0.5
+            y = y - t * step
+        
+        optimizer_iterations('erc_newton', iteration + 1)
+        return y / y.sum()
     
-    def _optimize_portfolio(self, mean_returns, cov_matrix, target_return):
+    @staticmethod
+    def _risk_objective(cov_model):
+        """
+        Retorna (risco, gradiente) do portfólio: σ = √(wᵀΣw) e ∇σ = Σw/σ.
+
+        O gradiente analítico evita as k avaliações extras por iteração que o
+        SLSQP faria por diferenças finitas.
+        """
+        def objective(weights):
+            sigma_w = cov_model.matvec(weights)
+            risk = np.sqrt(max(weights @ sigma_w, 1e-16))
+            return risk, sigma_w / risk
+        return objective
+    
+    @staticmethod
+    def _budget_constraint(num_assets):
+        """Restrição soma dos pesos = 1 com jacobiano analítico"""
+        ones = np.ones(num_assets)
+        return {'type': 'eq', 'fun': lambda x: np.sum(x) - 1, 'jac': lambda x: ones}
+    
+    def _optimize_portfolio(self, mean_returns, cov_model, target_return):
         """
         Otimiza portfólio para um retorno alvo específico
         """
         num_assets = len(mean_returns)
+        mu = np.asarray(mean_returns, dtype=float)
         
-        # Função objetivo: minimizar variância
-        def objective(weights):
-            return np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights)))
+        # Função objetivo: minimizar risco
+        objective = self._risk_objective(cov_model)
         
         # Restrições
         constraints = [
-            {'type': 'eq', 'fun': lambda x: np.sum(x) - 1},  # Soma dos pesos = 1
-            {'type': 'eq', 'fun': lambda x: np.sum(x * mean_returns) - target_return}  # Retorno alvo
+            self._budget_constraint(num_assets),  # Soma dos pesos = 1
+            {'type': 'eq', 'fun': lambda x: x @ mu - target_return, 'jac': lambda x: mu}  # Retorno alvo
         ]
         
         # Limites (0 <= peso <= 1)
@@ -99,8 +338,9 @@ class PortfolioOptimizer:
         initial_weights = np.array([1/num_assets] * num_assets)
         
         try:
-            result = minimize(objective, initial_weights, method='SLSQP', 
+            result = minimize(objective, initial_weights, method='SLSQP', jac=True,
                             bounds=bounds, constraints=constraints)
+            optimizer_iterations('slsqp', result.nit)
             
             if result.success:
                 return result.x
@@ -109,29 +349,34 @@ class PortfolioOptimizer:
         except:
             return None
     
-    def _get_max_sharpe_portfolio(self, mean_returns, cov_matrix):
+    def _get_max_sharpe_portfolio(self, mean_returns, cov_model):
         """
         Encontra o portfólio com máximo índice Sharpe
         """
         num_assets = len(mean_returns)
+        mu = np.asarray(mean_returns, dtype=float)
         
         def objective(weights):
-            portfolio_return = np.sum(weights * mean_returns)
-            portfolio_risk = np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights)))
-            return -(portfolio_return - self.risk_free_rate) / portfolio_risk  # Negativo para maximizar
+            sigma_w = cov_model.matvec(weights)
+            portfolio_risk = np.sqrt(max(weights @ sigma_w, 1e-16))
+            excess_return = weights @ mu - self.risk_free_rate
+            # Negativo para maximizar; gradiente de -(r - rf)/σ
+            gradient = -(mu / portfolio_risk - excess_return * sigma_w / portfolio_risk ** 3)
+            return -excess_return / portfolio_risk, gradient
         
-        constraints = [{'type': 'eq', 'fun': lambda x: np.sum(x) - 1}]
+        constraints = [self._budget_constraint(num_assets)]
         bounds = tuple((0, 1) for _ in range(num_assets))
         initial_weights = np.array([1/num_assets] * num_assets)
         
         try:
-            result = minimize(objective, initial_weights, method='SLSQP', 
+            result = minimize(objective, initial_weights, method='SLSQP', jac=True,
                             bounds=bounds, constraints=constraints)
+            optimizer_iterations('slsqp', result.nit)
             
             if result.success:
                 weights = result.x
                 portfolio_return = np.sum(weights * mean_returns)
-                portfolio_risk = np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights)))
+                portfolio_risk = np.sqrt(cov_model.variance(weights))
                 sharpe_ratio = (portfolio_return - self.risk_free_rate) / portfolio_risk
                 
                 return {
@@ -145,26 +390,26 @@ class PortfolioOptimizer:
         
         return None
     
-    def _get_min_variance_portfolio(self, cov_matrix):
+    def _get_min_variance_portfolio(self, cov_model):
         """
         Encontra o portfólio de mínima variância
         """
-        num_assets = len(cov_matrix)
+        num_assets = len(cov_model)
         
-        def objective(weights):
-            return np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights)))
+        objective = self._risk_objective(cov_model)
         
-        constraints = [{'type': 'eq', 'fun': lambda x: np.sum(x) - 1}]
+        constraints = [self._budget_constraint(num_assets)]
         bounds = tuple((0, 1) for _ in range(num_assets))
         initial_weights = np.array([1/num_assets] * num_assets)
         
         try:
-            result = minimize(objective, initial_weights, method='SLSQP', 
+            result = minimize(objective, initial_weights, method='SLSQP', jac=True,
                             bounds=bounds, constraints=constraints)
+            optimizer_iterations('slsqp', result.nit)
             
             if result.success:
                 weights = result.x
-                portfolio_risk = np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights)))
+                portfolio_risk = np.sqrt(cov_model.variance(weights))
                 
                 return {
                     'weights': weights.tolist(),
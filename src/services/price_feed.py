@@ -0,0 +1,157 @@
+import os
+import queue
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from services.market_data import get_latest_prices
+from services.telemetry import cache_lookup
+
+
+class Subscription:
+    """Fila de eventos de um cliente inscrito em um conjunto de símbolos"""
+
+    def __init__(self, symbols: Set[str], max_events: int = 1000):
+        self.symbols = symbols
+        self.events: 'queue.Queue[Tuple[str, Dict[str, Any]]]' = queue.Queue(maxsize=max_events)
+
+    def publish(self, event: str, data: Dict[str, Any]):
+        # Um cliente lento perde os eventos mais antigos em vez de bloquear o feed
+        while True:
+            try:
+                self.events.put_nowait((event, data))
+                return
+            except queue.Full:
+                try:
+                    self.events.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout: float) -> Optional[Tuple[str, Dict[str, Any]]]:
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class PriceFeed:
+    """
+    Poller de preços compartilhado que distribui eventos aos inscritos
+
+    Uma única thread por processo busca, a cada intervalo, os preços da união
+    dos símbolos de todos os inscritos em uma chamada em lote, e publica as
+    variações e os alertas acionados apenas para quem acompanha o símbolo.
+    Os preços ficam na tabela symbol_prices do banco de alertas, de modo que,
+    entre workers, um símbolo é buscado no máximo uma vez por intervalo.
+
+    Configuração: PRICE_FEED_INTERVAL (segundos, padrão 15).
+    """
+
+    def __init__(self, alert_store, interval: Optional[float] = None):
+        self.store = alert_store
+        self.interval = interval or float(os.environ.get('PRICE_FEED_INTERVAL', 15))
+
+        self._subscriptions: Set[Subscription] = set()
+        self._prices: Dict[str, float] = {}
+        self._alerts_since = datetime.now().isoformat()
+        self._seen_alerts: Set[str] = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid = None
+
+    def subscribe(self, symbols: Iterable[str]) -> Subscription:
+        """Inscreve um cliente e já publica o último preço conhecido de cada símbolo"""
+        subscription = Subscription({symbol.upper() for symbol in symbols if symbol})
+        with self._lock:
+            self._subscriptions.add(subscription)
+            for symbol in sorted(subscription.symbols):
+                if symbol in self._prices:
+                    subscription.publish('price', self._price_event(symbol, self._prices[symbol], None))
+            self._ensure_thread()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscriptions)
+
+    def _ensure_thread(self):
+        """Inicia o poller sob demanda (chamar com _lock)"""
+        if self._thread is None or not self._thread.is_alive() or self._thread_pid != os.getpid():
+            self._thread = threading.Thread(target=self._loop, name='price-feed', daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            with self._lock:
+                if not self._subscriptions:
+                    # Sem inscritos o poller termina; o próximo subscribe o reinicia
+                    self._thread = None
+                    return
+                symbols = sorted(set().union(*(s.symbols for s in self._subscriptions)))
+
+            try:
+                self.poll(symbols)
+            except Exception:
+                traceback.print_exc()
+
+            time.sleep(self.interval)
+
+    def poll(self, symbols):
+        """Atualiza os preços dos símbolos e publica as mudanças e os alertas acionados"""
+        # Preços buscados recentemente por outro worker são reaproveitados
+        prices = self.store.get_symbol_prices(symbols, self.interval)
+        stale = [symbol for symbol in symbols if symbol not in prices]
+        cache_lookup('symbol_prices', hits=len(prices), misses=len(stale))
+        if stale:
+            fetched = get_latest_prices(stale)
+            self.store.save_symbol_prices(fetched)
+            prices.update(fetched)
+
+        alerts = self._new_triggered_alerts()
+
+        with self._lock:
+            changes = {}
+            for symbol, price in prices.items():
+                previous = self._prices.get(symbol)
+                if previous != price:
+                    changes[symbol] = self._price_event(symbol, price, previous)
+                    self._prices[symbol] = price
+
+            for subscription in self._subscriptions:
+                for symbol in subscription.symbols:
+                    if symbol in changes:
+                        subscription.publish('price', changes[symbol])
+                for alert in alerts:
+                    if alert['symbol'] in subscription.symbols:
+                        subscription.publish('alert', alert)
+
+    def _new_triggered_alerts(self):
+        """Alertas de preço acionados desde a última consulta"""
+        alerts = [alert for alert in self.store.get_triggered_price_alerts(self._alerts_since)
+                  if alert['id'] not in self._seen_alerts]
+        if alerts:
+            since = max(alert['triggered_at'] for alert in alerts)
+            # Alertas com o mesmo instante do limite seriam retornados de novo
+            boundary = {alert['id'] for alert in alerts if alert['triggered_at'] == since}
+            if since == self._alerts_since:
+                boundary |= self._seen_alerts
+            self._alerts_since, self._seen_alerts = since, boundary
+        return alerts
+
+    @staticmethod
+    def _price_event(symbol: str, price: float, previous: Optional[float]) -> Dict[str, Any]:
+        change = ((price - previous) / previous) * 100 if previous else 0.0
+        return {
+            'symbol': symbol,
+            'price': price,
+            'previous_price': previous,
+            'change_percent': change,
+            'timestamp': datetime.now().isoformat()
+        }
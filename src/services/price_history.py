@@ -0,0 +1,179 @@
+import os
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import and_, func, insert, select, update
+
+from services.market_data import download_closes, yahoo_ticker
+from services.telemetry import cache_lookup
+from src.models.portfolio import db, Asset, PriceHistory
+
+# Lotes de parâmetros dos IN (...) para não esbarrar no limite de variáveis
+CHUNK_SIZE = 5000
+
+# Ativos cujo histórico já foi baixado neste processo, por período; evita
+# baixar de novo ativos que simplesmente não têm histórico mais antigo
+_backfilled: Dict[str, set] = {}
+
+
+def _chunks(values: List, size: int = CHUNK_SIZE):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def max_age_days() -> int:
+    """Idade máxima (dias corridos) do último fechamento para considerá-lo atual"""
+    return int(os.environ.get('PRICE_HISTORY_MAX_AGE_DAYS', 4))
+
+
+def latest_closes(asset_ids: Iterable[int], since: Optional[date] = None) -> Dict[int, float]:
+    """
+    Último fechamento gravado de cada ativo em PriceHistory
+
+    Com `since`, apenas fechamentos a partir dessa data são considerados.
+    Usa o índice único (asset_id, date): uma consulta por lote de ativos.
+    """
+    asset_ids = sorted(set(asset_ids))
+    prices = {}
+    for chunk in _chunks(asset_ids):
+        conditions = [PriceHistory.asset_id.in_(chunk)]
+        if since is not None:
+            conditions.append(PriceHistory.date >= since)
+        latest = (select(PriceHistory.asset_id, func.max(PriceHistory.date).label('date'))
+                  .where(*conditions).group_by(PriceHistory.asset_id).subquery())
+        rows = db.session.execute(
+            select(PriceHistory.asset_id, PriceHistory.close_price)
+            .join(latest, and_(PriceHistory.asset_id == latest.c.asset_id, PriceHistory.date == latest.c.date))
+        )
+        prices.update((asset_id, close) for asset_id, close in rows)
+    return prices
+
+
+def save_closes(closes: pd.DataFrame, asset_ids: Dict[str, int]):
+    """
+    Grava (insere ou atualiza) fechamentos diários em PriceHistory
+
+    `closes` tem uma coluna por símbolo e `asset_ids` é {símbolo: [asset_id]};
+    ativos diferentes com o mesmo ticker recebem a mesma série.
+    """
+    if closes.empty:
+        return
+    frame = closes[[symbol for symbol in closes.columns if symbol in asset_ids]]
+    records = {
+        (asset_id, timestamp.date()): float(price)
+        for symbol, series in frame.items()
+        for timestamp, price in series.dropna().items()
+        for asset_id in asset_ids[symbol]
+    }
+    if not records:
+        return
+
+    first, last = min(day for _, day in records), max(day for _, day in records)
+    existing = {}
+    for chunk in _chunks(sorted({asset_id for asset_id, _ in records})):
+        existing.update(((asset_id, day), row_id) for row_id, asset_id, day in db.session.execute(
+            select(PriceHistory.id, PriceHistory.asset_id, PriceHistory.date)
+            .where(PriceHistory.asset_id.in_(chunk), PriceHistory.date.between(first, last))
+        ))
+
+    updates = [{'id': existing[key], 'close_price': price, 'adjusted_close': price}
+               for key, price in records.items() if key in existing]
+    inserts = [{'asset_id': asset_id, 'date': day, 'close_price': price, 'adjusted_close': price}
+               for (asset_id, day), price in records.items() if (asset_id, day) not in existing]
+    if updates:
+        db.session.execute(update(PriceHistory), updates)
+    if inserts:
+        db.session.execute(insert(PriceHistory), inserts)
+    db.session.commit()
+
+
+def _symbols(asset_ids: List[int]) -> Dict[str, List[int]]:
+    """
+    {ticker no Yahoo Finance: [asset_id]} dos ativos (criptomoedas como <SÍMBOLO>-USD)
+
+    Asset.symbol não é único (o catálogo grava SPY como `fund` ao lado de
+    um SPY `stock` criado pelo usuário), então um ticker pode ter vários ativos.
+    """
+    symbols: Dict[str, List[int]] = {}
+    for chunk in _chunks(asset_ids):
+        rows = db.session.execute(
+            select(Asset.id, Asset.symbol, Asset.asset_type).where(Asset.id.in_(chunk))
+        )
+        for asset_id, symbol, asset_type in rows:
+            symbols.setdefault(yahoo_ticker(symbol, asset_type), []).append(asset_id)
+    return symbols
+
+
+def history_bounds(asset_ids: Iterable[int]) -> Dict[int, Tuple[date, date]]:
+    """Primeira e última data gravadas em PriceHistory de cada ativo"""
+    bounds = {}
+    for chunk in _chunks(sorted(set(asset_ids))):
+        rows = db.session.execute(
+            select(PriceHistory.asset_id, func.min(PriceHistory.date), func.max(PriceHistory.date))
+            .where(PriceHistory.asset_id.in_(chunk)).group_by(PriceHistory.asset_id)
+        )
+        bounds.update((asset_id, (first, last)) for asset_id, first, last in rows)
+    return bounds
+
+
+def ensure_history(asset_ids: Iterable[int], start: date, period: str) -> Dict[int, Tuple[date, date]]:
+    """
+    Garante em PriceHistory o histórico dos ativos desde `start`
+
+    Ativos sem histórico até `start` (com folga de uma semana para fins de
+    semana e feriados) são baixados com `period` em uma única chamada em lote;
+    ativos com o último fechamento desatualizado recebem apenas as barras
+    recentes. Retorna history_bounds dos ativos.
+    """
+    asset_ids = sorted(set(asset_ids))
+    bounds = history_bounds(asset_ids)
+    done = _backfilled.setdefault(period, set())
+    backfill = [asset_id for asset_id in asset_ids if asset_id not in done
+                and (asset_id not in bounds or bounds[asset_id][0] > start + timedelta(days=7))]
+    cutoff = date.today() - timedelta(days=max_age_days())
+    stale = [asset_id for asset_id in asset_ids
+             if asset_id not in backfill and asset_id in bounds and bounds[asset_id][1] < cutoff]
+    cache_lookup('price_history', hits=len(asset_ids) - len(backfill) - len(stale),
+                 misses=len(backfill) + len(stale))
+
+    if backfill:
+        symbols = _symbols(backfill)
+        save_closes(download_closes(sorted(symbols), period), symbols)
+        done.update(backfill)
+    if stale:
+        refresh_latest_closes(stale)
+    if backfill or stale:
+        bounds = history_bounds(asset_ids)
+    return bounds
+
+
+def refresh_latest_closes(asset_ids: Iterable[int], period: str = "5d") -> Dict[int, float]:
+    """
+    Último fechamento de cada ativo, buscando na rede apenas os desatualizados
+
+    Ativos cujo último fechamento em PriceHistory é mais antigo que
+    PRICE_HISTORY_MAX_AGE_DAYS são baixados em uma única chamada em lote
+    e gravados no histórico. Ativos sem cotação ficam de fora do resultado.
+    """
+    asset_ids = sorted(set(asset_ids))
+    prices = latest_closes(asset_ids, since=date.today() - timedelta(days=max_age_days()))
+    stale = [asset_id for asset_id in asset_ids if asset_id not in prices]
+    cache_lookup('price_history', hits=len(prices), misses=len(stale))
+    if not stale:
+        return prices
+
+    symbols = _symbols(stale)
+    closes = download_closes(sorted(symbols), period)
+    save_closes(closes, symbols)
+
+    if not closes.empty:
+        latest = closes.ffill().iloc[-1]
+        prices.update((asset_id, float(price)) for symbol, price in latest.items()
+                      if symbol in symbols and pd.notna(price) for asset_id in symbols[symbol])
+
+    # Sem cotação nova, o último fechamento conhecido ainda é melhor que nada
+    missing = [asset_id for asset_id in stale if asset_id not in prices]
+    if missing:
+        prices.update(latest_closes(missing))
+    return prices
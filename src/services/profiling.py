@@ -0,0 +1,172 @@
+import cProfile
+import hmac
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from flask import Flask, g, request
+
+# Identificadores gerados por _save (usados como nome de arquivo)
+PROFILE_ID = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{8}$')
+
+# Valores de ?profile= que pedem o perfil da requisição
+PROFILE_FLAGS = ('1', 'true', 'on')
+
+
+class RequestProfiler:
+    """
+    Perfil (cProfile) de requisições individuais sob demanda
+
+    Ativado apenas quando PROFILE_TOKEN está definido: a requisição com
+    `?profile=1` que envia o token no header `X-Profile-Token` roda inteira
+    sob o cProfile, e o perfil fica gravado em `data/profiles`
+    (.prof para o pstats/snakeviz e um resumo com as funções de maior
+    tempo cumulativo). Sem o token configurado nenhum hook é registrado.
+    """
+
+    def __init__(self, data_dir: str = "data"):
+        self.token = os.environ.get('PROFILE_TOKEN') or None
+        self.directory = os.path.join(data_dir, 'profiles')
+        self.top_functions = int(os.environ.get('PROFILE_TOP_FUNCTIONS', 30))
+        self.max_profiles = int(os.environ.get('PROFILE_MAX_FILES', 50))
+        # O profiler do Python é um só por processo: um perfil por vez
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.token is not None
+
+    def authorized(self, token: Optional[str]) -> bool:
+        return self.enabled and bool(token) and hmac.compare_digest(token, self.token)
+
+    def init_app(self, app: Flask):
+        if not self.enabled:
+            return
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        app.teardown_request(self._discard)
+
+    def _start(self):
+        # As rotas de consulta dos perfis recebem o mesmo header
+        if request.blueprint == 'profiling':
+            return
+        # O token só é aceito em header: a query string vai para logs de
+        # acesso, histórico do navegador e Referer
+        if request.args.get('profile') not in PROFILE_FLAGS:
+            return
+        if not self.authorized(request.headers.get('X-Profile-Token')):
+            return
+        if not self._lock.acquire(blocking=False):
+            g.profile_busy = True
+            return
+        g.profile_started = time.perf_counter()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    def _finish(self, response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            if g.pop('profile_busy', False):
+                response.headers['X-Profile'] = 'busy'
+            return response
+
+        profiler.disable()
+        elapsed = time.perf_counter() - g.profile_started
+        self._lock.release()
+        try:
+            profile_id = self._save(profiler, response.status_code, elapsed)
+            response.headers['X-Profile'] = profile_id
+            response.headers['X-Profile-Url'] = f'/api/profiles/{profile_id}'
+        except Exception as e:
+            print(f"Erro ao gravar perfil: {str(e)}")
+        return response
+
+    def _discard(self, exc):
+        # Exceção não tratada: after_request não roda
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            self._lock.release()
+
+    def _save(self, profiler: cProfile.Profile, status: int, elapsed: float) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+        profiler.dump_stats(os.path.join(self.directory, f'{profile_id}.prof'))
+
+        summary = {
+            'id': profile_id,
+            'created_at': datetime.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': status,
+            'duration_ms': round(elapsed * 1000, 2),
+            'functions': self._top_functions(pstats.Stats(profiler))
+        }
+        with open(os.path.join(self.directory, f'{profile_id}.json'), 'w') as f:
+            json.dump(summary, f)
+
+        self._prune()
+        return profile_id
+
+    def _top_functions(self, stats: pstats.Stats) -> List[Dict[str, Any]]:
+        """Funções ordenadas por tempo cumulativo"""
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        functions = []
+        for (filename, line, name), (primitive_calls, calls, total_time, cumulative_time, _) in rows[:self.top_functions]:
+            functions.append({
+                'function': name,
+                'location': f'{filename}:{line}' if line else filename,
+                'calls': calls,
+                'primitive_calls': primitive_calls,
+                'total_time_ms': round(total_time * 1000, 3),
+                'cumulative_time_ms': round(cumulative_time * 1000, 3)
+            })
+        return functions
+
+    def _prune(self):
+        """Mantém apenas os PROFILE_MAX_FILES perfis mais recentes"""
+        ids = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.json'))
+        for profile_id in ids[:-self.max_profiles] if self.max_profiles > 0 else []:
+            for extension in ('.json', '.prof'):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + extension))
+                except FileNotFoundError:
+                    pass
+
+    def list_profiles(self) -> List[Dict[str, Any]]:
+        """Perfis gravados, do mais recente ao mais antigo (sem a lista de funções)"""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summary.pop('functions', None)
+            profiles.append(summary)
+        return profiles
+
+    def get_profile(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        path = self.profile_path(profile_id, '.json')
+        if path is None:
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def profile_path(self, profile_id: str, extension: str = '.prof') -> Optional[str]:
+        """Caminho de um perfil gravado (None se o id for inválido ou não existir)"""
+        if not PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.abspath(os.path.join(self.directory, profile_id + extension))
+        return path if os.path.exists(path) else None
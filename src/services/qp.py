@@ -0,0 +1,285 @@
+import numpy as np
+import osqp
+from scipy import sparse
+from scipy.optimize import linprog
+from typing import Any, Dict, List, Optional
+
+from services.covariance import LowRankCovariance
+from services.telemetry import optimizer_iterations
+
+
+class PortfolioConstraints:
+    """
+    Restrições de mandato aplicadas à otimização
+
+    - limites mínimo/máximo de peso por ativo
+    - limites por grupo (ex.: tipo de ativo `stock`, `crypto`, `fund` ou setor)
+    - limite de giro (turnover) Σ|w - w_atual| em relação aos pesos atuais
+    """
+
+    def __init__(self, symbols: List[str], min_weights: np.ndarray, max_weights: np.ndarray,
+                 groups: Dict[str, Dict[str, Any]], current_weights: Optional[np.ndarray] = None,
+                 max_turnover: Optional[float] = None):
+        self.symbols = symbols
+        self.min_weights = min_weights
+        self.max_weights = max_weights
+        self.groups = groups
+        self.current_weights = current_weights
+        self.max_turnover = max_turnover
+
+    @classmethod
+    def from_spec(cls, spec: Dict[str, Any], symbols: List[str],
+                  asset_groups: Optional[Dict[str, str]] = None) -> 'PortfolioConstraints':
+        """
+        Constrói as restrições a partir do body da requisição
+
+        `spec` aceita `min_weight` / `max_weight` (número ou {símbolo: valor}),
+        `group_caps` ({grupo: máximo} ou {grupo: {"min": x, "max": y}}),
+        `asset_groups` ({símbolo: grupo}), `current_weights` e `max_turnover`.
+        """
+        spec = spec or {}
+        min_weights = _per_asset(spec.get('min_weight', 0.0), symbols, 0.0)
+        max_weights = _per_asset(spec.get('max_weight', 1.0), symbols, 1.0)
+
+        if np.any(min_weights > max_weights):
+            raise ValueError("Peso mínimo maior que o máximo para algum ativo")
+        if min_weights.sum() > 1 + 1e-9 or max_weights.sum() < 1 - 1e-9:
+            raise ValueError("Limites de peso incompatíveis com soma dos pesos = 1")
+
+        membership = dict(asset_groups or {})
+        membership.update(spec.get('asset_groups') or {})
+
+        groups = {}
+        for name, cap in (spec.get('group_caps') or {}).items():
+            bounds = cap if isinstance(cap, dict) else {'max': cap}
+            indices = [i for i, symbol in enumerate(symbols) if membership.get(symbol) == name]
+            if not indices:
+                continue
+            groups[name] = {
+                'indices': np.array(indices),
+                'min': float(bounds.get('min', 0.0)),
+                'max': float(bounds.get('max', 1.0))
+            }
+
+        current_weights = None
+        max_turnover = spec.get('max_turnover')
+        if max_turnover is not None:
+            current = spec.get('current_weights') or {}
+            current_weights = np.array([float(current.get(symbol, 0.0)) for symbol in symbols])
+            max_turnover = float(max_turnover)
+
+        return cls(symbols, min_weights, max_weights, groups, current_weights, max_turnover)
+
+
+def _per_asset(value, symbols: List[str], default: float) -> np.ndarray:
+    """Expande um limite escalar ou por símbolo para um vetor"""
+    if isinstance(value, dict):
+        return np.array([float(value.get(symbol, default)) for symbol in symbols])
+    return np.full(len(symbols), float(value))
+
+
+class PortfolioQP:
+    """
+    Resolve os problemas da fronteira eficiente como QPs esparsos (OSQP)
+
+    Variáveis x = [w (k), y (r), t (k)]:
+    - y = Bᵀw são as exposuras aos fatores quando a covariância é low-rank, de
+      modo que a matriz P fica diag(d) ⊕ I (esparsa) em vez de k x k densa
+    - t ≥ |w - w_atual| existe apenas quando há limite de giro
+
+    A primeira linha de A é μᵀw; os pontos da fronteira reaproveitam a mesma
+    fatoração apenas atualizando seus limites.
+    """
+
+    SETTINGS = dict(verbose=False, eps_abs=1e-6, eps_rel=1e-6, polish=True, max_iter=10000)
+
+    # Violação máxima aceita nas restrições (ruído numérico do solver)
+    TOLERANCE = 1e-4
+
+    def __init__(self, mean_returns, cov_model, constraints: PortfolioConstraints):
+        self.mu = np.asarray(mean_returns, dtype=float)
+        self.cov_model = cov_model
+        self.constraints = constraints
+        self.num_assets = len(self.mu)
+        self.iterations = 0
+
+        self.P, self.A, self.lower, self.upper = self._build()
+        self._problem = None
+        self._extremes = {}
+
+    def _build(self):
+        """Monta P e as restrições l ≤ Ax ≤ u como matrizes esparsas"""
+        k = self.num_assets
+        c = self.constraints
+        low_rank = isinstance(self.cov_model, LowRankCovariance)
+        r = self.cov_model.rank if low_rank else 0
+        nt = k if c.max_turnover is not None else 0
+
+        def pad(block_w=None, block_y=None, block_t=None, rows=None):
+            return sparse.hstack([
+                block_w if block_w is not None else sparse.csr_matrix((rows, k)),
+                block_y if block_y is not None else sparse.csr_matrix((rows, r)),
+                block_t if block_t is not None else sparse.csr_matrix((rows, nt)),
+            ], format='csr')
+
+        blocks, lower, upper = [], [], []
+
+        def add(block, lo, hi):
+            blocks.append(block)
+            lower.append(np.broadcast_to(np.asarray(lo, dtype=float), block.shape[0]))
+            upper.append(np.broadcast_to(np.asarray(hi, dtype=float), block.shape[0]))
+
+        # Linha 0: retorno alvo (livre até ser fixada)
+        add(pad(sparse.csr_matrix(self.mu), rows=1), -np.inf, np.inf)
+        # Soma dos pesos = 1
+        add(pad(sparse.csr_matrix(np.ones((1, k))), rows=1), 1.0, 1.0)
+        # Limites por ativo
+        add(pad(sparse.identity(k, format='csr'), rows=k), c.min_weights, c.max_weights)
+
+        # Limites por grupo
+        if c.groups:
+            rows, cols = [], []
+            for row, group in enumerate(c.groups.values()):
+                rows.extend([row] * len(group['indices']))
+                cols.extend(group['indices'])
+            membership = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(c.groups), k))
+            add(pad(membership, rows=len(c.groups)),
+                [g['min'] for g in c.groups.values()], [g['max'] for g in c.groups.values()])
+
+        # Exposições aos fatores: Bᵀw - y = 0
+        if low_rank:
+            add(pad(sparse.csr_matrix(self.cov_model.loadings.T), -sparse.identity(r, format='csr'), rows=r),
+                0.0, 0.0)
+
+        # Giro: t ≥ w - w0, t ≥ w0 - w, Σt ≤ limite
+        if nt:
+            identity = sparse.identity(k, format='csr')
+            add(pad(-identity, block_t=identity, rows=k), -c.current_weights, np.inf)
+            add(pad(identity, block_t=identity, rows=k), c.current_weights, np.inf)
+            add(pad(block_t=sparse.csr_matrix(np.ones((1, k))), rows=1), -np.inf, c.max_turnover)
+
+        if low_rank:
+            P = sparse.block_diag([sparse.diags(self.cov_model.specific), sparse.identity(r),
+                                   sparse.csc_matrix((nt, nt))], format='csc')
+        else:
+            P = sparse.block_diag([sparse.csc_matrix(self.cov_model.to_dense()),
+                                   sparse.csc_matrix((nt, nt))], format='csc')
+
+        A = sparse.vstack(blocks, format='csc')
+        return 2 * P, A, np.concatenate(lower), np.concatenate(upper)
+
+    def _budget_weights(self, x: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Pesos de uma solução x = [w, y, t], ou None se ela viola as restrições
+
+        Soma, limites por ativo e por grupo e giro são conferidos com
+        tolerância TOLERANCE; dentro dela só o ruído nos limites por ativo é
+        cortado. Os pesos não são reescalados: dividir pela soma empurraria
+        ativos no teto acima do máximo e poderia furar os limites de grupo.
+        """
+        rows = self.A[1:] @ x
+        if np.any(rows < self.lower[1:] - self.TOLERANCE) or np.any(rows > self.upper[1:] + self.TOLERANCE):
+            return None
+        return np.clip(x[:self.num_assets], self.constraints.min_weights, self.constraints.max_weights)
+
+    def _solve(self, problem) -> Optional[np.ndarray]:
+        result = problem.solve()
+        self.iterations += result.info.iter
+        optimizer_iterations('osqp', result.info.iter)
+        if result.info.status != 'solved':
+            return None
+        return self._budget_weights(result.x)
+
+    def min_variance(self) -> Optional[np.ndarray]:
+        """Portfólio de mínima variância sob as restrições"""
+        return self.target_return(None)
+
+    def target_return(self, target: Optional[float]) -> Optional[np.ndarray]:
+        """Portfólio de mínima variância com retorno igual a `target`"""
+        # Nos extremos o conjunto viável é degenerado e o ADMM não converge;
+        # a solução do LP de return_range já é o portfólio procurado
+        for extreme, weights in self._extremes.items():
+            if target is not None and abs(target - extreme) <= 1e-9 * max(1.0, abs(extreme)):
+                return weights
+
+        lower, upper = self.lower.copy(), self.upper.copy()
+        lower[0], upper[0] = (-np.inf, np.inf) if target is None else (target, target)
+
+        if self._problem is None:
+            self._problem = osqp.OSQP()
+            self._problem.setup(P=sparse.triu(self.P, format='csc'), q=np.zeros(self.P.shape[0]),
+                                A=self.A, l=lower, u=upper, **self.SETTINGS)
+        else:
+            self._problem.update(l=lower, u=upper)
+
+        return self._solve(self._problem)
+
+    def return_range(self):
+        """Menor e maior retorno atingíveis sob as restrições (dois LPs)"""
+        n = self.A.shape[1]
+        lower, upper = self.lower[1:], self.upper[1:]
+        A = self.A[1:]
+
+        equality = lower == upper
+        finite_upper = ~equality & np.isfinite(upper)
+        finite_lower = ~equality & np.isfinite(lower)
+        A_ub = sparse.vstack([A[finite_upper], -A[finite_lower]], format='csr')
+        b_ub = np.concatenate([upper[finite_upper], -lower[finite_lower]])
+
+        objective = np.zeros(n)
+        objective[:self.num_assets] = self.mu
+
+        bounds = []
+        for sign in (1, -1):
+            result = linprog(sign * objective, A_ub=A_ub, b_ub=b_ub, A_eq=A[equality],
+                             b_eq=lower[equality], bounds=(None, None), method='highs')
+            if not result.success:
+                raise ValueError("Restrições inviáveis para a otimização")
+            extreme = sign * result.fun
+            self._extremes[extreme] = self._budget_weights(result.x)
+            bounds.append(extreme)
+        return bounds[0], bounds[1]
+
+    def max_sharpe(self, risk_free_rate: float) -> Optional[np.ndarray]:
+        """
+        Portfólio de máximo Sharpe pela reformulação convexa homogênea
+
+        Com z = κw, maximizar (μ-rf)ᵀw/σ equivale a minimizar zᵀΣz sujeito a
+        (μ-rf)ᵀz = 1; cada restrição lo ≤ aᵀw ≤ hi vira aᵀz - lo·κ ≥ 0 e
+        aᵀz - hi·κ ≤ 0, e os pesos são recuperados por w = z/κ.
+        """
+        lower, upper, A = self.lower[1:], self.upper[1:], self.A[1:]
+        n = A.shape[1]
+
+        equality = lower == upper
+        finite_lower = ~equality & np.isfinite(lower)
+        finite_upper = ~equality & np.isfinite(upper)
+
+        blocks = [
+            sparse.hstack([A[equality], sparse.csc_matrix(-lower[equality][:, None])]),
+            sparse.hstack([A[finite_lower], sparse.csc_matrix(-lower[finite_lower][:, None])]),
+            sparse.hstack([A[finite_upper], sparse.csc_matrix(-upper[finite_upper][:, None])]),
+        ]
+        excess = np.zeros((1, n + 1))
+        excess[0, :self.num_assets] = self.mu - risk_free_rate
+        kappa = np.zeros((1, n + 1))
+        kappa[0, n] = 1.0
+        blocks.extend([sparse.csc_matrix(excess), sparse.csc_matrix(kappa)])
+
+        zeros = lambda mask: np.zeros(int(mask.sum()))
+        infs = lambda mask: np.full(int(mask.sum()), np.inf)
+        homog_lower = np.concatenate([zeros(equality), zeros(finite_lower), -infs(finite_upper), [1.0, 0.0]])
+        homog_upper = np.concatenate([zeros(equality), infs(finite_lower), zeros(finite_upper), [1.0, np.inf]])
+
+        P = sparse.block_diag([self.P, sparse.csc_matrix((1, 1))], format='csc')
+        problem = osqp.OSQP()
+        problem.setup(P=sparse.triu(P, format='csc'), q=np.zeros(n + 1),
+                      A=sparse.vstack(blocks, format='csc'), l=homog_lower, u=homog_upper, **self.SETTINGS)
+
+        result = problem.solve()
+        self.iterations += result.info.iter
+        optimizer_iterations('osqp', result.info.iter)
+        if result.info.status != 'solved' or result.x[n] <= 0:
+            return None
+
+        return self._budget_weights(result.x[:n] / result.x[n])
@@ -0,0 +1,146 @@
+import fcntl
+import os
+import random
+import threading
+import traceback
+from datetime import datetime, time
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+
+class AlertScheduler:
+    """
+    Verificação periódica dos alertas em segundo plano
+
+    Cada worker do gunicorn inicia uma thread, mas apenas a que obtém o lock
+    exclusivo (flock) em `data/alert_scheduler.lock` executa as verificações;
+    se o processo líder morrer o sistema operacional libera o lock e outro
+    worker assume na tentativa seguinte. O resultado fica no banco de alertas
+    e as requisições de monitoramento apenas o leem.
+
+    A thread é iniciada na primeira requisição de cada processo (`init_app`),
+    não no import: com `gunicorn --preload` a aplicação é importada no master
+    e uma thread iniciada ali não sobreviveria ao fork dos workers (e o
+    master ficaria com o lock de líder).
+
+    Configuração por variáveis de ambiente:
+    - ALERT_SCHEDULER_ENABLED (padrão 1)
+    - ALERT_CHECK_INTERVAL: segundos entre verificações no pregão (padrão 60)
+    - ALERT_CHECK_OFF_HOURS_INTERVAL: segundos fora do pregão (padrão 900)
+    - ALERT_CHECK_JITTER: variação relativa do intervalo (padrão 0.1)
+    - ALERT_MARKET_TIMEZONE, ALERT_MARKET_OPEN, ALERT_MARKET_CLOSE
+      (padrão America/New_York, 09:30 às 16:00, segunda a sexta)
+    """
+
+    def __init__(self, alert_manager, data_dir: str = "data"):
+        self.alert_manager = alert_manager
+        self.lock_path = os.path.join(data_dir, "alert_scheduler.lock")
+        self.enabled = os.environ.get('ALERT_SCHEDULER_ENABLED', '1') not in ('0', 'false', 'False')
+        self.interval = float(os.environ.get('ALERT_CHECK_INTERVAL', 60))
+        self.off_hours_interval = float(os.environ.get('ALERT_CHECK_OFF_HOURS_INTERVAL', 900))
+        self.jitter = float(os.environ.get('ALERT_CHECK_JITTER', 0.1))
+        self.market_timezone = ZoneInfo(os.environ.get('ALERT_MARKET_TIMEZONE', 'America/New_York'))
+        self.market_open = time.fromisoformat(os.environ.get('ALERT_MARKET_OPEN', '09:30'))
+        self.market_close = time.fromisoformat(os.environ.get('ALERT_MARKET_CLOSE', '16:00'))
+
+        self._lock_file = None
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+        self._last_compaction: Optional[datetime] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_file is not None
+
+    def init_app(self, app):
+        """Inicia o agendador na primeira requisição de cada worker"""
+        if self.enabled:
+            app.before_request(self.start)
+
+    def start(self):
+        """Inicia a thread do agendador neste processo (idempotente)"""
+        if not self.enabled:
+            return
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+
+        # Após um fork o lock herdado pertence ao processo pai; fechar a cópia
+        # do descritor não o libera
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='alert-scheduler', daemon=True)
+        self._thread_pid = os.getpid()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._release()
+
+    def is_market_open(self, now: Optional[datetime] = None) -> bool:
+        """Indica se o mercado configurado está em pregão"""
+        now = (now or datetime.now(self.market_timezone)).astimezone(self.market_timezone)
+        return now.weekday() < 5 and self.market_open <= now.time() < self.market_close
+
+    def next_delay(self) -> float:
+        """Intervalo até a próxima verificação, com variação aleatória"""
+        interval = self.interval if self.is_market_open() else self.off_hours_interval
+        return max(1.0, interval * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def run_once(self):
+        """Executa as verificações e registra o resultado de cada uma no banco"""
+        checks = (
+            ('price', self.alert_manager.check_price_alerts),
+            ('performance', self.alert_manager.check_performance_alerts),
+        )
+        for kind, check in checks:
+            started_at = datetime.now().isoformat()
+            triggered_count, error = 0, None
+            try:
+                triggered_count = len(check())
+            except Exception as e:
+                error = str(e)
+                traceback.print_exc()
+
+            self.alert_manager.store.record_check(kind, started_at, datetime.now().isoformat(),
+                                                  triggered_count, error)
+
+        # Retenção do histórico de disparos, no máximo uma vez por hora
+        if self._last_compaction is None or (datetime.now() - self._last_compaction).total_seconds() >= 3600:
+            self._last_compaction = datetime.now()
+            try:
+                self.alert_manager.compact_history()
+            except Exception:
+                traceback.print_exc()
+
+    def _loop(self):
+        # Espera inicial aleatória para os workers não disputarem o lock juntos
+        self._stop.wait(random.uniform(0, self.jitter * self.interval))
+        while not self._stop.is_set():
+            if self.is_leader or self._acquire():
+                try:
+                    self.run_once()
+                except Exception:
+                    traceback.print_exc()
+            self._stop.wait(self.next_delay())
+
+    def _acquire(self) -> bool:
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        lock_file = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _release(self):
+        if self._lock_file is not None:
+            try:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            finally:
+                self._lock_file.close()
+                self._lock_file = None
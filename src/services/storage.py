@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+
+class SQLiteStore(ABC):
+    """
+    Base para armazenamentos locais em SQLite compartilhados entre workers.
+
+    Cada thread (e cada processo, após um fork do gunicorn) usa sua própria
+    conexão em modo WAL, permitindo leituras concorrentes com um único escritor.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self.transaction() as conn:
+            self._create_schema(conn)
+
+    @abstractmethod
+    def _create_schema(self, conn: sqlite3.Connection):
+        """Cria tabelas e índices (implementado pelas subclasses)"""
+
+    def _connection(self) -> sqlite3.Connection:
+        """Retorna a conexão da thread atual, recriando-a após um fork"""
+        pid = os.getpid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or getattr(self._local, 'pid', None) != pid:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            self._local.conn = conn
+            self._local.pid = pid
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Executa um bloco dentro de uma transação de escrita (BEGIN IMMEDIATE)"""
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _query(self, sql: str, params=()):
+        """Executa uma consulta de leitura e retorna todas as linhas"""
+        return self._connection().execute(sql, params).fetchall()
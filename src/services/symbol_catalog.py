@@ -0,0 +1,409 @@
+import fcntl
+import json
+import os
+import re
+import threading
+import traceback
+from bisect import bisect_left
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, update
+
+from services.lazy import lazy_import
+from services.telemetry import upstream
+from src.models.portfolio import db, Asset
+
+# Importados no primeiro uso: o catálogo é criado no import do blueprint
+np = lazy_import('numpy')
+requests = lazy_import('requests')
+
+NASDAQ_LISTED_URL = 'https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt'
+OTHER_LISTED_URL = 'https://www.nasdaqtrader.com/dynamic/SymDir/otherlisted.txt'
+COINGECKO_MARKETS_URL = 'https://api.coingecko.com/api/v3/coins/markets'
+
+# Códigos de bolsa do otherlisted.txt
+OTHER_EXCHANGES = {'A': 'NYSE American', 'N': 'NYSE', 'P': 'NYSE Arca', 'Z': 'Cboe BZX', 'V': 'IEX'}
+
+# Ordem de relevância entre resultados com o mesmo tipo de correspondência
+TYPE_RANK = {'stock': 0, 'fund': 1, 'crypto': 2}
+
+# Tipos do catálogo aceitos por cada filtro `type`: ETFs (fund) também
+# aparecem em `stock`, como na busca pelo Yahoo Finance
+TYPE_FILTERS = {'stock': ('stock', 'fund'), 'fund': ('fund',), 'crypto': ('crypto',)}
+
+# Tipo devolvido na resposta: /asset-data e /calculate-metrics tratam ETFs como ações
+RESPONSE_TYPES = {'fund': 'stock'}
+EXCHANGE_RANK = {'NASDAQ': 0, 'NYSE': 0, 'NYSE American': 1, 'NYSE Arca': 1,
+                 'Cboe BZX': 2, 'IEX': 2, 'CoinGecko': 3}
+
+# Palavras dos nomes que não entram no índice
+NAME_STOPWORDS = {'inc', 'corp', 'corporation', 'co', 'company', 'ltd', 'limited', 'plc', 'llc', 'lp',
+                  'the', 'of', 'and', 'common', 'stock', 'shares', 'class', 'ordinary', 'share'}
+
+# Prefixos até este tamanho têm os melhores resultados pré-calculados
+PREFIX_CACHE_LENGTH = 3
+MAX_RESULTS = 50
+
+# Tipo de correspondência: símbolo, primeira palavra do nome, demais palavras
+SYMBOL_MATCH, NAME_MATCH, NAME_WORD_MATCH = 0, 1, 2
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+
+def _name_tokens(name: str) -> List[str]:
+    return [token for token in _TOKEN.findall(name.lower()) if len(token) > 1 and token not in NAME_STOPWORDS]
+
+
+class SymbolCatalog:
+    """
+    Catálogo local de ativos negociáveis para o autocomplete de /search-assets
+
+    As listas completas de símbolos (Nasdaq Trader para ações e ETFs,
+    CoinGecko para as maiores criptomoedas) são gravadas na tabela Asset e
+    atualizadas periodicamente por um único worker (flock em
+    `data/symbol_catalog.lock`). Cada worker mantém em memória um índice de
+    prefixos sobre símbolos e palavras dos nomes: as chaves ficam em uma
+    lista ordenada (busca binária) e os prefixos curtos, que casam com
+    milhares de ativos, têm os melhores resultados pré-calculados. A busca
+    não faz nenhuma chamada externa.
+
+    Configuração por variáveis de ambiente:
+    - SYMBOL_CATALOG_ENABLED (padrão 1)
+    - SYMBOL_CATALOG_REFRESH_HOURS: intervalo entre atualizações das listas (padrão 24)
+    - SYMBOL_CATALOG_RELOAD_SECONDS: intervalo de verificação do banco (padrão 300)
+    - SYMBOL_CATALOG_CRYPTO_PAGES: páginas de 250 criptomoedas por valor de mercado (padrão 4)
+    """
+
+    def __init__(self, data_dir: str = "data"):
+        self.lock_path = os.path.join(data_dir, "symbol_catalog.lock")
+        self.meta_path = os.path.join(data_dir, "symbol_catalog.json")
+        self.enabled = os.environ.get('SYMBOL_CATALOG_ENABLED', '1') not in ('0', 'false', 'False')
+        self.refresh_hours = float(os.environ.get('SYMBOL_CATALOG_REFRESH_HOURS', 24))
+        self.reload_seconds = float(os.environ.get('SYMBOL_CATALOG_RELOAD_SECONDS', 300))
+        self.crypto_pages = int(os.environ.get('SYMBOL_CATALOG_CRYPTO_PAGES', 4))
+
+        self._entries: List[Dict[str, Any]] = []
+        self._keys: List[str] = []
+        self._positions = None
+        self._scores = None
+        self._type_codes = None
+        self._by_symbol: Dict[str, List[int]] = {}
+        self._top: Dict[Tuple[str, str], List[int]] = {}
+        self._signature = None
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return bool(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Índice em memória
+
+    def _rank(self, entry: Dict[str, Any]) -> tuple:
+        return (TYPE_RANK.get(entry['type'], 3), EXCHANGE_RANK.get(entry['exchange'], 4),
+                len(entry['symbol']), entry['symbol'])
+
+    def build(self, assets: List[Dict[str, Any]]):
+        """
+        Constrói o índice a partir de dicionários com symbol, name, type,
+        exchange, currency e, para cripto, o id do CoinGecko
+        """
+        entries = sorted(assets, key=self._rank)
+        pairs = {}
+        by_symbol: Dict[str, List[int]] = {}
+        for position, entry in enumerate(entries):
+            symbol = entry['symbol'].lower()
+            by_symbol.setdefault(symbol, []).append(position)
+            pairs[(symbol, position)] = SYMBOL_MATCH
+            for order, token in enumerate(_name_tokens(entry['name'] or '')):
+                kind = NAME_MATCH if order == 0 else NAME_WORD_MATCH
+                if kind < pairs.get((token, position), NAME_WORD_MATCH + 1):
+                    pairs[(token, position)] = kind
+        keys = sorted(pairs)
+
+        # Pontuação de cada chave: tipo de correspondência e, como as entradas
+        # estão ordenadas por relevância, a posição como desempate
+        count = max(len(entries), 1)
+        positions = np.fromiter((position for _, position in keys), dtype=np.int64, count=len(keys))
+        kinds = np.fromiter((pairs[key] for key in keys), dtype=np.int64, count=len(keys))
+        scores = kinds * count + positions
+        type_codes = np.fromiter((TYPE_RANK.get(entry['type'], 3) for entry in entries),
+                                 dtype=np.int8, count=len(entries))
+
+        # Melhores resultados dos prefixos curtos, que casam com milhares de chaves
+        buckets: Dict[Tuple[str, str], List[int]] = {}
+        for (key, position), score in zip(keys, scores.tolist()):
+            filters = ['all'] + [name for name, types in TYPE_FILTERS.items()
+                                 if entries[position]['type'] in types]
+            for length in range(1, min(len(key), PREFIX_CACHE_LENGTH) + 1):
+                for name in filters:
+                    buckets.setdefault((name, key[:length]), []).append(score)
+        top = {bucket: self._unique_positions(np.array(bucket_scores, dtype=np.int64), count)[:MAX_RESULTS]
+               for bucket, bucket_scores in buckets.items()}
+
+        with self._lock:
+            self._entries = entries
+            self._keys = [key for key, _ in keys]
+            self._positions = positions
+            self._scores = scores
+            self._type_codes = type_codes
+            self._by_symbol = by_symbol
+            self._top = {bucket: positions.tolist() for bucket, positions in top.items()}
+
+    @staticmethod
+    def _unique_positions(scores: 'np.ndarray', count: int) -> 'np.ndarray':
+        """Posições das entradas em ordem de pontuação, sem repetição"""
+        positions = np.sort(scores) % count
+        _, first = np.unique(positions, return_index=True)
+        return positions[np.sort(first)]
+
+    def search(self, query: str, asset_type: str = 'all', limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Busca por prefixo do símbolo ou de palavras do nome
+
+        Ordem: símbolo exato, prefixo do símbolo, prefixo da primeira palavra
+        do nome e prefixo das demais palavras; dentro de cada grupo ações,
+        fundos e cripto, bolsas principais e símbolos mais curtos primeiro.
+        Com várias palavras, todas precisam casar com o símbolo ou com alguma
+        palavra do nome.
+        """
+        tokens = _TOKEN.findall(query.lower())
+        if not tokens:
+            return []
+        limit = max(1, min(limit, MAX_RESULTS))
+        asset_type = asset_type if asset_type in TYPE_FILTERS else 'all'
+        types = TYPE_FILTERS.get(asset_type, ())
+
+        with self._lock:
+            entries, keys, positions, scores = self._entries, self._keys, self._positions, self._scores
+            type_codes, by_symbol, top = self._type_codes, self._by_symbol, self._top
+        count = max(len(entries), 1)
+
+        def key_range(token):
+            start = bisect_left(keys, token)
+            return start, bisect_left(keys, token + '\uffff', lo=start)
+
+        # Símbolo exato (também com pontuação, como BRK.B)
+        ordered = [position for position in by_symbol.get(query.strip().lower(), by_symbol.get(''.join(tokens), []))
+                   if asset_type == 'all' or entries[position]['type'] in types]
+
+        lookup = max(tokens, key=len)
+        if len(tokens) == 1 and len(lookup) <= PREFIX_CACHE_LENGTH:
+            ordered.extend(top.get((asset_type, lookup), []))
+        else:
+            start, end = key_range(lookup)
+            candidates = scores[start:end]
+            if asset_type != 'all':
+                candidates = candidates[np.isin(type_codes[candidates % count], [TYPE_RANK[name] for name in types])]
+            matched = self._unique_positions(candidates, count)
+            # Demais palavras da consulta: a entrada precisa ter alguma chave com o prefixo
+            for token in tokens:
+                if token != lookup and len(token) > 1 and token not in NAME_STOPWORDS:
+                    start, end = key_range(token)
+                    matched = matched[np.isin(matched, positions[start:end])]
+            ordered.extend(matched[:limit].tolist())
+
+        results, seen = [], set()
+        for position in ordered:
+            if position not in seen:
+                seen.add(position)
+                result = dict(entries[position])
+                result['type'] = RESPONSE_TYPES.get(result['type'], result['type'])
+                results.append(result)
+                if len(results) == limit:
+                    break
+        return results
+
+    def load(self):
+        """Reconstrói o índice a partir da tabela Asset (chamar com app context)"""
+        rows = db.session.execute(
+            select(Asset.symbol, Asset.name, Asset.asset_type, Asset.exchange, Asset.currency, Asset.provider_id)
+        ).all()
+        entries = []
+        for symbol, name, asset_type, exchange, currency, provider_id in rows:
+            entry = {'symbol': symbol, 'name': name, 'type': asset_type, 'exchange': exchange or 'N/A',
+                     'currency': currency or 'USD'}
+            if asset_type == 'crypto' and provider_id:
+                # Id exigido pelas rotas de cripto (mesmo campo da busca na CoinGecko)
+                entry['id'] = provider_id
+            entries.append(entry)
+        self.build(entries)
+
+    def _current_signature(self):
+        count, last_id = db.session.execute(select(func.count(Asset.id), func.max(Asset.id))).one()
+        refreshed_at = self._read_meta().get('refreshed_at')
+        return count, last_id, refreshed_at
+
+    def reload_if_changed(self):
+        """Recarrega o índice se o catálogo no banco mudou (chamar com app context)"""
+        signature = self._current_signature()
+        if signature != self._signature:
+            self.load()
+            self._signature = signature
+
+    # Atualização das listas
+
+    def fetch_listings(self) -> List[Dict[str, Any]]:
+        """Baixa as listas completas de ações, ETFs e criptomoedas"""
+        listings = []
+
+        with upstream('nasdaqtrader'):
+            nasdaq = requests.get(NASDAQ_LISTED_URL, timeout=30)
+            nasdaq.raise_for_status()
+        for row in self._pipe_rows(nasdaq.text):
+            if row.get('Test Issue') == 'Y' or not row.get('Symbol'):
+                continue
+            listings.append(self._listing(row['Symbol'], row['Security Name'],
+                                          'fund' if row.get('ETF') == 'Y' else 'stock', 'NASDAQ'))
+
+        with upstream('nasdaqtrader'):
+            other = requests.get(OTHER_LISTED_URL, timeout=30)
+            other.raise_for_status()
+        for row in self._pipe_rows(other.text):
+            if row.get('Test Issue') == 'Y' or not row.get('ACT Symbol'):
+                continue
+            listings.append(self._listing(row['ACT Symbol'], row['Security Name'],
+                                          'fund' if row.get('ETF') == 'Y' else 'stock',
+                                          OTHER_EXCHANGES.get(row.get('Exchange'), row.get('Exchange') or 'N/A')))
+
+        for page in range(1, self.crypto_pages + 1):
+            with upstream('coingecko'):
+                response = requests.get(COINGECKO_MARKETS_URL, timeout=30, params={
+                    'vs_currency': 'usd', 'order': 'market_cap_desc', 'per_page': 250, 'page': page
+                })
+                response.raise_for_status()
+            coins = response.json()
+            listings.extend(self._listing(coin['symbol'].upper(), coin['name'], 'crypto', 'CoinGecko', coin.get('id'))
+                            for coin in coins if coin.get('symbol'))
+            if len(coins) < 250:
+                break
+
+        return listings
+
+    @staticmethod
+    def _pipe_rows(text: str):
+        lines = [line for line in text.splitlines() if line and not line.startswith('File Creation Time')]
+        if not lines:
+            return
+        header = lines[0].split('|')
+        for line in lines[1:]:
+            yield dict(zip(header, line.split('|')))
+
+    @staticmethod
+    def _listing(symbol: str, name: str, asset_type: str, exchange: str,
+                 provider_id: Optional[str] = None) -> Dict[str, Any]:
+        # Nomes da Nasdaq vêm como "Apple Inc. - Common Stock"
+        name = (name or symbol).split(' - ')[0].strip()[:200]
+        return {'symbol': symbol.strip()[:20], 'name': name or symbol,
+                'asset_type': asset_type, 'exchange': exchange, 'currency': 'USD',
+                'provider_id': provider_id}
+
+    def save_listings(self, listings: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Insere ativos novos e atualiza nome, bolsa e id no provedor dos existentes
+
+        Um ativo é identificado por (símbolo, tipo). Ativos que saíram das
+        listas não são removidos, pois podem estar em posições.
+        """
+        existing = {
+            (symbol.upper(), asset_type): (asset_id, name, exchange, provider_id)
+            for asset_id, symbol, asset_type, name, exchange, provider_id in db.session.execute(
+                select(Asset.id, Asset.symbol, Asset.asset_type, Asset.name, Asset.exchange, Asset.provider_id)
+            )
+        }
+        inserts, updates, seen = [], [], set()
+        for listing in listings:
+            key = (listing['symbol'].upper(), listing['asset_type'])
+            if key in seen:
+                continue
+            seen.add(key)
+            current = existing.get(key)
+            if current is None:
+                inserts.append(dict(listing, created_at=datetime.utcnow()))
+            elif current[1:] != (listing['name'], listing['exchange'], listing['provider_id']):
+                updates.append({'id': current[0], 'name': listing['name'], 'exchange': listing['exchange'],
+                                'provider_id': listing['provider_id']})
+
+        if inserts:
+            db.session.execute(insert(Asset), inserts)
+        if updates:
+            db.session.execute(update(Asset), updates)
+        db.session.commit()
+        return {'inserted': len(inserts), 'updated': len(updates)}
+
+    def refresh(self) -> Dict[str, int]:
+        """Baixa as listas e grava no banco (chamar com app context)"""
+        result = self.save_listings(self.fetch_listings())
+        self._write_meta({'refreshed_at': datetime.utcnow().isoformat(), **result})
+        return result
+
+    def _read_meta(self) -> Dict[str, Any]:
+        try:
+            with open(self.meta_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, meta: Dict[str, Any]):
+        os.makedirs(os.path.dirname(self.meta_path) or '.', exist_ok=True)
+        temp_path = f"{self.meta_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(temp_path, self.meta_path)
+
+    def refresh_due(self) -> bool:
+        refreshed_at = self._read_meta().get('refreshed_at')
+        if not refreshed_at:
+            return True
+        return (datetime.utcnow() - datetime.fromisoformat(refreshed_at)).total_seconds() >= self.refresh_hours * 3600
+
+    # Thread de manutenção
+
+    def start(self, app):
+        """Carrega o índice e inicia a atualização periódica neste processo (idempotente)"""
+        if not self.enabled:
+            return
+        if self._thread is not None and self._thread.is_alive() and self._thread_pid == os.getpid():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(app,), name='symbol-catalog', daemon=True)
+        self._thread_pid = os.getpid()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self, app):
+        while not self._stop.is_set():
+            with app.app_context():
+                try:
+                    # O que já está no banco atende as buscas enquanto as listas são baixadas
+                    self.reload_if_changed()
+                    if self.refresh_due():
+                        self._refresh_as_leader()
+                        self.reload_if_changed()
+                except Exception:
+                    traceback.print_exc()
+                finally:
+                    db.session.remove()
+            self._stop.wait(self.reload_seconds)
+
+    def _refresh_as_leader(self):
+        # Só um worker baixa as listas; os demais apenas recarregam do banco
+        os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return
+            try:
+                if self.refresh_due():
+                    self.refresh()
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,456 @@
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask import Flask, g, request
+from flask.json.provider import DefaultJSONProvider
+
+from services.storage import SQLiteStore
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Buckets (segundos) padrão do Prometheus, estendidos para otimizações longas
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ITERATION_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+COUNTERS = {
+    'portfolio_upstream_errors_total': 'Falhas em chamadas a provedores externos',
+    'portfolio_cache_requests_total': 'Consultas a caches por resultado (hit/miss)',
+}
+HISTOGRAMS = {
+    'portfolio_http_request_duration_seconds': ('Duração das requisições HTTP', DURATION_BUCKETS),
+    'portfolio_stage_duration_seconds': ('Duração das etapas de cálculo e serialização', DURATION_BUCKETS),
+    'portfolio_upstream_request_duration_seconds': ('Duração das chamadas a provedores externos', DURATION_BUCKETS),
+    'portfolio_optimizer_iterations': ('Iterações por execução de solver', ITERATION_BUCKETS),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Ordem das séries de um histograma na exposição
+SUFFIX_ORDER = {'': 0, '_bucket': 0, '_sum': 1, '_count': 2}
+
+# Tempos da requisição atual: {nome: [ms acumulados, chamadas]}
+_request_timings: ContextVar[Optional[Dict[str, List[float]]]] = ContextVar('request_timings', default=None)
+
+
+class Registry:
+    """
+    Contadores e histogramas acumulados neste processo
+
+    Operações no caminho quente são um lock e alguns acessos a dict; o
+    valor cumulativo é copiado periodicamente para o MetricsStore, que soma
+    os workers na hora de expor /metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        # [contagem por bucket (não cumulativa) + overflow, soma, total]
+        self._histograms: Dict[Tuple[str, Labels], list] = {}
+
+    def inc(self, name: str, labels: Dict[str, str], value: float = 1.0):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def observe(self, name: str, labels: Dict[str, str], value: float):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            state = self._histograms.get(key)
+            if state is None:
+                state = self._histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            state[0][bisect_left(buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> List[Tuple[str, str, str, float]]:
+        """Amostras cumulativas (nome, sufixo, labels em JSON, valor)"""
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = [(key, [list(state[0]), state[1], state[2]]) for key, state in self._histograms.items()]
+
+        samples = [(name, '', json.dumps(labels), value) for (name, labels), value in counters]
+        for (name, labels), (counts, total, count) in histograms:
+            cumulative = 0
+            for bound, bucket_count in zip(HISTOGRAMS[name][1], counts):
+                cumulative += bucket_count
+                samples.append((name, '_bucket', json.dumps(labels + (('le', _format_bound(bound)),)), cumulative))
+            samples.append((name, '_bucket', json.dumps(labels + (('le', '+Inf'),)), count))
+            samples.append((name, '_sum', json.dumps(labels), total))
+            samples.append((name, '_count', json.dumps(labels), count))
+        return samples
+
+
+class MetricsStore(SQLiteStore):
+    """
+    Últimos valores cumulativos de cada worker, somados na exposição
+
+    Cada processo grava as próprias linhas com um id gerado na inicialização
+    (pids são reaproveitados pelo sistema), então reenviar o mesmo valor é
+    idempotente. Processos que saem ou ficam sem gravar por mais de
+    METRICS_RETIRE_SECONDS têm as linhas somadas ao total retido (`retired`)
+    e removidas: os contadores seguem monotônicos e a tabela não cresce a
+    cada worker reciclado.
+    """
+
+    RETIRED = 'retired'
+
+    def __init__(self, data_dir: str = "data"):
+        self.retire_seconds = float(os.environ.get('METRICS_RETIRE_SECONDS', 300))
+        super().__init__(os.path.join(data_dir, 'metrics.db'))
+
+    def _create_schema(self, conn):
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(metric_samples)")}
+        if 'pid' in columns:
+            # Formato antigo (chave pid): os valores viram o total retido
+            conn.execute("ALTER TABLE metric_samples RENAME TO metric_samples_pid")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS metric_samples (
+                process TEXT NOT NULL,
+                name TEXT NOT NULL,
+                suffix TEXT NOT NULL,
+                labels TEXT NOT NULL,
+                value REAL NOT NULL,
+                PRIMARY KEY (process, name, suffix, labels)
+            )
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS metric_processes (
+                process TEXT PRIMARY KEY,
+                pid INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        if 'pid' in columns:
+            conn.execute('''
+                INSERT INTO metric_samples (process, name, suffix, labels, value)
+                SELECT ?, name, suffix, labels, SUM(value) FROM metric_samples_pid
+                WHERE true GROUP BY name, suffix, labels
+            ''', (self.RETIRED,))
+            conn.execute("DROP TABLE metric_samples_pid")
+
+    def save(self, process: str, samples: Iterable[Tuple[str, str, str, float]], registered: bool = False) -> bool:
+        """
+        Grava as amostras do processo e aposenta os processos inativos
+
+        Com `registered`, o processo já gravou antes: se suas linhas foram
+        aposentadas nesse meio tempo, nada é gravado e retorna False, para
+        que o chamador desconte o que já está no total retido.
+        """
+        now = time.time()
+        with self.transaction() as conn:
+            if registered and conn.execute(
+                    'SELECT 1 FROM metric_processes WHERE process = ?', (process,)).fetchone() is None:
+                return False
+            conn.execute('''
+                INSERT INTO metric_processes (process, pid, updated_at) VALUES (?, ?, ?)
+                ON CONFLICT (process) DO UPDATE SET pid = excluded.pid, updated_at = excluded.updated_at
+            ''', (process, os.getpid(), now))
+            conn.executemany('''
+                INSERT INTO metric_samples (process, name, suffix, labels, value) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (process, name, suffix, labels) DO UPDATE SET value = excluded.value
+            ''', [(process, name, suffix, labels, value) for name, suffix, labels, value in samples])
+            self._retire(conn, 'updated_at < ?', (now - self.retire_seconds,))
+        return True
+
+    def retire(self, process: str):
+        """Soma as linhas do processo ao total retido (na saída do worker)"""
+        with self.transaction() as conn:
+            self._retire(conn, 'process = ?', (process,))
+
+    def _retire(self, conn, condition: str, params: tuple):
+        processes = f'SELECT process FROM metric_processes WHERE {condition}'
+        conn.execute(f'''
+            INSERT INTO metric_samples (process, name, suffix, labels, value)
+            SELECT ?, name, suffix, labels, SUM(value) FROM metric_samples
+            WHERE process IN ({processes})
+            GROUP BY name, suffix, labels
+            ON CONFLICT (process, name, suffix, labels) DO UPDATE SET value = value + excluded.value
+        ''', (self.RETIRED,) + params)
+        conn.execute(f'DELETE FROM metric_samples WHERE process IN ({processes})', params)
+        conn.execute(f'DELETE FROM metric_processes WHERE {condition}', params)
+
+    def totals(self) -> List[Tuple[str, str, str, float]]:
+        return [tuple(row) for row in self._query('''
+            SELECT name, suffix, labels, SUM(value) FROM metric_samples
+            GROUP BY name, suffix, labels
+        ''')]
+
+
+class _Process:
+    """
+    Identidade deste processo no MetricsStore
+
+    Refeita quando o pid muda (fork do gunicorn com --preload). `baseline`
+    guarda o que já foi somado ao total retido enquanto o worker estava
+    ocioso; `saved` são os últimos valores gravados.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.id = uuid.uuid4().hex
+        self.baseline: Dict[Tuple[str, str, str], float] = {}
+        self.saved: Dict[Tuple[str, str, str], float] = {}
+
+    def rows(self, samples: List[Tuple[str, str, str, float]]) -> List[Tuple[str, str, str, float]]:
+        return [(name, suffix, labels, value - self.baseline.get((name, suffix, labels), 0.0))
+                for name, suffix, labels, value in samples]
+
+
+registry = Registry()
+_store: Optional[MetricsStore] = None
+_store_lock = threading.Lock()
+_process: Optional[_Process] = None
+_last_flush = 0.0
+
+
+def _flush_interval() -> float:
+    return float(os.environ.get('METRICS_FLUSH_SECONDS', 5))
+
+
+def _metrics_store() -> MetricsStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = MetricsStore(os.environ.get('METRICS_DATA_DIR', 'data'))
+    return _store
+
+
+def _current_process() -> _Process:
+    global _process
+    if _process is None or _process.pid != os.getpid():
+        _process = _Process()
+    return _process
+
+
+def flush(force: bool = False):
+    """Copia os valores deste worker para o MetricsStore (no máximo a cada METRICS_FLUSH_SECONDS)"""
+    global _last_flush
+    now = time.monotonic()
+    if not force and now - _last_flush < _flush_interval():
+        return
+    _last_flush = now
+    samples = registry.samples()
+    if not samples:
+        # Processo que não mediu nada (scripts, testes) não cria o banco
+        return
+    try:
+        store = _metrics_store()
+        with _store_lock:
+            process = _current_process()
+            if not store.save(process.id, process.rows(samples), registered=bool(process.saved)):
+                # Aposentado por inatividade: o último valor gravado já está no total retido
+                process.baseline = dict(process.saved)
+                store.save(process.id, process.rows(samples))
+            process.saved = {(name, suffix, labels): value for name, suffix, labels, value in samples}
+    except Exception as e:
+        print(f"Erro ao gravar métricas: {str(e)}")
+
+
+def _retire_process():
+    """Na saída do worker: grava os valores finais e os soma ao total retido"""
+    flush(force=True)
+    process = _process
+    if process is None or process.pid != os.getpid() or not process.saved:
+        return
+    try:
+        _metrics_store().retire(process.id)
+    except Exception as e:
+        print(f"Erro ao aposentar métricas: {str(e)}")
+
+
+atexit.register(_retire_process)
+
+
+def _record_timing(name: str, elapsed: float):
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(name, [0.0, 0])
+        entry[0] += elapsed * 1000
+        entry[1] += 1
+
+
+@contextmanager
+def stage(name: str):
+    """Mede uma etapa de cálculo (histograma + Server-Timing da requisição atual)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.observe('portfolio_stage_duration_seconds', {'stage': name}, elapsed)
+        _record_timing(name, elapsed)
+
+
+class UpstreamCall:
+    """Chamada a um provedor em andamento; `fail` marca respostas de erro"""
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.error: Optional[str] = None
+
+    def fail(self, reason: str):
+        self.error = reason
+
+
+@contextmanager
+def upstream(provider: str):
+    """
+    Mede uma chamada a um provedor externo (yfinance, CoinGecko, ...)
+
+    Exceções são contadas como erro com o nome da classe e propagadas;
+    respostas inválidas podem ser marcadas com `call.fail(motivo)`.
+    """
+    call = UpstreamCall(provider)
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception as e:
+        call.fail(type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.observe('portfolio_upstream_request_duration_seconds', {'provider': provider}, elapsed)
+        if call.error is not None:
+            registry.inc('portfolio_upstream_errors_total', {'provider': provider, 'reason': call.error})
+        _record_timing(provider, elapsed)
+
+
+def cache_lookup(cache: str, hits: int = 0, misses: int = 0):
+    """Registra consultas a um cache (por item consultado)"""
+    if hits:
+        registry.inc('portfolio_cache_requests_total', {'cache': cache, 'result': 'hit'}, hits)
+    if misses:
+        registry.inc('portfolio_cache_requests_total', {'cache': cache, 'result': 'miss'}, misses)
+
+
+def optimizer_iterations(solver: str, iterations: int):
+    registry.observe('portfolio_optimizer_iterations', {'solver': solver}, iterations)
+
+
+def begin_request():
+    return _request_timings.set({})
+
+
+def end_request(token, endpoint: str, method: str, status: int, elapsed: float) -> str:
+    """Fecha a requisição atual e retorna o valor do header Server-Timing"""
+    timings = _request_timings.get() or {}
+    _request_timings.reset(token)
+    registry.observe('portfolio_http_request_duration_seconds',
+                     {'endpoint': endpoint, 'method': method, 'status': str(status)}, elapsed)
+    flush()
+
+    entries = []
+    for name, (ms, calls) in timings.items():
+        entry = f'{name};dur={ms:.1f}'
+        if calls > 1:
+            entry += f';desc="{calls} chamadas"'
+        entries.append(entry)
+    entries.append(f'total;dur={elapsed * 1000:.1f}')
+    return ', '.join(entries)
+
+
+def _format_bound(bound: float) -> str:
+    return repr(float(bound))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Iterable) -> str:
+    labels = list(labels)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(str(value))}"' for key, value in labels) + '}'
+
+
+def render_metrics() -> str:
+    """Todas as métricas, somadas entre os workers, no formato texto do Prometheus"""
+    flush(force=True)
+    totals = []
+    for name, suffix, labels, value in _metrics_store().totals():
+        labels = [tuple(pair) for pair in json.loads(labels)]
+        series = [pair for pair in labels if pair[0] != 'le']
+        le = next((float(bound) for key, bound in labels if key == 'le'), 0.0)
+        totals.append(((name, series, SUFFIX_ORDER[suffix], le), name, suffix, labels, value))
+    totals.sort(key=lambda row: row[0])
+
+    lines = []
+    current = None
+    cache_totals: Dict[str, List[float]] = {}
+    for _, name, suffix, labels, value in totals:
+        if name != current:
+            current = name
+            if name in COUNTERS:
+                lines += [f'# HELP {name} {COUNTERS[name]}', f'# TYPE {name} counter']
+            elif name in HISTOGRAMS:
+                lines += [f'# HELP {name} {HISTOGRAMS[name][0]}', f'# TYPE {name} histogram']
+        lines.append(f'{name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+        if name == 'portfolio_cache_requests_total':
+            values = dict(labels)
+            entry = cache_totals.setdefault(values['cache'], [0.0, 0.0])
+            entry[0 if values['result'] == 'hit' else 1] += value
+
+    if cache_totals:
+        lines += ['# HELP portfolio_cache_hit_ratio Fração das consultas atendidas pelo cache',
+                  '# TYPE portfolio_cache_hit_ratio gauge']
+        for cache, (hits, misses) in sorted(cache_totals.items()):
+            lines.append(f'portfolio_cache_hit_ratio{_format_labels([("cache", cache)])} '
+                         f'{_format_value(hits / (hits + misses) if hits + misses else 0.0)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Serialização JSON das respostas medida como a etapa `serialize`"""
+
+    def dumps(self, obj, **kwargs):
+        with stage('serialize'):
+            return super().dumps(obj, **kwargs)
+
+
+def init_telemetry(app: Flask):
+    """
+    Mede todas as requisições do app
+
+    Cada resposta recebe um header Server-Timing com os tempos de provedores,
+    etapas e serialização, e os mesmos tempos alimentam os histogramas de
+    /metrics.
+    """
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def _start_timing():
+        g.telemetry_started = time.perf_counter()
+        g.telemetry_token = begin_request()
+
+    @app.after_request
+    def _server_timing(response):
+        token = g.pop('telemetry_token', None)
+        if token is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            response.headers['Server-Timing'] = end_request(
+                token, endpoint, request.method, response.status_code,
+                time.perf_counter() - g.telemetry_started)
+        return response
+
+    @app.teardown_request
+    def _discard_timing(exc):
+        # Exceção não tratada: after_request não roda
+        token = g.pop('telemetry_token', None)
+        if token is not None:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            end_request(token, endpoint, request.method, 500, time.perf_counter() - g.telemetry_started)
@@ -0,0 +1,118 @@
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import select
+
+from services.price_history import CHUNK_SIZE, refresh_latest_closes
+from services.telemetry import stage
+from src.models.portfolio import db, Asset, Portfolio, Position
+
+
+@stage('load_positions')
+def _load_positions(portfolio_ids: Optional[List[int]]) -> np.ndarray:
+    """Matriz (portfolio_id, asset_id, quantity, average_price) das posições, ordenada"""
+    # Linhas lidas direto do cursor do driver: sem criar um Row por posição
+    connection = db.session.connection()
+    query = (select(Position.portfolio_id, Position.asset_id, Position.quantity, Position.average_price)
+             .order_by(Position.portfolio_id, Position.id))
+    if portfolio_ids is None:
+        rows = connection.execute(query).cursor.fetchall()
+    else:
+        rows = []
+        for start in range(0, len(portfolio_ids), CHUNK_SIZE):
+            chunk = portfolio_ids[start:start + CHUNK_SIZE]
+            rows.extend(connection.execute(query.where(Position.portfolio_id.in_(chunk))).cursor.fetchall())
+    return np.array(rows, dtype=float).reshape(-1, 4)
+
+
+def _asset_symbols(asset_ids: List[int]) -> Dict[int, str]:
+    symbols = {}
+    for start in range(0, len(asset_ids), CHUNK_SIZE):
+        chunk = asset_ids[start:start + CHUNK_SIZE]
+        symbols.update(db.session.execute(select(Asset.id, Asset.symbol).where(Asset.id.in_(chunk))).all())
+    return symbols
+
+
+def value_portfolios(portfolio_ids: Optional[List[int]] = None,
+                     include_positions: bool = True) -> Dict[str, Any]:
+    """
+    Marcação a mercado de vários portfólios em uma única passada
+
+    Os ativos distintos de todas as posições têm o último preço obtido de
+    uma vez (PriceHistory quando atual, senão um download em lote) e valor
+    de mercado, custo, resultado não realizado e pesos são calculados com
+    operações vetorizadas sobre todas as posições juntas. Posições sem preço
+    ficam fora dos totais e são listadas em `missing_prices`.
+    """
+    requested = portfolio_ids
+    if portfolio_ids is not None:
+        portfolio_ids = sorted(set(portfolio_ids))
+        known = set()
+        for start in range(0, len(portfolio_ids), CHUNK_SIZE):
+            chunk = portfolio_ids[start:start + CHUNK_SIZE]
+            known.update(db.session.execute(select(Portfolio.id).where(Portfolio.id.in_(chunk))).scalars())
+        not_found = [portfolio_id for portfolio_id in portfolio_ids if portfolio_id not in known]
+        portfolio_ids = sorted(known)
+    else:
+        portfolio_ids = list(db.session.execute(select(Portfolio.id).order_by(Portfolio.id)).scalars())
+        not_found = []
+
+    positions = _load_positions(portfolio_ids if requested is not None else None)
+    owners = positions[:, 0].astype(np.int64)
+    assets = positions[:, 1].astype(np.int64)
+    quantity, average_price = positions[:, 2], positions[:, 3]
+
+    # Um preço por ativo distinto, espalhado para as posições
+    unique_assets, asset_index = np.unique(assets, return_inverse=True)
+    prices = refresh_latest_closes(unique_assets.tolist())
+    asset_prices = np.array([prices.get(int(asset_id), np.nan) for asset_id in unique_assets], dtype=float)
+    symbols = _asset_symbols(unique_assets.tolist())
+    price = asset_prices[asset_index]
+    priced = ~np.isnan(price)
+
+    market_value = np.where(priced, quantity * np.nan_to_num(price), 0.0)
+    cost_basis = np.where(priced, quantity * average_price, 0.0)
+    pnl = market_value - cost_basis
+
+    # Totais por portfólio com bincount sobre o índice de cada dono
+    portfolio_index = np.searchsorted(np.asarray(portfolio_ids, dtype=np.int64), owners)
+    total_value = np.bincount(portfolio_index, weights=market_value, minlength=len(portfolio_ids))
+    total_cost = np.bincount(portfolio_index, weights=cost_basis, minlength=len(portfolio_ids))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = np.where(priced, market_value / total_value[portfolio_index], np.nan)
+        pnl_percent = np.where(total_cost != 0, (total_value - total_cost) / total_cost * 100, 0.0)
+
+    valuations = [{
+        'portfolio_id': portfolio_id,
+        'market_value': float(total_value[position]),
+        'cost_basis': float(total_cost[position]),
+        'unrealized_pnl': float(total_value[position] - total_cost[position]),
+        'unrealized_pnl_percent': float(pnl_percent[position]),
+        'missing_prices': []
+    } for position, portfolio_id in enumerate(portfolio_ids)]
+    if include_positions:
+        for valuation in valuations:
+            valuation['positions'] = []
+
+    for i in np.flatnonzero(~priced):
+        valuations[portfolio_index[i]]['missing_prices'].append(symbols.get(int(assets[i])))
+
+    if include_positions:
+        for i in range(len(positions)):
+            asset_id = int(assets[i])
+            valuations[portfolio_index[i]]['positions'].append({
+                'asset_id': asset_id,
+                'symbol': symbols.get(asset_id),
+                'quantity': float(quantity[i]),
+                'average_price': float(average_price[i]),
+                'price': float(price[i]) if priced[i] else None,
+                'market_value': float(market_value[i]) if priced[i] else None,
+                'cost_basis': float(cost_basis[i]) if priced[i] else None,
+                'unrealized_pnl': float(pnl[i]) if priced[i] else None,
+                'weight': float(weight[i]) if priced[i] and np.isfinite(weight[i]) else None
+            })
+
+    return {
+        'valuations': valuations,
+        'not_found': not_found
+    }
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from services.alert_store import AlertStore
+
+LEGACY_ALERT = {
+    'id': 'a1', 'symbol': 'AAPL', 'target_price': 200.0, 'condition': 'above', 'current_price': 180.0,
+    'created_at': '2024-01-15T10:00:00', 'triggered': False, 'triggered_at': None,
+}
+
+
+@pytest.fixture
+def legacy_files(tmp_path):
+    path = tmp_path / 'alerts.json'
+    path.write_text(json.dumps([LEGACY_ALERT]))
+    return {'price_alerts': str(path)}
+
+
+def test_failed_migration_keeps_legacy_json_for_the_next_start(tmp_path, legacy_files, monkeypatch):
+    db_path = str(tmp_path / 'alerts.db')
+
+    def broken(self, conn):
+        raise RuntimeError('falha simulada')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(AlertStore, '_migrate_v7', broken)
+        with pytest.raises(RuntimeError):
+            AlertStore(db_path, legacy_files)
+    assert (tmp_path / 'alerts.json').exists()
+
+    store = AlertStore(db_path, legacy_files)
+
+    assert [row['id'] for row in store._query('SELECT id FROM price_alerts')] == ['a1']
+    assert not (tmp_path / 'alerts.json').exists()
+    assert (tmp_path / 'alerts.json.migrated').exists()
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.metrics import METRIC_FIELDS, portfolio_metrics
+
+
+@pytest.fixture
+def closes():
+    index = pd.date_range('2024-01-01', periods=60, freq='B')
+    rng = np.random.default_rng(7)
+    prices = 100 * np.cumprod(1 + rng.normal(0.0005, 0.01, size=(len(index), 2)), axis=0)
+    # Como em PriceHistoryCache.get_closes: símbolo sem histórico fica só com NaN
+    return pd.DataFrame({'AAPL': prices[:, 0], 'MSFT': prices[:, 1], 'UNKNOWN': np.nan}, index=index)
+
+
+def test_unknown_symbol_is_skipped_and_weights_renormalized(closes):
+    metrics = portfolio_metrics(closes, {
+        'with_unknown': {'AAPL': 0.3, 'MSFT': 0.3, 'UNKNOWN': 0.4},
+        'known_only': {'AAPL': 0.5, 'MSFT': 0.5},
+        'only_unknown': {'UNKNOWN': 1.0},
+    })
+
+    assert set(metrics) == {'with_unknown', 'known_only'}
+    for field in METRIC_FIELDS:
+        assert metrics['with_unknown'][field] == pytest.approx(metrics['known_only'][field])
+        assert np.isfinite(metrics['with_unknown'][field])
@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy import select
+
+from services.nav import portfolio_nav
+from src.models.portfolio import db, Asset, Portfolio, PortfolioNav, Position
+
+
+def test_nav_prices_crypto_in_usd(app, downloads):
+    portfolio = Portfolio(name='Teste')
+    aapl = Asset(symbol='AAPL', name='Apple', asset_type='stock')
+    btc = Asset(symbol='BTC', name='Bitcoin', asset_type='crypto')
+    db.session.add_all([portfolio, aapl, btc])
+    db.session.flush()
+    db.session.add_all([Position(portfolio_id=portfolio.id, asset_id=aapl.id, quantity=10, average_price=150.0),
+                        Position(portfolio_id=portfolio.id, asset_id=btc.id, quantity=0.5, average_price=40000.0)])
+    db.session.commit()
+
+    result = portfolio_nav(portfolio.id, '1mo')
+
+    assert downloads == [['AAPL', 'BTC-USD']]
+    expected = 10 * 200.0 + 0.5 * 60000.0
+    assert [point['nav'] for point in result['data']] == pytest.approx([expected] * 5)
+    stored = db.session.execute(select(PortfolioNav.nav).where(PortfolioNav.portfolio_id == portfolio.id)).scalars()
+    assert list(stored) == pytest.approx([expected] * 5)
@@ -0,0 +1,25 @@
+import pytest
+
+from services.alerts import AlertManager
+
+
+@pytest.fixture
+def manager(tmp_path):
+    return AlertManager(data_dir=str(tmp_path))
+
+
+def test_crypto_holdings_are_priced_in_usd(manager, downloads):
+    result = manager.create_performance_alert('default', 'return', 0.01, 'below', [
+        {'symbol': 'AAPL', 'weight': 0.6},
+        {'symbol': 'btc', 'weight': 0.4, 'type': 'crypto'},
+    ])
+    assert result['success']
+    assert manager.store.get_portfolio_assets(['default']) == {
+        'default': {'AAPL': ('stock', 0.6), 'BTC': ('crypto', 0.4)}
+    }
+
+    fired = manager.check_performance_alerts()
+
+    assert downloads == [['AAPL', 'BTC-USD']]
+    # Preços constantes: retorno anualizado nulo, abaixo do limite
+    assert [alert['current_value'] for alert in fired] == pytest.approx([0.0])
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from services.covariance import SampleCovariance
+from services.qp import PortfolioConstraints, PortfolioQP
+
+SYMBOLS = ['BTC', 'ETH', 'AAPL', 'MSFT', 'SPY']
+MEAN_RETURNS = np.array([0.80, 0.60, 0.15, 0.12, 0.08])
+VOLATILITY = np.array([0.70, 0.80, 0.25, 0.22, 0.15])
+CONSTRAINTS = {
+    'max_weight': 0.4,
+    'group_caps': {'crypto': 0.3},
+    'asset_groups': {'BTC': 'crypto', 'ETH': 'crypto'},
+}
+TOLERANCE = 1e-4
+
+
+@pytest.fixture
+def qp():
+    correlation = np.full((5, 5), 0.3) + 0.7 * np.eye(5)
+    covariance = SampleCovariance(correlation * np.outer(VOLATILITY, VOLATILITY))
+    constraints = PortfolioConstraints.from_spec(CONSTRAINTS, SYMBOLS)
+    return PortfolioQP(MEAN_RETURNS, covariance, constraints)
+
+
+def _assert_mandate(weights):
+    assert weights is not None
+    assert weights.sum() == pytest.approx(1.0, abs=TOLERANCE)
+    assert np.all(weights >= 0)
+    assert np.all(weights <= 0.4)
+    assert weights[:2].sum() <= 0.3 + TOLERANCE
+
+
+def test_optimal_portfolios_respect_max_weight_and_group_cap(qp):
+    max_sharpe = qp.max_sharpe(0.0)
+    _assert_mandate(max_sharpe)
+    # Os limites estão ativos: a cripto (maior retorno) fica no teto do grupo
+    assert max_sharpe[:2].sum() == pytest.approx(0.3, abs=TOLERANCE)
+
+    _assert_mandate(qp.min_variance())
+
+
+def test_frontier_respects_max_weight_and_group_cap(qp):
+    low, high = qp.return_range()
+    for target in np.linspace(low, high, 8):
+        _assert_mandate(qp.target_return(target))
@@ -0,0 +1,50 @@
+import pytest
+
+from services.valuation import value_portfolios
+from src.models.portfolio import db, Asset, Portfolio, Position
+
+
+def _portfolio(*holdings):
+    portfolio = Portfolio(name='Teste')
+    db.session.add(portfolio)
+    for symbol, asset_type, quantity, average_price in holdings:
+        asset = Asset(symbol=symbol, name=symbol, asset_type=asset_type)
+        db.session.add(asset)
+        db.session.flush()
+        db.session.add(Position(portfolio_id=portfolio.id, asset_id=asset.id,
+                                quantity=quantity, average_price=average_price))
+    db.session.commit()
+    return portfolio.id
+
+
+def test_crypto_positions_are_priced_in_usd(app, downloads):
+    portfolio_id = _portfolio(('AAPL', 'stock', 10, 150.0), ('BTC', 'crypto', 0.5, 40000.0))
+
+    valuation = value_portfolios([portfolio_id])['valuations'][0]
+
+    assert downloads == [['AAPL', 'BTC-USD']]
+    prices = {position['symbol']: position['price'] for position in valuation['positions']}
+    assert prices == {'AAPL': 200.0, 'BTC': 60000.0}
+    assert valuation['missing_prices'] == []
+    assert valuation['market_value'] == pytest.approx(10 * 200.0 + 0.5 * 60000.0)
+
+
+def test_crypto_symbol_with_usd_suffix_is_not_doubled(app, downloads):
+    portfolio_id = _portfolio(('BTC-USD', 'crypto', 1, 30000.0))
+
+    valuation = value_portfolios([portfolio_id])['valuations'][0]
+
+    assert downloads == [['BTC-USD']]
+    assert valuation['market_value'] == pytest.approx(60000.0)
+
+
+def test_assets_sharing_a_ticker_are_all_priced(app, downloads):
+    # Mesmo ticker em dois ativos (ex.: catálogo grava como fund, usuário cria como stock)
+    first = _portfolio(('AAPL', 'stock', 1, 100.0))
+    second = _portfolio(('AAPL', 'fund', 2, 100.0))
+
+    valuations = value_portfolios([first, second])['valuations']
+
+    assert downloads == [['AAPL']]
+    assert [valuation['market_value'] for valuation in valuations] == pytest.approx([200.0, 400.0])
+    assert [valuation['missing_prices'] for valuation in valuations] == [[], []]
@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+
+import pandas as pd
+import pytest
+from flask import Flask
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, 'src'), ROOT]
+
+# Métricas gravadas na saída do processo não vão para o data/ do repositório
+os.environ.setdefault('METRICS_DATA_DIR', tempfile.mkdtemp(prefix='metrics-'))
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """Aplicação com as tabelas criadas em um banco SQLite em memória"""
+    from config import init_database
+    from src.models.portfolio import db
+
+    monkeypatch.setenv('DATABASE_URL', 'sqlite://')
+    app = Flask(__name__)
+    init_database(app, db)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+# Fechamentos por ticker do Yahoo: o símbolo puro BTC é um ETF
+CLOSES = {'AAPL': 200.0, 'MSFT': 400.0, 'BTC': 50.0, 'BTC-USD': 60000.0}
+
+
+@pytest.fixture
+def downloads(monkeypatch):
+    """
+    Substitui download_closes por fechamentos constantes (CLOSES)
+
+    Vale para o PriceHistory (valuation, NAV) e para o PriceHistoryCache
+    (alertas de performance).
+
+    Retorna a lista de tickers pedidos em cada chamada.
+    """
+    from services import market_data, price_history
+
+    requested = []
+
+    def download_closes(symbols, period):
+        if not symbols:
+            return pd.DataFrame()
+        requested.append(list(symbols))
+        index = pd.date_range(end=pd.Timestamp.today().normalize(), periods=5)
+        return pd.DataFrame({symbol: [CLOSES[symbol]] * len(index) for symbol in symbols if symbol in CLOSES},
+                            index=index)
+
+    monkeypatch.setattr(price_history, 'download_closes', download_closes)
+    monkeypatch.setattr(market_data, 'download_closes', download_closes)
+    price_history._backfilled.clear()
+    return requested